@@ -0,0 +1,167 @@
+import asyncio, time
+from collections import deque
+
+from starlette.routing import Match
+
+from metrics import ADMISSION_LIMIT, ADMISSION_TOTAL
+
+# =======================
+# Adaptive admission control (AIMD)
+# =======================
+# Each route class gets a concurrency limit that grows by roughly one slot per
+# window of fast requests and shrinks multiplicatively when latency goes past
+# the target. Like TCP it backs off once per congestion signal: a slow
+# request that started before the last decrease was admitted under the old
+# limit and says nothing new, so a burst of slow completions costs one
+# decrease per round trip, not one each. Requests beyond the limit wait in a
+# short bounded queue; when that is full or the wait runs out they get an
+# immediate 503 + Retry-After instead of piling up behind the threadpool
+# until the HPA catches up.
+
+# Probes must always reach the app, otherwise a busy pod is restarted, and
+# scrapes matter most exactly when the pod is overloaded. The SSE stream and debug sessions are long-lived (they would skew latency) and
+# have their own caps. The load generator must stay controllable while the
+# load it started is being shed.
+EXEMPT_PATHS = frozenset({
+    "/health", "/ready", "/metrics", "/api/stream", "/debug/profile", "/debug/heap", "/api/loadgen",
+})
+
+
+class AIMDLimiter:
+    def __init__(self, name, initial=20, minimum=2, maximum=200, target_latency=0.25,
+                 backoff=0.9, max_queue=50, max_wait=0.5, clock=time.monotonic):
+        self.name = name
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.clock = clock
+        self.in_flight = 0
+        self._backed_off_at = float("-inf")
+        self._waiters = deque()
+        self._admitted = ADMISSION_TOTAL.labels(name, "admitted")
+        self._queued = ADMISSION_TOTAL.labels(name, "queued")
+        self._shed = ADMISSION_TOTAL.labels(name, "shed")
+        self._limit_gauge = ADMISSION_LIMIT.labels(name)
+        self._limit_gauge.set(self.limit)
+
+    async def acquire(self):
+        """True once a slot is held, False if the request should be shed."""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self._admitted.inc()
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self._shed.inc()
+            return False
+
+        self._queued.inc()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._free_slot()  # client went away while holding a handed-over slot
+            waiter.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+        # A slot may have been handed over right as the wait expired - keep it.
+        if waiter.done() and not waiter.cancelled():
+            self._admitted.inc()
+            return True
+        waiter.cancel()
+        self._shed.inc()
+        return False
+
+    def release(self, latency):
+        if latency > self.target_latency:
+            now = self.clock()
+            if now - latency >= self._backed_off_at:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+                self._backed_off_at = now
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        self._limit_gauge.set(self.limit)
+        self._free_slot()
+
+    def _free_slot(self):
+        self.in_flight -= 1
+        # Freed slots go straight to queued requests (the slot stays counted).
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self.in_flight += 1
+
+
+def route_class(path):
+    if path.startswith("/api/"):
+        return "api"
+    if path == "/metrics":
+        return "metrics"  # only reached with a custom exempt set
+    return "pages"
+
+
+# =======================
+# Pure-ASGI admission middleware
+# =======================
+class AdmissionMiddleware:
+    """Sheds requests over their class's limit before routing runs.
+
+    ``routes`` (the app's route list) is only matched for shed requests, so
+    the instrumentation counts their 503s under the route template rather
+    than as unmatched.
+    """
+
+    def __init__(self, app, limiters, classify=route_class, exempt=EXEMPT_PATHS, retry_after=1,
+                 routes=()):
+        self.app = app
+        self.limiters = limiters
+        self.classify = classify
+        self.exempt = exempt
+        self.retry_after = str(retry_after)
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt:
+            await self.app(scope, receive, send)
+            return
+        limiter = self.limiters.get(self.classify(scope["path"]))
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limiter.acquire():
+            for route in self.routes:
+                if route.matches(scope)[0] == Match.FULL:
+                    scope["route"] = route
+                    break
+            await self.reject(send)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - start)
+
+    async def reject(self, send):
+        body = b'{"detail":"overloaded, retry shortly"}'
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", self.retry_after.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,231 @@
+import operator, re
+from collections import deque
+
+from history import parse_duration
+
+# =======================
+# Streaming alert rules
+# =======================
+# Rules are evaluated once per sample, in the sampler's listener. Every
+# windowed aggregate is a SlidingWindow shared by all rules over the same
+# (series, window): a running sum for avg and monotonic deques for min/max,
+# so an update is O(1) amortized and a rule check is one comparison.
+#
+#   high_cpu: cpu > 80 for 60s
+#   high_memory: memory avg(5m) > 90
+#   requests min(1m) < 1
+
+OK, PENDING, FIRING = "ok", "pending", "firing"
+STATES = (OK, PENDING, FIRING)
+
+OPERATORS = {
+    ">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le,
+    "==": operator.eq, "!=": operator.ne,
+}
+# Rule series -> Snapshot attribute.
+SERIES_FIELDS = {
+    "cpu": "cpu",
+    "memory": "memory",
+    "requests": "request_rate",
+    "throttled": "cpu_throttled_ratio",
+}
+
+_RULE = re.compile(
+    r"""^\s*(?:(?P<name>[\w.-]+)\s*:\s*)?
+    (?P<series>\w+)
+    (?:\s*(?P<aggregate>avg|min|max)\(\s*(?P<window>[^)]+?)\s*\))?
+    \s*(?P<op>>=|<=|==|!=|>|<)
+    \s*(?P<threshold>[-+]?(?:\d+\.?\d*|\.\d+))
+    (?:\s+for\s+(?P<duration>\S+))?\s*$""",
+    re.VERBOSE,
+)
+
+
+class SlidingWindow:
+    """min / max / avg of the values pushed during the last ``seconds``."""
+
+    __slots__ = ("seconds", "values", "total", "mins", "maxs")
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.values = deque()  # (timestamp, value)
+        self.total = 0.0
+        self.mins = deque()    # candidates for the minimum, values increasing
+        self.maxs = deque()    # candidates for the maximum, values decreasing
+
+    def push(self, timestamp, value):
+        values, mins, maxs = self.values, self.mins, self.maxs
+        values.append((timestamp, value))
+        self.total += value
+        while mins and mins[-1][1] >= value:
+            mins.pop()
+        mins.append((timestamp, value))
+        while maxs and maxs[-1][1] <= value:
+            maxs.pop()
+        maxs.append((timestamp, value))
+
+        cutoff = timestamp - self.seconds
+        while values[0][0] <= cutoff:
+            self.total -= values.popleft()[1]
+        while mins[0][0] <= cutoff:
+            mins.popleft()
+        while maxs[0][0] <= cutoff:
+            maxs.popleft()
+        if len(values) == 1:
+            self.total = value  # drop accumulated float error whenever we can
+
+    def avg(self):
+        return self.total / len(self.values)
+
+    def min(self):
+        return self.mins[0][1]
+
+    def max(self):
+        return self.maxs[0][1]
+
+
+class Rule:
+    __slots__ = (
+        "name", "expr", "series", "op", "compare", "threshold", "aggregate", "window",
+        "duration", "read", "state", "value", "active_since", "since",
+    )
+
+    def __init__(self, name, series, op, threshold, aggregate=None, window=0.0, duration=0.0, expr=None):
+        if series not in SERIES_FIELDS:
+            raise ValueError(f"unknown series {series!r}, expected one of {sorted(SERIES_FIELDS)}")
+        if aggregate is not None and not window > 0:
+            raise ValueError(f"{aggregate}() needs a positive window")
+        self.name = name
+        self.series = series
+        self.op = op
+        self.compare = OPERATORS[op]
+        self.threshold = threshold
+        self.aggregate = aggregate
+        self.window = window
+        self.duration = duration
+        self.expr = expr or self._describe()
+        self.read = None        # bound SlidingWindow method, set by the engine
+        self.state = OK
+        self.value = None
+        self.active_since = None  # monotonic time the condition became true
+        self.since = None         # wall time of the last state change
+
+    def _describe(self):
+        text = self.series
+        if self.aggregate is not None:
+            text += f" {self.aggregate}({self.window:g}s)"
+        text += f" {self.op} {self.threshold:g}"
+        if self.duration:
+            text += f" for {self.duration:g}s"
+        return text
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "expr": self.expr,
+            "state": self.state,
+            "value": self.value,
+            "threshold": self.threshold,
+            "since": self.since,
+        }
+
+
+def parse_rule(text):
+    """``[name:] series [avg|min|max(window)] op threshold [for duration]``."""
+    match = _RULE.match(text)
+    if match is None:
+        raise ValueError(f"cannot parse alert rule {text!r}")
+    parts = match.groupdict()
+    expr = text.split(":", 1)[1].strip() if parts["name"] else text.strip()
+    return Rule(
+        name=parts["name"] or expr,
+        series=parts["series"],
+        op=parts["op"],
+        threshold=float(parts["threshold"]),
+        aggregate=parts["aggregate"],
+        window=parse_duration(parts["window"]) if parts["window"] else 0.0,
+        duration=parse_duration(parts["duration"]) if parts["duration"] else 0.0,
+        expr=expr,
+    )
+
+
+def parse_rules(source):
+    # Rules are separated by ";" or newlines.
+    texts = [text for text in re.split(r"[;\n]", source) if text.strip()]
+    return [parse_rule(text) for text in texts]
+
+
+class AlertEngine:
+    def __init__(self, rules, on_change=None):
+        self.rules = list(rules)
+        names = [rule.name for rule in self.rules]
+        if len(set(names)) != len(names):
+            raise ValueError("alert rule names must be unique")
+        self.on_change = on_change
+        self.fields = {}
+        self.windows = {}
+        for rule in self.rules:
+            self.fields[rule.series] = SERIES_FIELDS[rule.series]
+            if rule.aggregate is not None:
+                key = (rule.series, rule.window)
+                window = self.windows.get(key)
+                if window is None:
+                    window = self.windows[key] = SlidingWindow(rule.window)
+                rule.read = getattr(window, rule.aggregate)
+        # Per-series window lists so evaluate() does no key lookups per window.
+        self._pushes = [
+            (series, [window for (name, _), window in self.windows.items() if name == series])
+            for series in self.fields
+        ]
+        self.counts = {OK: len(self.rules), PENDING: 0, FIRING: 0}
+        self.evaluated = None  # the last snapshot evaluated; rule states follow from it
+
+    @property
+    def status(self):
+        # The worst state of any rule.
+        if self.counts[FIRING]:
+            return FIRING
+        if self.counts[PENDING]:
+            return PENDING
+        return OK
+
+    def _transition(self, rule, state, wall_time):
+        self.counts[rule.state] -= 1
+        self.counts[state] += 1
+        rule.state = state
+        rule.since = wall_time
+        if self.on_change is not None:
+            self.on_change(rule)
+
+    def evaluate(self, snapshot):
+        now = snapshot.timestamp
+        values = {series: getattr(snapshot, field) for series, field in self.fields.items()}
+        for series, windows in self._pushes:
+            value = values[series]
+            for window in windows:
+                window.push(now, value)
+
+        for rule in self.rules:
+            value = values[rule.series] if rule.read is None else rule.read()
+            rule.value = value
+            if not rule.compare(value, rule.threshold):
+                rule.active_since = None
+                if rule.state != OK:
+                    self._transition(rule, OK, snapshot.wall_time)
+                continue
+            if rule.active_since is None:
+                rule.active_since = now
+            if rule.state == FIRING:
+                continue
+            if now - rule.active_since >= rule.duration:
+                self._transition(rule, FIRING, snapshot.wall_time)
+            elif rule.state == OK:
+                self._transition(rule, PENDING, snapshot.wall_time)
+        self.evaluated = snapshot
+
+    def alerts(self):
+        return {
+            "status": self.status,
+            "counts": dict(self.counts),
+            "alerts": [rule.as_dict() for rule in self.rules],
+        }
@@ -1,595 +1,590 @@
-from fastapi import FastAPI, Response
-from fastapi.responses import HTMLResponse, JSONResponse
-from prometheus_client import Counter, Gauge, generate_latest
-import random, time, psutil
+from startup import StartupTimer
 
-app = FastAPI()
+# Started first so the "imports" phase covers everything below.
+startup = StartupTimer()
+
+import asyncio, hmac, logging, math, os, socket, time
+from contextlib import asynccontextmanager
+from html import escape
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
+
+import config
+from alerts import STATES, AlertEngine, parse_rules
+from admission import AIMDLimiter, AdmissionMiddleware
+from exposition import (
+    CONTENT_TYPE_OPENMETRICS, CONTENT_TYPE_TEXT, ExpositionCache, accepts_gzip, wants_openmetrics,
+)
+from cardinality import GuardedMetric
+from cgroup import detect_cgroup
+from collectors import CollectorScheduler, build_sources
+from drain import DrainCoordinator, DrainMiddleware
+from metrics import (
+    ALERT_STATE, CPU_LIMIT, CPU_THROTTLED, CPU_USAGE, DEBUG_SESSIONS, MEMORY_BYTES, MEMORY_LIMIT,
+    MEMORY_USAGE, REQUEST_COUNT, REQUEST_LATENCY, SAMPLE_LOG_RECOVERED, SERIES_RETIRED,
+    LatencySummaryCollector, ProcessInternalsCollector, SampleAgeCollector, counter_total,
+    mark_process_dead, multiprocess_enabled, scrape_registry,
+)
+from history import History, parse_duration
+from loadgen import LatencyInjectionMiddleware, LoadGenerator
+from loopmon import LoopMonitor, ReadinessCheck
+from middleware import InstrumentationMiddleware
+from pages import (
+    DASHBOARD_HTML, HEALTH_PAGE_TEMPLATE, HEALTH_STATES, LANDING_HTML, METRICS_PAGE_TEMPLATE,
+    PageTemplate, RenderedPage, StaticPage, VersionedJSON, alert_list_html,
+)
+from procstats import GCMonitor, detect_process_reader
+from profiler import SessionGuard, StackSampler, heap_diff
+from sampler import Sampler
+from sketch import (
+    QUANTILES, LatencyTracker, dump_snapshot, merge_snapshots, merge_totals, read_worker_files,
+    remove_worker_file, summarize, window_label, write_worker_file,
+)
+from stream import Broadcaster, encode_event
+
+log = logging.getLogger(__name__)
 
 # =======================
-# Prometheus Metrics
+# Background sampler - the only place psutil is called
 # =======================
-REQUEST_COUNT = Counter(
-    "app_requests_total", "Total API requests"
+POD_NAME = socket.gethostname()
+registry = scrape_registry()
+sampler = Sampler(
+    interval=config.SAMPLE_INTERVAL,
+    # Plus whatever evicted label sets had counted, so the rate never dips.
+    request_total=lambda: (
+        counter_total(REQUEST_COUNT) + counter_total(SERIES_RETIRED, metric=request_series[0].name)
+    ),
+    cgroup=detect_cgroup(config.CGROUP_ROOT) if config.CGROUP_METRICS else None,
+    process=detect_process_reader() if config.PROCESS_METRICS else None,
+)
+gc_monitor = GCMonitor()
+collectors = CollectorScheduler(
+    build_sources(config.COLLECTORS, config.CGROUP_ROOT), max_backoff=config.COLLECTOR_MAX_BACKOFF,
+)
+latency = LatencyTracker(
+    windows=config.LATENCY_WINDOWS, buckets=config.LATENCY_WINDOW_BUCKETS,
+    relative_accuracy=config.LATENCY_SKETCH_ACCURACY, max_bins=config.LATENCY_SKETCH_MAX_BINS,
+)
+history = History()
+broadcaster = Broadcaster(
+    queue_size=config.STREAM_QUEUE_SIZE, max_subscribers=config.STREAM_MAX_SUBSCRIBERS,
+)
+
+
+def publish_gauges(snapshot):
+    CPU_USAGE.set(snapshot.cpu)
+    MEMORY_USAGE.set(snapshot.memory)
+    CPU_LIMIT.set(snapshot.cpu_limit_cores)
+    CPU_THROTTLED.set(snapshot.cpu_throttled_ratio)
+    MEMORY_BYTES.set(snapshot.memory_bytes)
+    MEMORY_LIMIT.set(snapshot.memory_limit_bytes)
+
+
+def record_history(snapshot):
+    history.record(
+        snapshot.wall_time,
+        cpu=snapshot.cpu, memory=snapshot.memory, requests=snapshot.request_rate,
+    )
+
+
+def broadcast(snapshot):
+    # Encoded once per sample no matter how many dashboards are listening.
+    broadcaster.publish(encode_event({
+        "cpu": snapshot.cpu,
+        "memory": snapshot.memory,
+        "requests": snapshot.requests,
+        "request_rate": snapshot.request_rate,
+    }, event_id=snapshot.generation))
+
+
+def report_startup(snapshot):
+    if snapshot.generation == 1:
+        startup.mark("first_sample")
+        startup.report()
+
+
+def alert_changed(rule):
+    ALERT_STATE.labels(rule.name).set(STATES.index(rule.state))
+    log.warning("alert %s is now %s (%s, value %.2f)", rule.name, rule.state, rule.expr, rule.value)
+
+
+alert_engine = AlertEngine(parse_rules(config.ALERT_RULES), on_change=alert_changed)
+for rule in alert_engine.rules:
+    ALERT_STATE.labels(rule.name).set(0)
+
+sampler.subscribe(publish_gauges)
+sampler.subscribe(record_history)
+sampler.subscribe(broadcast)
+sampler.subscribe(alert_engine.evaluate)
+
+# Request metrics go through a cardinality guard; idle label sets are swept
+# out once per sample even when the cap is nowhere near.
+request_series = [
+    GuardedMetric(
+        metric, max_series=config.METRIC_MAX_SERIES, idle_timeout=config.METRIC_SERIES_IDLE,
+        policy=config.METRIC_EVICTION,
+    )
+    for metric in (REQUEST_COUNT, REQUEST_LATENCY)
+]
+
+
+def sweep_series(snapshot):
+    for guarded in request_series:
+        guarded.sweep()
+
+
+sampler.subscribe(sweep_series)
+
+# The tracker is copied on the loop once per sample, so scrapes and file
+# writes in worker threads never read it while requests are adding to it.
+# With several workers each one publishes its copy to the multiprocess
+# directory (in a thread) and merges everyone else's when asked.
+local_latency = (latency.snapshot(), latency.cumulative())
+latency_write = None
+
+
+def copy_latency(snapshot):
+    global local_latency, latency_write
+    local_latency = (latency.snapshot(), latency.cumulative())
+    if multiprocess_enabled() and (latency_write is None or latency_write.done()):
+        latency_write = asyncio.ensure_future(asyncio.to_thread(publish_latency, *local_latency))
+
+
+def publish_latency(snapshot, totals):
+    try:
+        write_worker_file(os.environ["PROMETHEUS_MULTIPROC_DIR"], snapshot, totals)
+    except OSError:
+        log.exception("could not publish latency sketches")
+
+
+sampler.subscribe(copy_latency)
+
+
+def pod_latency():
+    """(windowed sketches, cumulative totals) of every worker in the pod.
+
+    Reads the other workers' files in multiprocess mode, so call it off the loop.
+    """
+    snapshot, totals = local_latency
+    if multiprocess_enabled():
+        others = read_worker_files(
+            os.environ["PROMETHEUS_MULTIPROC_DIR"], max_age=max(5.0, 5 * config.SAMPLE_INTERVAL),
+            exclude_pid=os.getpid(), max_bins=config.LATENCY_SKETCH_MAX_BINS,
+        )
+        snapshot = merge_snapshots([snapshot, *(other for other, _ in others)])
+        totals = merge_totals([totals, *(other for _, other in others)])
+    return snapshot, totals
+
+
+sample_log = None
+if config.SAMPLE_LOG_PATH:
+    from samplelog import SampleLog
+
+    sample_log = SampleLog(config.SAMPLE_LOG_PATH, capacity=config.SAMPLE_LOG_CAPACITY)
+
+
+def append_sample_log(snapshot):
+    sample_log.append(snapshot.wall_time, snapshot.cpu, snapshot.memory, snapshot.request_rate)
+
+
+def restore_history():
+    # Runs in a worker thread before the sampler starts, so nothing else
+    # touches history meanwhile.
+    valid, torn = sample_log.recover()
+    SAMPLE_LOG_RECOVERED.labels("valid").set(valid)
+    SAMPLE_LOG_RECOVERED.labels("torn").set(torn)
+    for wall_time, cpu, memory, request_rate in sample_log.records():
+        history.record(wall_time, cpu=cpu, memory=memory, requests=request_rate)
+    log.info("sample log: replayed %d records (%d torn) from %s", valid, torn, sample_log.path)
+
+
+async def start_sampler():
+    if sample_log is not None:
+        try:
+            await asyncio.to_thread(restore_history)
+        except Exception:
+            log.exception("could not replay the sample log")
+    sampler.start()
+
+
+if sample_log is not None:
+    sampler.subscribe(append_sample_log)
+sampler.subscribe(report_startup)
+
+registry.register(SampleAgeCollector(sampler))
+registry.register(ProcessInternalsCollector(sampler, gc_monitor))
+registry.register(LatencySummaryCollector(pod_latency, QUANTILES, window_label))
+registry.register(collectors)
+loop_monitor = LoopMonitor(
+    interval=config.LOOP_MONITOR_INTERVAL, probe_interval=config.THREADPOOL_PROBE_INTERVAL,
 )
-CPU_USAGE = Gauge(
-    "cpu_usage_percent", "CPU usage percent"
+# Optional subsystems pull in httpx; import them only when configured.
+cluster = None
+if config.CLUSTER_PEERS or config.CLUSTER_PEER_DNS:
+    from cluster import ClusterStats
+
+    cluster = ClusterStats(
+        peers=config.CLUSTER_PEERS, dns_name=config.CLUSTER_PEER_DNS, port=config.CLUSTER_PEER_PORT,
+        timeout=config.CLUSTER_PEER_TIMEOUT, ttl=config.CLUSTER_CACHE_TTL,
+    )
+pusher = None
+if config.PUSH_MODE != "off" and config.PUSH_URL:
+    from pusher import PushExporter
+
+    pusher = PushExporter(
+        registry, config.PUSH_URL, mode=config.PUSH_MODE, interval=config.PUSH_INTERVAL,
+        buffer_size=config.PUSH_BUFFER, timeout=config.PUSH_TIMEOUT,
+        max_backoff=config.PUSH_MAX_BACKOFF, job=config.PUSH_JOB, instance=POD_NAME,
+    )
+readiness = ReadinessCheck(
+    loop_monitor,
+    max_loop_lag=config.READY_MAX_LOOP_LAG,
+    max_queue_wait=config.READY_MAX_QUEUE_WAIT,
+    max_waiting=config.READY_MAX_THREADPOOL_WAITING,
 )
-MEMORY_USAGE = Gauge(
-    "memory_usage_percent", "Memory usage percent"
+exposition = ExpositionCache(registry, ttl=config.METRICS_CACHE_TTL)
+debug_sessions = SessionGuard()
+drain = DrainCoordinator(delay=config.DRAIN_DELAY, background_timeout=config.DRAIN_BACKGROUND_TIMEOUT)
+drain.on_drain(lambda: broadcaster.close(retry=config.DRAIN_STREAM_RETRY))
+load_generator = LoadGenerator(
+    max_seconds=config.LOADGEN_MAX_SECONDS, max_cores=config.LOADGEN_MAX_CORES,
+    max_memory_bytes=int(config.LOADGEN_MAX_MEMORY_MB * 2**20),
+    max_latency=config.LOADGEN_MAX_LATENCY_MS / 1000,
 )
 
+
+@asynccontextmanager
+async def lifespan(app):
+    drain.install()
+    gc_monitor.install()
+    starting = asyncio.ensure_future(start_sampler())
+    loop_monitor.start()
+    collectors.start()
+    if pusher is not None:
+        pusher.start()
+    # Compress the static pages off the loop instead of on the first hit.
+    warm_pages = asyncio.ensure_future(asyncio.to_thread(warm_static_pages))
+    startup.mark("serving")
+    try:
+        yield
+    finally:
+        drain.uninstall()
+        warm_pages.cancel()
+        starting.cancel()
+        steps = [
+            ("load generator", load_generator.stop()),
+            ("loop monitor", loop_monitor.stop()),
+            ("sampler", sampler.stop()),
+            ("collectors", collectors.stop()),
+        ]
+        if cluster is not None:
+            steps.append(("cluster client", cluster.close()))
+        # Last, so the final push carries the drain timings.
+        if pusher is not None:
+            steps.append(("push exporter", pusher.stop()))
+        await drain.shutdown(steps)
+        gc_monitor.uninstall()
+        if sample_log is not None:
+            sample_log.flush()
+        if multiprocess_enabled():
+            if latency_write is not None:
+                await asyncio.gather(latency_write, return_exceptions=True)  # a late write would recreate the file
+            remove_worker_file(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+        mark_process_dead()
+
+
+# Built once at import: static pages are pre-compressed, templates pre-split.
+landing_page = StaticPage(LANDING_HTML)
+dashboard_page = StaticPage(DASHBOARD_HTML)
+health_template = PageTemplate(HEALTH_PAGE_TEMPLATE)
+metrics_template = PageTemplate(METRICS_PAGE_TEMPLATE)
+stats_body = VersionedJSON()
+
+
+def warm_static_pages():
+    landing_page.warm()
+    dashboard_page.warm()
+
+
+app = FastAPI(lifespan=lifespan)
+# Innermost, so injected latency is seen by admission control and instrumentation
+# exactly as a slow handler would be.
+app.add_middleware(LatencyInjectionMiddleware, generator=load_generator)
+# Added first so it runs inside the instrumentation and shed 503s are counted.
+if config.ADMISSION_CONTROL:
+    app.add_middleware(
+        AdmissionMiddleware,
+        limiters={
+            name: AIMDLimiter(
+                name, initial=limit, maximum=max(limit, config.ADMISSION_MAX_LIMIT),
+                target_latency=config.ADMISSION_TARGET_LATENCY,
+                max_queue=config.ADMISSION_MAX_QUEUE, max_wait=config.ADMISSION_MAX_WAIT,
+            )
+            for name, limit in config.ADMISSION_LIMITS.items()
+        },
+        retry_after=config.ADMISSION_RETRY_AFTER,
+        routes=app.routes,  # the router's live list: routes added below are matched too
+    )
+app.add_middleware(
+    InstrumentationMiddleware, counter=request_series[0], histogram=request_series[1], latency=latency,
+)
+# Outermost: counts everything in flight and closes connections while draining.
+app.add_middleware(DrainMiddleware, coordinator=drain)
+
 # =======================
 # Root endpoint - Beautiful landing page
 # =======================
 @app.get("/", response_class=HTMLResponse)
-def root():
-    return """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Health Metrics Service</title>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        body {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            min-height: 100vh;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            padding: 20px;
-        }
-        .container {
-            background: rgba(255, 255, 255, 0.95);
-            border-radius: 24px;
-            padding: 60px 40px;
-            max-width: 600px;
-            box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-            text-align: center;
-        }
-        h1 {
-            font-size: 2.5rem;
-            color: #667eea;
-            margin-bottom: 20px;
-            font-weight: 700;
-        }
-        .emoji {
-            font-size: 4rem;
-            margin-bottom: 20px;
-        }
-        p {
-            color: #4a5568;
-            font-size: 1.1rem;
-            line-height: 1.6;
-            margin-bottom: 40px;
-        }
-        .links {
-            display: grid;
-            gap: 15px;
-        }
-        .link-btn {
-            display: block;
-            padding: 18px 30px;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            text-decoration: none;
-            border-radius: 12px;
-            font-weight: 600;
-            font-size: 1.1rem;
-            transition: all 0.3s ease;
-            box-shadow: 0 4px 15px rgba(102, 126, 234, 0.4);
-        }
-        .link-btn:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 6px 20px rgba(102, 126, 234, 0.6);
-        }
-        .link-btn.secondary {
-            background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-            box-shadow: 0 4px 15px rgba(245, 87, 108, 0.4);
-        }
-        .link-btn.secondary:hover {
-            box-shadow: 0 6px 20px rgba(245, 87, 108, 0.6);
-        }
-        .link-btn.tertiary {
-            background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
-            box-shadow: 0 4px 15px rgba(79, 172, 254, 0.4);
-        }
-        .link-btn.tertiary:hover {
-            box-shadow: 0 6px 20px rgba(79, 172, 254, 0.6);
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="emoji">🚀</div>
-        <h1>Health Metrics Service</h1>
-        <p>Welcome to the enterprise monitoring and health check system. Access real-time metrics and dashboards below.</p>
-        <div class="links">
-            <a href="/dashboard" class="link-btn">📊 Live Dashboard</a>
-            <a href="/health-page" class="link-btn secondary">💚 Health Status Page</a>
-            <a href="/metrics" class="link-btn tertiary">📈 Prometheus Metrics</a>
-        </div>
-    </div>
-</body>
-</html>
-"""
-
-# =======================
-# Health endpoint - JSON (for tests/monitoring)
+async def root(request: Request):
+    return landing_page.response(request)
+
+# =======================
+# Health endpoint - JSON liveness check (for tests/monitoring), kept trivial
 # =======================
 @app.get("/health")
-def health_check_json():
+async def health_check_json():
     return {"status": "healthy"}
 
 # =======================
-# Health page - Beautiful status page
+# Readiness endpoint - fails while the loop or threadpool is saturated
+# =======================
+@app.get("/ready")
+async def readiness_check():
+    ready, details = readiness.check()
+    if drain.draining:
+        ready = False
+        details["reasons"].insert(0, "shutting down")
+    return JSONResponse(
+        {"status": "ready" if ready else "not ready", **details},
+        status_code=200 if ready else 503,
+    )
+
+# =======================
+# Health page - Beautiful status page, driven by the alert rules
 # =======================
+def render_health_page(version):
+    snapshot = version[0]
+    state = alert_engine.status
+    icon, title, status, accent, gradient = HEALTH_STATES[state]
+    return health_template.render(
+        cpu=snapshot.cpu, memory=snapshot.memory,
+        icon=icon, title=title, status=status.format(count=alert_engine.counts[state]),
+        accent=accent, gradient=gradient, alerts=alert_list_html(alert_engine.rules),
+    )
+
+# The page changes only with the sampled values and the alert states.
+health_page = RenderedPage(render_health_page)
+
 @app.get("/health-page", response_class=HTMLResponse)
-def health_check_page():
-    cpu = psutil.cpu_percent(interval=0.1)
-    memory = psutil.virtual_memory().percent
-    
-    return f"""
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Health Check</title>
-    <style>
-        * {{
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }}
-        body {{
-            background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%);
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            min-height: 100vh;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            padding: 20px;
-        }}
-        .container {{
-            background: white;
-            border-radius: 24px;
-            padding: 50px 40px;
-            max-width: 500px;
-            box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-            text-align: center;
-        }}
-        .status-icon {{
-            font-size: 5rem;
-            margin-bottom: 20px;
-            animation: pulse 2s infinite;
-        }}
-        @keyframes pulse {{
-            0%, 100% {{ transform: scale(1); }}
-            50% {{ transform: scale(1.1); }}
-        }}
-        h1 {{
-            color: #11998e;
-            font-size: 2.5rem;
-            margin-bottom: 15px;
-            font-weight: 700;
-        }}
-        .status {{
-            display: inline-block;
-            background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%);
-            color: white;
-            padding: 12px 30px;
-            border-radius: 25px;
-            font-weight: 600;
-            font-size: 1.2rem;
-            margin-bottom: 30px;
-        }}
-        .metrics {{
-            display: grid;
-            grid-template-columns: 1fr 1fr;
-            gap: 20px;
-            margin-top: 30px;
-        }}
-        .metric-card {{
-            background: #f7fafc;
-            padding: 20px;
-            border-radius: 12px;
-            border-left: 4px solid #11998e;
-        }}
-        .metric-label {{
-            color: #718096;
-            font-size: 0.9rem;
-            margin-bottom: 8px;
-        }}
-        .metric-value {{
-            color: #2d3748;
-            font-size: 1.8rem;
-            font-weight: 700;
-        }}
-        .back-btn {{
-            display: inline-block;
-            margin-top: 30px;
-            padding: 12px 30px;
-            background: #667eea;
-            color: white;
-            text-decoration: none;
-            border-radius: 8px;
-            font-weight: 600;
-            transition: all 0.3s ease;
-        }}
-        .back-btn:hover {{
-            background: #764ba2;
-            transform: translateY(-2px);
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="status-icon">✅</div>
-        <h1>System Healthy</h1>
-        <div class="status">All Systems Operational</div>
-        
-        <div class="metrics">
-            <div class="metric-card">
-                <div class="metric-label">CPU Usage</div>
-                <div class="metric-value">{cpu:.1f}%</div>
-            </div>
-            <div class="metric-card">
-                <div class="metric-label">Memory</div>
-                <div class="metric-value">{memory:.1f}%</div>
-            </div>
-        </div>
-        
-        <a href="/" class="back-btn">← Back to Home</a>
-    </div>
-</body>
-</html>
-"""
+async def health_check_page(request: Request):
+    return health_page.response(request, (sampler.snapshot, alert_engine.evaluated))
+
+# =======================
+# Prometheus scrape endpoint - text format or OpenMetrics, optionally gzipped
+# =======================
+@app.get("/metrics")
+def metrics_scrape(request: Request):
+    openmetrics_format = wants_openmetrics(request.headers.get("accept"))
+    compress = accepts_gzip(request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(
+        exposition.render(openmetrics_format, compress),
+        media_type=CONTENT_TYPE_OPENMETRICS if openmetrics_format else CONTENT_TYPE_TEXT,
+        headers=headers,
+    )
 
 # =======================
 # Prometheus metrics - Beautiful visualization
 # =======================
-@app.get("/metrics", response_class=HTMLResponse)
-def metrics_endpoint():
-    CPU_USAGE.set(psutil.cpu_percent(interval=0.1))
-    MEMORY_USAGE.set(psutil.virtual_memory().percent)
-    REQUEST_COUNT.inc()
-    
-    prometheus_data = generate_latest().decode('utf-8')
-    
-    return f"""
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Prometheus Metrics</title>
-    <style>
-        * {{
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }}
-        body {{
-            background: linear-gradient(135deg, #1e3a8a 0%, #3b82f6 100%);
-            font-family: 'Courier New', monospace;
-            min-height: 100vh;
-            padding: 40px 20px;
-        }}
-        .container {{
-            max-width: 1000px;
-            margin: 0 auto;
-            background: white;
-            border-radius: 16px;
-            padding: 40px;
-            box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-        }}
-        .header {{
-            display: flex;
-            align-items: center;
-            justify-content: space-between;
-            margin-bottom: 30px;
-            padding-bottom: 20px;
-            border-bottom: 3px solid #3b82f6;
-        }}
-        h1 {{
-            color: #1e3a8a;
-            font-size: 2rem;
-            font-weight: 700;
-        }}
-        .prometheus-logo {{
-            font-size: 2.5rem;
-        }}
-        .metrics-box {{
-            background: #f8fafc;
-            border: 2px solid #e2e8f0;
-            border-radius: 12px;
-            padding: 30px;
-            font-family: 'Courier New', monospace;
-            font-size: 0.95rem;
-            line-height: 1.8;
-            color: #334155;
-            white-space: pre-wrap;
-            word-wrap: break-word;
-            max-height: 500px;
-            overflow-y: auto;
-        }}
-        .metrics-box::-webkit-scrollbar {{
-            width: 8px;
-        }}
-        .metrics-box::-webkit-scrollbar-track {{
-            background: #e2e8f0;
-            border-radius: 4px;
-        }}
-        .metrics-box::-webkit-scrollbar-thumb {{
-            background: #3b82f6;
-            border-radius: 4px;
-        }}
-        .info-banner {{
-            background: linear-gradient(135deg, #3b82f6 0%, #1e3a8a 100%);
-            color: white;
-            padding: 15px 20px;
-            border-radius: 8px;
-            margin-bottom: 20px;
-            font-size: 0.95rem;
-        }}
-        .back-btn {{
-            display: inline-block;
-            margin-top: 20px;
-            padding: 12px 30px;
-            background: #3b82f6;
-            color: white;
-            text-decoration: none;
-            border-radius: 8px;
-            font-weight: 600;
-            font-family: 'Segoe UI', sans-serif;
-            transition: all 0.3s ease;
-        }}
-        .back-btn:hover {{
-            background: #1e3a8a;
-            transform: translateY(-2px);
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>📈 Prometheus Metrics</h1>
-            <div class="prometheus-logo">🔥</div>
-        </div>
-        
-        <div class="info-banner">
-            ℹ️ These metrics are in Prometheus exposition format, ready to be scraped by Prometheus server
-        </div>
-        
-        <div class="metrics-box">{prometheus_data}</div>
-        
-        <a href="/" class="back-btn">← Back to Home</a>
-    </div>
-</body>
-</html>
-"""
+# Re-rendered only when the cached exposition bytes have been refreshed.
+metrics_page = RenderedPage(
+    lambda data: metrics_template.render(prometheus_data=escape(data.decode('utf-8'))))
+
+@app.get("/metrics-page", response_class=HTMLResponse)
+def metrics_endpoint(request: Request):
+    return metrics_page.response(request, exposition.render())
 
 # =======================
 # JSON stats for frontend
 # =======================
 @app.get("/api/stats")
-def stats():
-    return JSONResponse({
-        "cpu": psutil.cpu_percent(interval=0.1),
-        "memory": psutil.virtual_memory().percent,
-        "requests": REQUEST_COUNT._value.get()
+async def stats(request: Request):
+    # Encoded once per sample generation; faster pollers get 304s in between.
+    # Built in a thread: merging other workers' latency files reads them.
+    snapshot = sampler.snapshot
+    return await stats_body.response_in_thread(request, snapshot.generation, lambda: {
+        "cpu": snapshot.cpu,
+        "memory": snapshot.memory,
+        "requests": snapshot.requests,
+        "generation": snapshot.generation,
+        "sampled_at": snapshot.wall_time if snapshot.generation else None,
+        "pod": POD_NAME,
+        "latency": summarize(pod_latency()[0]),
     })
 
+# =======================
+# Raw latency sketches, merged by /api/cluster-stats on other replicas
+# =======================
+@app.get("/api/latency-sketches")
+async def latency_sketches_endpoint():
+    snapshot, _ = await asyncio.to_thread(pod_latency)
+    return dump_snapshot(snapshot)
+
+# =======================
+# Alert rule states
+# =======================
+@app.get("/api/alerts")
+async def alerts_endpoint():
+    return alert_engine.alerts()
+
+# =======================
+# Cluster-wide stats merged from every replica
+# =======================
+@app.get("/api/cluster-stats")
+async def cluster_stats():
+    if cluster is None:
+        raise HTTPException(404, "no peers configured (set CLUSTER_PEERS or CLUSTER_PEER_DNS)")
+    return await cluster.get()
+
+# =======================
+# Live push stream for the dashboard (Server-Sent Events)
+# =======================
+@app.get("/api/stream")
+async def stream():
+    subscription = broadcaster.subscribe()
+    if subscription is None:
+        raise HTTPException(503, "too many stream subscribers", headers={"Retry-After": "5"})
+    return StreamingResponse(
+        broadcaster.events(subscription, keepalive=config.STREAM_KEEPALIVE, retry=2),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# =======================
+# Downsampled history for charts
+# =======================
+@app.get("/api/history")
+async def history_endpoint(series: str = "cpu", range: str = "1h", step: str = "60s"):
+    try:
+        range_seconds = min(parse_duration(range), config.HISTORY_MAX_RANGE)
+        return history.query(series, range_seconds, parse_duration(step), time.time())
+    except KeyError:
+        raise HTTPException(400, f"unknown series {series!r}, expected one of {list(history.series)}")
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+
 # =======================
 # Enhanced dashboard with real-time charts
 # =======================
 @app.get("/dashboard", response_class=HTMLResponse)
-def dashboard():
-    return """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Health Metrics Dashboard</title>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        body {
-            background: linear-gradient(135deg, #0f172a 0%, #1e293b 100%);
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            color: #e2e8f0;
-            padding: 20px;
-            min-height: 100vh;
-        }
-        .header {
-            text-align: center;
-            margin-bottom: 40px;
-        }
-        h1 {
-            font-size: 2.5rem;
-            background: linear-gradient(135deg, #3b82f6 0%, #8b5cf6 100%);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            margin-bottom: 10px;
-            font-weight: 700;
-        }
-        .subtitle {
-            color: #94a3b8;
-            font-size: 1.1rem;
-        }
-        .grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-            gap: 25px;
-            max-width: 1200px;
-            margin: 0 auto;
-        }
-        .card {
-            background: rgba(30, 41, 59, 0.8);
-            backdrop-filter: blur(10px);
-            border: 1px solid rgba(59, 130, 246, 0.3);
-            border-radius: 16px;
-            padding: 30px;
-            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
-            transition: all 0.3s ease;
-        }
-        .card:hover {
-            transform: translateY(-5px);
-            box-shadow: 0 12px 48px rgba(59, 130, 246, 0.4);
-            border-color: rgba(59, 130, 246, 0.6);
-        }
-        .card-header {
-            display: flex;
-            align-items: center;
-            justify-content: space-between;
-            margin-bottom: 20px;
-        }
-        .card-title {
-            font-size: 0.95rem;
-            color: #94a3b8;
-            font-weight: 600;
-            text-transform: uppercase;
-            letter-spacing: 1px;
-        }
-        .card-icon {
-            font-size: 1.8rem;
-        }
-        .value {
-            font-size: 3.5rem;
-            font-weight: 700;
-            background: linear-gradient(135deg, #3b82f6 0%, #8b5cf6 100%);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            margin: 15px 0;
-        }
-        .progress-bar {
-            width: 100%;
-            height: 8px;
-            background: rgba(59, 130, 246, 0.2);
-            border-radius: 4px;
-            overflow: hidden;
-            margin-top: 15px;
-        }
-        .progress-fill {
-            height: 100%;
-            background: linear-gradient(90deg, #3b82f6 0%, #8b5cf6 100%);
-            border-radius: 4px;
-            transition: width 0.5s ease;
-        }
-        .status-badge {
-            display: inline-block;
-            padding: 6px 16px;
-            background: rgba(34, 197, 94, 0.2);
-            border: 1px solid rgba(34, 197, 94, 0.4);
-            color: #22c55e;
-            border-radius: 20px;
-            font-size: 0.85rem;
-            font-weight: 600;
-            margin-top: 10px;
-        }
-        .back-btn {
-            display: block;
-            max-width: 200px;
-            margin: 40px auto 0;
-            padding: 14px 30px;
-            background: linear-gradient(135deg, #3b82f6 0%, #8b5cf6 100%);
-            color: white;
-            text-decoration: none;
-            border-radius: 10px;
-            font-weight: 600;
-            text-align: center;
-            transition: all 0.3s ease;
-            box-shadow: 0 4px 15px rgba(59, 130, 246, 0.4);
-        }
-        .back-btn:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 6px 20px rgba(59, 130, 246, 0.6);
-        }
-        @keyframes fadeIn {
-            from { opacity: 0; transform: translateY(20px); }
-            to { opacity: 1; transform: translateY(0); }
-        }
-        .card {
-            animation: fadeIn 0.5s ease;
-        }
-        .card:nth-child(2) { animation-delay: 0.1s; }
-        .card:nth-child(3) { animation-delay: 0.2s; }
-    </style>
-</head>
-<body>
-    <div class="header">
-        <h1>📊 Health Metrics Dashboard</h1>
-        <p class="subtitle">Real-time system monitoring and performance metrics</p>
-    </div>
-
-    <div class="grid">
-        <div class="card">
-            <div class="card-header">
-                <div class="card-title">CPU Usage</div>
-                <div class="card-icon">🖥️</div>
-            </div>
-            <div class="value"><span id="cpu">--</span>%</div>
-            <div class="progress-bar">
-                <div class="progress-fill" id="cpu-bar" style="width: 0%"></div>
-            </div>
-            <div class="status-badge">● Active</div>
-        </div>
-
-        <div class="card">
-            <div class="card-header">
-                <div class="card-title">Memory Usage</div>
-                <div class="card-icon">💾</div>
-            </div>
-            <div class="value"><span id="memory">--</span>%</div>
-            <div class="progress-bar">
-                <div class="progress-fill" id="memory-bar" style="width: 0%"></div>
-            </div>
-            <div class="status-badge">● Active</div>
-        </div>
-
-        <div class="card">
-            <div class="card-header">
-                <div class="card-title">Total Requests</div>
-                <div class="card-icon">📈</div>
-            </div>
-            <div class="value"><span id="requests">--</span></div>
-            <div class="status-badge">● Counting</div>
-        </div>
-    </div>
-
-    <a href="/" class="back-btn">← Back to Home</a>
-
-    <script>
-        async function refresh() {
-            try {
-                const res = await fetch("/api/stats");
-                const data = await res.json();
-                
-                document.getElementById("cpu").innerText = data.cpu.toFixed(1);
-                document.getElementById("memory").innerText = data.memory.toFixed(1);
-                document.getElementById("requests").innerText = data.requests;
-                
-                document.getElementById("cpu-bar").style.width = data.cpu + "%";
-                document.getElementById("memory-bar").style.width = data.memory + "%";
-            } catch (err) {
-                console.error("Failed to fetch stats:", err);
-            }
-        }
-
-        setInterval(refresh, 2000);
-        refresh();
-    </script>
-</body>
-</html>
-"""
\ No newline at end of file
+async def dashboard(request: Request):
+    return dashboard_page.response(request)
+
+# =======================
+# On-demand profiling - token protected, one capped session at a time
+# =======================
+def bearer_token_matches(request, expected):
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), expected.encode())
+
+
+def begin_debug_session(request, kind, seconds):
+    """Checks the token, clamps ``seconds`` and claims the session slot."""
+    if not config.DEBUG_TOKEN:
+        raise HTTPException(404, "debug endpoints are disabled (set DEBUG_TOKEN)")
+    if not bearer_token_matches(request, config.DEBUG_TOKEN):
+        DEBUG_SESSIONS.labels(kind, "denied").inc()
+        raise HTTPException(403, "missing or wrong debug token")
+    if not 0 < seconds < math.inf:
+        raise HTTPException(400, "seconds must be positive and finite")
+    if not debug_sessions.begin(kind):
+        DEBUG_SESSIONS.labels(kind, "busy").inc()
+        raise HTTPException(409, f"a {debug_sessions.active} session is already running")
+    return min(seconds, config.DEBUG_MAX_SECONDS)
+
+
+@app.get("/debug/profile")
+async def debug_profile(request: Request, seconds: float = 5):
+    seconds = begin_debug_session(request, "profile", seconds)
+    try:
+        profiler = StackSampler(interval=config.DEBUG_PROFILE_INTERVAL)
+        collapsed = await profiler.run(seconds)
+    finally:
+        debug_sessions.end()
+    DEBUG_SESSIONS.labels("profile", "completed").inc()
+    return PlainTextResponse(collapsed, headers={
+        "Cache-Control": "no-store",
+        "X-Profile-Seconds": str(seconds),
+        "X-Profile-Samples": str(profiler.samples),
+    })
+
+
+@app.get("/debug/heap")
+async def debug_heap(request: Request, seconds: float = 10, limit: int = 25):
+    seconds = begin_debug_session(request, "heap", seconds)
+    try:
+        result = await heap_diff(
+            seconds, frames=config.DEBUG_HEAP_FRAMES, limit=max(1, min(limit, 500)),
+        )
+    finally:
+        debug_sessions.end()
+    DEBUG_SESSIONS.labels("heap", "completed").inc()
+    return JSONResponse(result, headers={"Cache-Control": "no-store"})
+
+
+# =======================
+# Synthetic load for HPA and alert tuning - token protected, capped, cancellable
+# =======================
+def check_loadgen_token(request):
+    if not config.LOADGEN_TOKEN:
+        raise HTTPException(404, "load generator is disabled (set LOADGEN_TOKEN)")
+    if multiprocess_enabled():
+        # Runs live in the worker that started them; status and cancel calls
+        # would land on whichever worker accepts the connection.
+        raise HTTPException(404, "load generator is disabled with several workers (WEB_CONCURRENCY > 1)")
+    if not bearer_token_matches(request, config.LOADGEN_TOKEN):
+        raise HTTPException(403, "missing or wrong load generator token")
+
+
+@app.get("/api/loadgen")
+async def loadgen_status(request: Request):
+    check_loadgen_token(request)
+    return JSONResponse(load_generator.status(), headers={"Cache-Control": "no-store"})
+
+
+@app.post("/api/loadgen", status_code=202)
+async def loadgen_start(
+    request: Request, kind: str, seconds: float = 60, cores: int = 1, utilization: float = 1.0,
+    memory_mb: float = 0, latency_ms: float = 0, routes: str = "",
+):
+    check_loadgen_token(request)
+    try:
+        run = load_generator.start(
+            kind, seconds, cores=cores, utilization=utilization,
+            memory_bytes=memory_mb * 2**20, latency=latency_ms / 1000,
+            routes=[route.strip() for route in routes.split(",")],
+        )
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+    if run is None:
+        raise HTTPException(409, f"a {kind} run is already active; DELETE /api/loadgen to stop it")
+    log.warning("load generator: started %s run %d %s for %gs", kind, run.id, run.params, run.seconds)
+    return run.as_dict()
+
+
+@app.delete("/api/loadgen")
+async def loadgen_cancel(request: Request, id: int = None):
+    """Cancels run ``id``, or every active run; returns them once they have stopped."""
+    check_loadgen_token(request)
+    runs = load_generator.cancel(id)
+    if id is not None and not runs:
+        raise HTTPException(404, f"no active run {id}")
+    await asyncio.gather(*(run.task for run in runs), return_exceptions=True)
+    return {"cancelled": [run.as_dict() for run in runs]}
+
+
+startup.mark("imports")
@@ -0,0 +1,159 @@
+"""Latency/throughput benchmark for every endpoint.
+
+Drives the ASGI app in-process through httpx (no network, no server) or, with
+--url, a locally started uvicorn. Results go to JSON; --baseline compares
+against a previous run and exits non-zero when a route regresses.
+
+    python -m benchmarks.bench --output bench.json
+    python -m benchmarks.bench --baseline bench.json --threshold 0.25
+    python -m benchmarks.bench --url http://127.0.0.1:8000 --concurrency 32
+"""
+import argparse, asyncio, json, math, platform, sys, time
+from contextlib import asynccontextmanager
+
+import httpx
+
+# /api/stream never completes, so it is not benchmarked here.
+DEFAULT_ROUTES = (
+    "/", "/health", "/health-page", "/metrics", "/metrics-page",
+    "/api/stats", "/api/history", "/dashboard",
+)
+COMPARED = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile over an already sorted list.
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+@asynccontextmanager
+async def make_client(url=None):
+    if url:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=url, limits=limits) as client:
+            yield client
+        return
+
+    from app import app
+
+    # ASGITransport does not run the lifespan, so start the sampler ourselves.
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            yield client
+
+
+async def bench_route(client, route, requests, concurrency, warmup):
+    for _ in range(warmup):
+        await client.get(route)
+
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await client.get(route)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+async def run(routes=DEFAULT_ROUTES, requests=200, concurrency=10, warmup=20, url=None):
+    results = {}
+    async with make_client(url) as client:
+        for route in routes:
+            results[route] = await bench_route(client, route, requests, concurrency, warmup)
+    return {
+        "meta": {
+            "target": url or "in-process",
+            "requests": requests,
+            "concurrency": concurrency,
+            "python": platform.python_version(),
+            "timestamp": time.time(),
+        },
+        "routes": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Returns a list of human-readable regressions past ``threshold`` (0.25 = 25%)."""
+    regressions = []
+    for route, result in current["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        if before is None:
+            continue
+        for key in COMPARED:
+            if before[key] > 0 and result[key] > before[key] * (1 + threshold):
+                regressions.append(
+                    f"{route} {key}: {before[key]:.3f} -> {result[key]:.3f} "
+                    f"(+{(result[key] / before[key] - 1) * 100:.0f}%)"
+                )
+        if result["rps"] < before["rps"] * (1 - threshold):
+            regressions.append(f"{route} rps: {before['rps']:.1f} -> {result['rps']:.1f}")
+    return regressions
+
+
+def format_table(results):
+    lines = [f"{'route':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}"]
+    for route, r in results["routes"].items():
+        lines.append(
+            f"{route:<16}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+            f"{r['rps']:>10.1f}{r['errors']:>8}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--routes", default=",".join(DEFAULT_ROUTES))
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per route")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed relative regression before failing (default 0.25)")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(
+        routes=[route for route in args.routes.split(",") if route],
+        requests=args.requests, concurrency=args.concurrency, warmup=args.warmup, url=args.url,
+    ))
+    print(format_table(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print("REGRESSION", line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
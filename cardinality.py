@@ -0,0 +1,108 @@
+import threading, time
+from collections import OrderedDict
+
+from metrics import METRIC_SERIES, SERIES_DROPPED, SERIES_EVICTED, SERIES_RETIRED, multiprocess_enabled
+
+# =======================
+# Cardinality guard for labelled metrics
+# =======================
+# prometheus_client keeps every label set it has ever seen, and each one costs
+# memory and scrape time for as long as the process lives. A GuardedMetric
+# caps the label sets of one metric:
+#
+#   policy="idle"  when full, the least recently used set is evicted only if it
+#                  has been idle for ``idle_timeout``; otherwise the new one is
+#                  dropped into the overflow series (every label "other").
+#   policy="lru"   when full, the least recently used set is always evicted.
+#                  Nothing overflows, but an evicted counter restarts from zero.
+#
+# sweep() also evicts idle sets without waiting for pressure. What an evicted
+# counter had counted goes into app_metric_series_retired_total{metric}, so
+# totals derived from the registry can stay monotonic. In multiprocess mode
+# evicting frees this process's memory but not the series already in the
+# shared .db files, which keep their value (a re-created set carries on from
+# it), so nothing is retired there; the cap still stops new ones being created.
+
+OVERFLOW = "other"
+
+
+class GuardedMetric:
+    def __init__(self, metric, max_series=1000, idle_timeout=600.0, policy="idle",
+                 clock=time.monotonic):
+        if policy not in ("idle", "lru"):
+            raise ValueError(f"unknown eviction policy {policy!r}, expected 'idle' or 'lru'")
+        self.metric = metric
+        self.max_series = max_series
+        self.idle_timeout = idle_timeout
+        self.policy = policy
+        self.clock = clock
+        self.series = OrderedDict()  # label values -> [child, last used], least recent first
+        self._overflow = None
+        # Name and type through the public describe(), not prometheus_client
+        # internals; a counter's family name has no _total suffix.
+        family = metric.describe()[0]
+        self.name = name = family.name
+        self._track_retired = family.type == "counter" and not multiprocess_enabled()
+        self._lock = threading.Lock()
+        self._size = METRIC_SERIES.labels(name)
+        self._dropped = SERIES_DROPPED.labels(name)
+        self._evicted = SERIES_EVICTED.labels(name)
+        self._retired = SERIES_RETIRED.labels(name)
+
+    def labels(self, *values):
+        now = self.clock()
+        with self._lock:
+            entry = self.series.get(values)
+            if entry is not None:
+                entry[1] = now
+                self.series.move_to_end(values)
+                return entry[0]
+            if len(self.series) >= self.max_series and not self._evict_oldest(now):
+                self._dropped.inc()
+                return self.overflow(len(values))
+            child = self.metric.labels(*values)
+            self.series[values] = [child, now]
+            self._size.set(len(self.series))
+            return child
+
+    def overflow(self, label_count):
+        if self._overflow is None:
+            self._overflow = self.metric.labels(*[OVERFLOW] * label_count)
+        return self._overflow
+
+    def _evict_oldest(self, now):
+        if not self.series:
+            return False  # max_series=0: everything overflows
+        values, (_, last_used) = next(iter(self.series.items()))
+        if self.policy == "idle" and now - last_used < self.idle_timeout:
+            return False
+        self._remove(values)
+        return True
+
+    def _remove(self, values):
+        child, _ = self.series.pop(values)
+        if self._track_retired:
+            self._retired.inc(sum(
+                sample.value for family in child.collect() for sample in family.samples
+                if sample.name.endswith("_total")
+            ))
+        self.metric.remove(*values)
+        self._evicted.inc()
+        self._size.set(len(self.series))
+
+    def sweep(self):
+        """Evicts every label set idle for longer than ``idle_timeout``; returns how many."""
+        cutoff = self.clock() - self.idle_timeout
+        evicted = 0
+        with self._lock:
+            while self.series:
+                values, (_, last_used) = next(iter(self.series.items()))
+                if last_used > cutoff:
+                    break
+                self._remove(values)
+                evicted += 1
+        return evicted
+
+
+def guard(metric, **kwargs):
+    return metric if isinstance(metric, GuardedMetric) else GuardedMetric(metric, **kwargs)
@@ -0,0 +1,196 @@
+import os, time
+from dataclasses import dataclass
+
+# =======================
+# cgroup-aware container metrics
+# =======================
+# psutil reports node-wide CPU and memory; inside a pod what matters is usage
+# against our own limits. These readers keep the handful of cgroup files open
+# and re-read them with pread(), which is a few small kernfs reads per sample
+# instead of psutil's /proc walks.
+
+# cgroup v1 reports "no memory limit" as a page-rounded LLONG_MAX.
+V1_UNLIMITED = 1 << 62
+
+
+@dataclass(frozen=True)
+class CgroupStats:
+    cpu_percent: float        # usage against the CPU quota (or all host cores)
+    cpu_limit_cores: float
+    throttled_ratio: float    # throttled periods / elapsed periods since last sample
+    memory_bytes: int
+    memory_limit_bytes: int
+    memory_percent: float
+
+
+class File:
+    """A small kernel file (cgroup, /proc) kept open and re-read from offset 0 with pread()."""
+
+    __slots__ = ("fd",)
+
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def read(self, size=4096):
+        return os.pread(self.fd, size, 0).decode()
+
+    def read_int(self):
+        return int(self.read().strip())
+
+    def read_keyed(self):
+        values = {}
+        for line in self.read().splitlines():
+            key, _, value = line.partition(" ")
+            values[key] = int(value)
+        return values
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _CgroupReader:
+    version = None
+
+    def __init__(self, host_cpus=None, host_memory=None):
+        self.host_cpus = host_cpus or os.cpu_count() or 1
+        self._host_memory = host_memory
+        self._previous = None
+        self._files = []
+
+    def _open(self, path):
+        handle = File(path)
+        self._files.append(handle)
+        return handle
+
+    @property
+    def host_memory(self):
+        if self._host_memory is None:
+            import psutil
+
+            self._host_memory = psutil.virtual_memory().total
+        return self._host_memory
+
+    def close(self):
+        for handle in self._files:
+            handle.close()
+        self._files = []
+
+    # Subclasses return (usage_seconds, periods, throttled, quota_cores or None,
+    # memory_bytes, memory_limit or None).
+    def _read(self):
+        raise NotImplementedError
+
+    def sample(self, now=None):
+        now = time.monotonic() if now is None else now
+        usage, periods, throttled, quota, memory, limit = self._read()
+        cores = quota or float(self.host_cpus)
+        limit = limit or self.host_memory
+
+        cpu_percent = throttled_ratio = 0.0
+        if self._previous is not None:
+            last_now, last_usage, last_periods, last_throttled = self._previous
+            elapsed = now - last_now
+            if elapsed > 0:
+                cpu_percent = max(0.0, (usage - last_usage) / (elapsed * cores) * 100)
+            if periods > last_periods:
+                throttled_ratio = (throttled - last_throttled) / (periods - last_periods)
+        self._previous = (now, usage, periods, throttled)
+
+        return CgroupStats(
+            cpu_percent=cpu_percent,
+            cpu_limit_cores=cores,
+            throttled_ratio=throttled_ratio,
+            memory_bytes=memory,
+            memory_limit_bytes=limit,
+            memory_percent=memory / limit * 100 if limit else 0.0,
+        )
+
+
+class CgroupV2Reader(_CgroupReader):
+    version = 2
+
+    def __init__(self, root, **kwargs):
+        super().__init__(**kwargs)
+        self.cpu_stat = self._open(os.path.join(root, "cpu.stat"))
+        self.memory_current = self._open(os.path.join(root, "memory.current"))
+        self.cpu_max = self._optional(os.path.join(root, "cpu.max"))
+        self.memory_max = self._optional(os.path.join(root, "memory.max"))
+
+    def _optional(self, path):
+        return self._open(path) if os.path.exists(path) else None
+
+    def _read(self):
+        stat = self.cpu_stat.read_keyed()
+        quota = None
+        if self.cpu_max is not None:
+            max_value, period = self.cpu_max.read().split()
+            if max_value != "max":
+                quota = int(max_value) / int(period)
+        limit = None
+        if self.memory_max is not None:
+            raw = self.memory_max.read().strip()
+            if raw != "max":
+                limit = int(raw)
+        return (
+            stat["usage_usec"] / 1e6,
+            stat.get("nr_periods", 0),
+            stat.get("nr_throttled", 0),
+            quota,
+            self.memory_current.read_int(),
+            limit,
+        )
+
+
+class CgroupV1Reader(_CgroupReader):
+    version = 1
+
+    def __init__(self, root, **kwargs):
+        super().__init__(**kwargs)
+        cpu = _first_dir(root, "cpu,cpuacct", "cpu")
+        cpuacct = _first_dir(root, "cpu,cpuacct", "cpuacct")
+        memory = os.path.join(root, "memory")
+        self.cpu_stat = self._open(os.path.join(cpu, "cpu.stat"))
+        self.cfs_quota = self._open(os.path.join(cpu, "cpu.cfs_quota_us"))
+        self.cfs_period = self._open(os.path.join(cpu, "cpu.cfs_period_us"))
+        self.cpu_usage = self._open(os.path.join(cpuacct, "cpuacct.usage"))
+        self.memory_usage = self._open(os.path.join(memory, "memory.usage_in_bytes"))
+        self.memory_limit = self._open(os.path.join(memory, "memory.limit_in_bytes"))
+
+    def _read(self):
+        stat = self.cpu_stat.read_keyed()
+        quota = self.cfs_quota.read_int()
+        limit = self.memory_limit.read_int()
+        return (
+            self.cpu_usage.read_int() / 1e9,
+            stat.get("nr_periods", 0),
+            stat.get("nr_throttled", 0),
+            quota / self.cfs_period.read_int() if quota > 0 else None,
+            self.memory_usage.read_int(),
+            limit if limit < V1_UNLIMITED else None,
+        )
+
+
+def _first_dir(root, *names):
+    for name in names:
+        path = os.path.join(root, name)
+        if os.path.isdir(path):
+            return path
+    return os.path.join(root, names[-1])
+
+
+def detect_cgroup(root="/sys/fs/cgroup", **kwargs):
+    """Returns a reader for the cgroup this process runs in, or None to fall back to psutil.
+
+    cgroup v2 needs ``memory.current``, which only exists below the root
+    cgroup, so a bare host (root cgroup) correctly falls back.
+    """
+    try:
+        if os.path.exists(os.path.join(root, "cgroup.controllers")):
+            if os.path.exists(os.path.join(root, "memory.current")):
+                return CgroupV2Reader(root, **kwargs)
+            return None
+        if os.path.isdir(os.path.join(root, "memory")):
+            return CgroupV1Reader(root, **kwargs)
+    except OSError:
+        pass
+    return None
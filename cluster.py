@@ -0,0 +1,154 @@
+import asyncio, socket, time
+
+import httpx
+
+from sketch import load_snapshot, merge_snapshots, summarize
+
+# =======================
+# Cluster-wide stats across replicas
+# =======================
+# Peers come from a headless Service (one A record per ready pod) or a static
+# list. Every refresh fans out concurrently over one pooled AsyncClient with a
+# hard per-peer timeout, and results are cached briefly with single-flight so
+# N open dashboards cost one fan-out per TTL, not N x replicas requests.
+# Each replica's latency sketches are fetched alongside its stats and merged,
+# so fleet percentiles are computed from the combined distribution rather
+# than averaged from per-pod percentiles.
+
+
+def _peer_url(peer, port):
+    if "://" in peer:
+        return peer.rstrip("/")
+    return f"http://{peer}" if ":" in peer else f"http://{peer}:{port}"
+
+
+class ClusterStats:
+    def __init__(self, peers=(), dns_name=None, port=8000, timeout=0.5, ttl=2.0,
+                 path="/api/stats", sketch_path="/api/latency-sketches", max_connections=20):
+        self.static_peers = [_peer_url(peer, port) for peer in peers]
+        self.dns_name = dns_name
+        self.port = port
+        self.timeout = timeout
+        self.ttl = ttl
+        self.path = path
+        self.sketch_path = sketch_path
+        self.max_connections = max_connections
+        self._client = None
+        self._cached = None
+        self._expires = 0.0
+        self._inflight = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def discover(self):
+        peers = list(self.static_peers)
+        if self.dns_name:
+            loop = asyncio.get_running_loop()
+            try:
+                infos = await asyncio.wait_for(
+                    loop.getaddrinfo(self.dns_name, self.port, type=socket.SOCK_STREAM),
+                    self.timeout,
+                )
+            except (OSError, asyncio.TimeoutError):
+                infos = []
+            for address in sorted({info[4][0] for info in infos}):
+                host = f"[{address}]" if ":" in address else address
+                peers.append(f"http://{host}:{self.port}")
+        return peers
+
+    async def _get_json(self, url):
+        # httpx's timeout applies to each phase (connect, write, read, pool)
+        # on its own; this caps the whole request.
+        response = await asyncio.wait_for(self.client.get(url), self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    async def _fetch(self, peer):
+        start = time.perf_counter()
+        try:
+            data = await self._get_json(peer + self.path)
+        except (httpx.HTTPError, ValueError, asyncio.TimeoutError) as exc:
+            return {"peer": peer, "ok": False, "error": type(exc).__name__}
+        if not isinstance(data, dict):
+            return {"peer": peer, "ok": False, "error": "unexpected payload"}
+        if not all(isinstance(data.get(key), (int, float)) for key in ("cpu", "memory")):
+            return {"peer": peer, "ok": False, "error": "payload lacks cpu or memory"}
+        return {"peer": peer, "ok": True, **data,
+                "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+    async def _fetch_sketches(self, peer):
+        try:
+            return load_snapshot(await self._get_json(peer + self.sketch_path))
+        except (httpx.HTTPError, ValueError, KeyError, TypeError, AttributeError, asyncio.TimeoutError):
+            return None  # an older replica without sketches, or a bad payload
+
+    async def _collect(self):
+        peers = await self.discover()
+        fetches = [self._fetch(peer) for peer in peers]
+        if self.sketch_path:
+            fetches += [self._fetch_sketches(peer) for peer in peers]
+        results = await asyncio.gather(*fetches)
+        pods = results[:len(peers)]
+        result = {"pods": pods, "aggregate": aggregate(pods), "generated_at": time.time()}
+        merged = None
+        for pod, snapshot in zip(pods, results[len(peers):]):
+            if snapshot is None:
+                continue
+            try:
+                # Into a copy, so a peer that fails halfway leaves nothing behind.
+                merged = merge_snapshots([merged or {}, snapshot])
+            except ValueError as exc:
+                # e.g. a replica running with another LATENCY_SKETCH_ACCURACY
+                pod["error"] = f"latency sketches skipped: {exc}"
+        if merged is not None:
+            result["aggregate"]["latency"] = summarize(merged)
+        return result
+
+    async def get(self):
+        now = time.monotonic()
+        if self._cached is not None and now < self._expires:
+            return self._cached
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._collect())
+        inflight = self._inflight
+        try:
+            result = await asyncio.shield(inflight)
+        finally:
+            if self._inflight is inflight and inflight.done():
+                self._inflight = None
+        self._cached = result
+        self._expires = time.monotonic() + self.ttl
+        return result
+
+
+def aggregate(pods):
+    # A pod without cpu or memory (an older build) is left out, not fatal.
+    up = [pod for pod in pods if pod.get("ok")
+          and pod.get("cpu") is not None and pod.get("memory") is not None]
+    result = {"pods_total": len(pods), "pods_up": len(up)}
+    if up:
+        cpu = [pod["cpu"] for pod in up]
+        memory = [pod["memory"] for pod in up]
+        result.update(
+            cpu_avg=sum(cpu) / len(cpu),
+            cpu_max=max(cpu),
+            memory_avg=sum(memory) / len(memory),
+            memory_max=max(memory),
+            requests=sum(pod.get("requests", 0) for pod in up),
+        )
+    return result
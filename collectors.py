@@ -0,0 +1,371 @@
+import asyncio, gc, logging, os, time
+
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from cgroup import File
+from metrics import COLLECTOR_DURATION, COLLECTOR_ERRORS, COLLECTOR_INTERVAL, COLLECTOR_OVERRUNS
+
+log = logging.getLogger(__name__)
+
+# =======================
+# Pluggable metric sources
+# =======================
+# A Source reads one thing (a /proc file, a cgroup, the GC) and returns
+# Prometheus metric families. It declares how often it runs, how long one read
+# may take, and whether the read blocks (file I/O: run in a worker thread) or
+# is cheap enough for the event loop. Adding a metric means writing a Source
+# and listing it in COLLECTORS; nothing in app.py calls .set() for it.
+#
+# The core CPU/memory figures stay with the Sampler: its Snapshot also feeds
+# history, alerts and the live stream on a fixed 1 s cadence.
+
+
+class Source:
+    name = None
+    interval = 5.0    # seconds between reads
+    budget = 0.01     # seconds one read may take before the source is backed off
+    blocking = True   # read() does I/O, so it runs in a worker thread
+
+    def available(self):
+        """False if this source has nothing to read here (no such file, wrong cgroup version)."""
+        return True
+
+    def read(self):
+        """Returns an iterable of metric families; called from a worker thread if ``blocking``."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class _FileSource(Source):
+    path = None
+
+    def __init__(self, path=None):
+        self.path = path or self.path
+        self.file = None
+
+    def available(self):
+        try:
+            self.file = File(self.path)
+            self.file.read()
+        except OSError:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            return False
+        return True
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class ProcessIOSource(_FileSource):
+    """Block-device bytes and read/write syscalls of this process (/proc/self/io)."""
+
+    name = "disk"
+    path = "/proc/self/io"
+
+    def read(self):
+        values = {}
+        for line in self.file.read().splitlines():
+            key, _, value = line.partition(":")
+            values[key] = int(value)
+        storage = CounterMetricFamily(
+            "app_process_storage_bytes", "Bytes this process read from or wrote to storage",
+            labels=["direction"],
+        )
+        storage.add_metric(["read"], values["read_bytes"])
+        storage.add_metric(["write"], values["write_bytes"])
+        syscalls = CounterMetricFamily(
+            "app_process_io_syscalls", "read()- and write()-like syscalls (files and sockets)",
+            labels=["direction"],
+        )
+        syscalls.add_metric(["read"], values["syscr"])
+        syscalls.add_metric(["write"], values["syscw"])
+        return [storage, syscalls]
+
+
+class NetworkSource(_FileSource):
+    """Per-interface traffic in the pod's network namespace (/proc/self/net/dev)."""
+
+    name = "network"
+    path = "/proc/self/net/dev"
+    # Columns of /proc/net/dev: receive fields 0-7, transmit fields 8-15.
+    FIELDS = {"bytes": 0, "packets": 1, "errors": 2, "drops": 3}
+
+    def read(self):
+        families = {
+            field: CounterMetricFamily(
+                f"app_network_{field}", f"Network {field} by interface and direction",
+                labels=["interface", "direction"],
+            )
+            for field in self.FIELDS
+        }
+        for line in self.file.read(65536).splitlines()[2:]:
+            interface, _, counters = line.partition(":")
+            interface = interface.strip()
+            if interface == "lo":
+                continue
+            counters = counters.split()
+            for field, column in self.FIELDS.items():
+                families[field].add_metric([interface, "receive"], int(counters[column]))
+                families[field].add_metric([interface, "transmit"], int(counters[column + 8]))
+        return list(families.values())
+
+
+class CgroupPressureSource(Source):
+    """cgroup v2 pressure stall information and per-device I/O of the container."""
+
+    name = "cgroup"
+    RESOURCES = ("cpu", "memory", "io")
+
+    def __init__(self, root="/sys/fs/cgroup"):
+        self.root = root
+        self.pressure = {}
+        self.io_stat = None
+
+    def available(self):
+        for resource in self.RESOURCES:
+            path = os.path.join(self.root, f"{resource}.pressure")
+            if os.path.exists(path):
+                self.pressure[resource] = File(path)
+        path = os.path.join(self.root, "io.stat")
+        if os.path.exists(path):
+            self.io_stat = File(path)
+        return bool(self.pressure) or self.io_stat is not None
+
+    def read(self):
+        families = []
+        if self.pressure:
+            stalled = CounterMetricFamily(
+                "app_cgroup_pressure_stalled_seconds",
+                "Time tasks were stalled on a resource (some: at least one, full: all)",
+                labels=["resource", "kind"],
+            )
+            ratio = GaugeMetricFamily(
+                "app_cgroup_pressure_ratio", "Share of the last 10 s tasks were stalled on a resource",
+                labels=["resource", "kind"],
+            )
+            for resource, file in self.pressure.items():
+                # some avg10=0.00 avg60=0.00 avg300=0.00 total=0
+                for line in file.read().splitlines():
+                    kind, *fields = line.split()
+                    values = dict(field.split("=") for field in fields)
+                    stalled.add_metric([resource, kind], int(values["total"]) / 1e6)
+                    ratio.add_metric([resource, kind], float(values["avg10"]) / 100)
+            families += [stalled, ratio]
+        if self.io_stat is not None:
+            io_bytes = CounterMetricFamily(
+                "app_cgroup_io_bytes", "Bytes the container read from or wrote to each device",
+                labels=["device", "direction"],
+            )
+            io_ops = CounterMetricFamily(
+                "app_cgroup_io_operations", "I/O operations the container issued to each device",
+                labels=["device", "direction"],
+            )
+            # 8:0 rbytes=1 wbytes=2 rios=3 wios=4 dbytes=0 dios=0
+            for line in self.io_stat.read(65536).splitlines():
+                device, *fields = line.split()
+                values = dict(field.split("=") for field in fields)
+                for direction, prefix in (("read", "r"), ("write", "w")):
+                    io_bytes.add_metric([device, direction], int(values.get(prefix + "bytes", 0)))
+                    io_ops.add_metric([device, direction], int(values.get(prefix + "ios", 0)))
+            families += [io_bytes, io_ops]
+        return families
+
+    def close(self):
+        for file in self.pressure.values():
+            file.close()
+        self.pressure.clear()
+        if self.io_stat is not None:
+            self.io_stat.close()
+            self.io_stat = None
+
+
+class GCSource(Source):
+    """Collections per generation and objects waiting for the next one."""
+
+    name = "gc"
+    interval = 10.0
+    budget = 0.001
+    blocking = False  # a few integer reads; a thread hop would cost more
+
+    def read(self):
+        collections = CounterMetricFamily(
+            "app_gc_collections", "Garbage collections by generation", labels=["generation"],
+        )
+        pending = GaugeMetricFamily(
+            "app_gc_pending_objects",
+            "Allocations (generation 0) or younger collections (1, 2) counted toward the next collection",
+            labels=["generation"],
+        )
+        for generation, (stats, count) in enumerate(zip(gc.get_stats(), gc.get_count())):
+            collections.add_metric([str(generation)], stats["collections"])
+            pending.add_metric([str(generation)], count)
+        frozen = GaugeMetricFamily(
+            "app_gc_frozen_objects", "Objects moved to the permanent generation by gc.freeze()",
+            value=gc.get_freeze_count(),
+        )
+        return [collections, pending, frozen]
+
+
+SOURCES = {
+    "disk": ProcessIOSource,
+    "network": NetworkSource,
+    "cgroup": CgroupPressureSource,
+    "gc": GCSource,
+}
+
+
+def build_sources(spec, cgroup_root="/sys/fs/cgroup"):
+    """Sources for ``"name[=interval], ..."``; ones with nothing to read here are left out."""
+    sources = []
+    for item in spec.split(","):
+        name, _, interval = item.strip().partition("=")
+        if not name:
+            continue
+        if name not in SOURCES:
+            raise ValueError(f"unknown collector {name!r}, expected one of {sorted(SOURCES)}")
+        source = SOURCES[name](root=cgroup_root) if name == "cgroup" else SOURCES[name]()
+        if interval:
+            source.interval = float(interval)
+        if source.available():
+            sources.append(source)
+        else:
+            log.info("collector %s has nothing to read here, skipped", name)
+    return sources
+
+
+# =======================
+# Scheduler
+# =======================
+# One task runs every source. First runs are staggered across the shortest
+# interval so reads don't land together; blocking reads go to a worker thread
+# and a source still running when it is due again is skipped (an overrun). A
+# read over budget, an overrun or an error doubles the source's interval, up
+# to ``max_backoff`` times its own; ``recover_after`` good reads in a row
+# halve it again. Scrapes only see the families from each source's last read.
+class _Scheduled:
+    __slots__ = ("source", "name", "base", "interval", "due", "running", "families", "good")
+
+    def __init__(self, source):
+        self.source = source
+        self.name = source.name
+        self.base = self.interval = source.interval
+        self.due = 0.0
+        self.running = False
+        self.families = ()
+        self.good = 0
+
+
+def _timed_read(source):
+    start = time.perf_counter()
+    try:
+        return list(source.read()), time.perf_counter() - start, None
+    except Exception as exc:
+        return None, time.perf_counter() - start, exc
+
+
+class CollectorScheduler:
+    def __init__(self, sources, max_backoff=16, recover_after=3, clock=time.monotonic):
+        self.entries = [_Scheduled(source) for source in sources]
+        self.max_backoff = max_backoff
+        self.recover_after = recover_after
+        self.clock = clock
+        self._task = None
+        self._reads = set()
+        for entry in self.entries:
+            COLLECTOR_INTERVAL.labels(entry.name).set(entry.interval)
+
+    def stagger(self, now):
+        if not self.entries:
+            return
+        shortest = min(entry.base for entry in self.entries)
+        for index, entry in enumerate(self.entries):
+            entry.due = now + shortest * index / len(self.entries)
+
+    def collect(self):
+        for entry in self.entries:
+            yield from entry.families
+
+    def run_due(self, now):
+        """Starts every source that is due; returns when the next one is."""
+        for entry in self.entries:
+            if entry.due > now:
+                continue
+            entry.due += entry.interval
+            if entry.due <= now:
+                entry.due = now + entry.interval  # fell behind: don't fire a burst
+            if entry.running:
+                COLLECTOR_OVERRUNS.labels(entry.name).inc()
+                self._back_off(entry, "still running from last time")
+            elif entry.source.blocking:
+                entry.running = True
+                task = asyncio.get_running_loop().create_task(self._read_in_thread(entry))
+                self._reads.add(task)
+                task.add_done_callback(self._reads.discard)
+            else:
+                self._finish(entry, *_timed_read(entry.source))
+        return min((entry.due for entry in self.entries), default=now + 60)
+
+    async def _read_in_thread(self, entry):
+        try:
+            result = await asyncio.to_thread(_timed_read, entry.source)
+        finally:
+            entry.running = False
+        self._finish(entry, *result)
+
+    def _finish(self, entry, families, duration, error):
+        COLLECTOR_DURATION.labels(entry.name).observe(duration)
+        if error is not None:
+            COLLECTOR_ERRORS.labels(entry.name).inc()
+            self._back_off(entry, f"failed: {error!r}")
+            return
+        entry.families = families
+        if duration > entry.source.budget:
+            COLLECTOR_OVERRUNS.labels(entry.name).inc()
+            self._back_off(entry, f"took {duration * 1000:.1f} ms (budget {entry.source.budget * 1000:g} ms)")
+            return
+        entry.good += 1
+        if entry.good >= self.recover_after and entry.interval > entry.base:
+            entry.good = 0
+            self._set_interval(entry, max(entry.base, entry.interval / 2))
+
+    def _back_off(self, entry, reason):
+        entry.good = 0
+        interval = min(entry.interval * 2, entry.base * self.max_backoff)
+        if interval != entry.interval:
+            log.warning("collector %s %s, backing off to every %gs", entry.name, reason, interval)
+            self._set_interval(entry, interval)
+
+    def _set_interval(self, entry, interval):
+        # Move the pending run too, so a back-off takes effect right away.
+        entry.due += interval - entry.interval
+        entry.interval = interval
+        COLLECTOR_INTERVAL.labels(entry.name).set(interval)
+
+    async def _run(self):
+        self.stagger(self.clock())
+        while True:
+            next_due = self.run_due(self.clock())
+            await asyncio.sleep(max(0.0, next_due - self.clock()))
+
+    def start(self):
+        if self._task is None and self.entries:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Let reads already in a thread finish before their files are closed.
+        await asyncio.gather(*self._reads, return_exceptions=True)
+        for entry in self.entries:
+            entry.source.close()
@@ -0,0 +1,184 @@
+import os
+
+# =======================
+# Sampler
+# =======================
+# Seconds between CPU/memory samples taken by the background sampler.
+SAMPLE_INTERVAL = float(os.environ.get("SAMPLE_INTERVAL", "1.0"))
+# Where to look for the container's cgroup files; set CGROUP_METRICS=off to
+# always report host-wide psutil numbers instead.
+CGROUP_ROOT = os.environ.get("CGROUP_ROOT", "/sys/fs/cgroup")
+CGROUP_METRICS = os.environ.get("CGROUP_METRICS", "auto").lower() != "off"
+# Threads, fds, RSS/USS and context switches, read by the sampler each tick.
+PROCESS_METRICS = os.environ.get("PROCESS_METRICS", "on").lower() != "off"
+
+# =======================
+# Pluggable metric sources
+# =======================
+# "name[=interval seconds]" items: disk, network, cgroup (v2 pressure and
+# io.stat) and gc. Sources with nothing to read on this host are skipped.
+COLLECTORS = os.environ.get("COLLECTORS", "disk,network,cgroup,gc")
+# A source over its budget is slowed down, to at most this many times its interval.
+COLLECTOR_MAX_BACKOFF = float(os.environ.get("COLLECTOR_MAX_BACKOFF", "16"))
+
+# =======================
+# Prometheus exposition
+# =======================
+# Seconds a rendered /metrics body is reused across scrapes.
+METRICS_CACHE_TTL = float(os.environ.get("METRICS_CACHE_TTL", "1.0"))
+
+# =======================
+# Request instrumentation
+# =======================
+# Upper bounds (seconds) of the request latency histogram buckets.
+REQUEST_LATENCY_BUCKETS = tuple(
+    float(bound) for bound in os.environ.get(
+        "REQUEST_LATENCY_BUCKETS", "0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5"
+    ).split(",")
+)
+
+# Most label sets any one labelled request metric may hold; beyond that the
+# least recently used is evicted once idle for METRIC_SERIES_IDLE seconds
+# ("idle" policy) or straight away ("lru"), else the request counts as "other".
+METRIC_MAX_SERIES = int(os.environ.get("METRIC_MAX_SERIES", "1000"))
+METRIC_SERIES_IDLE = float(os.environ.get("METRIC_SERIES_IDLE", "600"))
+METRIC_EVICTION = os.environ.get("METRIC_EVICTION", "idle").lower()
+
+# =======================
+# Latency sketches (per-route sliding-window percentiles)
+# =======================
+# Window lengths in seconds; each must be a multiple of the shortest / buckets.
+LATENCY_WINDOWS = tuple(float(window) for window in os.environ.get("LATENCY_WINDOWS", "60,300").split(","))
+# Sub-sketches per shortest window; each window slides in steps of window / this.
+LATENCY_WINDOW_BUCKETS = int(os.environ.get("LATENCY_WINDOW_BUCKETS", "5"))
+# Relative error of every reported percentile, and the bucket cap per sketch.
+LATENCY_SKETCH_ACCURACY = float(os.environ.get("LATENCY_SKETCH_ACCURACY", "0.01"))
+LATENCY_SKETCH_MAX_BINS = int(os.environ.get("LATENCY_SKETCH_MAX_BINS", "1024"))
+
+# =======================
+# History
+# =======================
+# Longest range /api/history will serve, in seconds (bounded by the coarsest tier).
+HISTORY_MAX_RANGE = float(os.environ.get("HISTORY_MAX_RANGE", "86400"))
+
+# =======================
+# Live stream (SSE)
+# =======================
+# Samples buffered per client before the oldest are dropped.
+STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", "4"))
+# Concurrent /api/stream clients per process; extra clients get a 503 and poll.
+STREAM_MAX_SUBSCRIBERS = int(os.environ.get("STREAM_MAX_SUBSCRIBERS", "1000"))
+# Seconds between keep-alive comments on an idle stream.
+STREAM_KEEPALIVE = float(os.environ.get("STREAM_KEEPALIVE", "15"))
+
+# =======================
+# Admission control
+# =======================
+ADMISSION_CONTROL = os.environ.get("ADMISSION_CONTROL", "on").lower() != "off"
+# Starting concurrency limit per route class ("api", "pages"). /metrics is
+# exempt by default, like the probes.
+ADMISSION_LIMITS = {
+    name: int(limit)
+    for name, _, limit in (
+        item.partition("=")
+        for item in os.environ.get("ADMISSION_LIMITS", "api=50,pages=20").split(",")
+    )
+}
+ADMISSION_MAX_LIMIT = int(os.environ.get("ADMISSION_MAX_LIMIT", "200"))
+# Requests slower than this shrink the limit; faster ones grow it.
+ADMISSION_TARGET_LATENCY = float(os.environ.get("ADMISSION_TARGET_LATENCY", "0.25"))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "50"))
+ADMISSION_MAX_WAIT = float(os.environ.get("ADMISSION_MAX_WAIT", "0.5"))
+ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", "1"))
+
+# =======================
+# Readiness (/ready)
+# =======================
+# Seconds between event-loop lag measurements and threadpool probes.
+LOOP_MONITOR_INTERVAL = float(os.environ.get("LOOP_MONITOR_INTERVAL", "0.25"))
+THREADPOOL_PROBE_INTERVAL = float(os.environ.get("THREADPOOL_PROBE_INTERVAL", "1.0"))
+# /ready fails while any of these saturation thresholds is exceeded.
+READY_MAX_LOOP_LAG = float(os.environ.get("READY_MAX_LOOP_LAG", "0.5"))
+READY_MAX_QUEUE_WAIT = float(os.environ.get("READY_MAX_QUEUE_WAIT", "1.0"))
+READY_MAX_THREADPOOL_WAITING = int(os.environ.get("READY_MAX_THREADPOOL_WAITING", "20"))
+
+# =======================
+# Cluster stats (/api/cluster-stats)
+# =======================
+# Peers are a static comma-separated list (host, host:port or URL) and/or every
+# address behind a headless Service name.
+CLUSTER_PEERS = [peer.strip() for peer in os.environ.get("CLUSTER_PEERS", "").split(",") if peer.strip()]
+CLUSTER_PEER_DNS = os.environ.get("CLUSTER_PEER_DNS") or None
+CLUSTER_PEER_PORT = int(os.environ.get("CLUSTER_PEER_PORT", "8000"))
+# Hard per-peer timeout in seconds; slow peers are reported as down.
+CLUSTER_PEER_TIMEOUT = float(os.environ.get("CLUSTER_PEER_TIMEOUT", "0.5"))
+CLUSTER_CACHE_TTL = float(os.environ.get("CLUSTER_CACHE_TTL", "2.0"))
+
+# =======================
+# Push exporter
+# =======================
+# "off", "remote_write" (snappy protobuf to PUSH_URL) or "pushgateway"
+# (gzip text to PUSH_URL/metrics/job/PUSH_JOB/instance/<pod>).
+PUSH_MODE = os.environ.get("PUSH_MODE", "off").lower()
+PUSH_URL = os.environ.get("PUSH_URL", "")
+PUSH_INTERVAL = float(os.environ.get("PUSH_INTERVAL", "15"))
+# Batches held while the receiver is unreachable; the oldest are dropped first.
+PUSH_BUFFER = int(os.environ.get("PUSH_BUFFER", "120"))
+PUSH_TIMEOUT = float(os.environ.get("PUSH_TIMEOUT", "5"))
+PUSH_MAX_BACKOFF = float(os.environ.get("PUSH_MAX_BACKOFF", "300"))
+PUSH_JOB = os.environ.get("PUSH_JOB", "health-metrics")
+
+# =======================
+# Debug endpoints (/debug/profile, /debug/heap)
+# =======================
+# Disabled (404) unless a token is set; callers send "Authorization: Bearer <token>".
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN", "")
+# Longest session either endpoint will run, whatever ?seconds= asks for.
+DEBUG_MAX_SECONDS = float(os.environ.get("DEBUG_MAX_SECONDS", "30"))
+# Stack sampling period for /debug/profile (10 ms = 100 Hz).
+DEBUG_PROFILE_INTERVAL = float(os.environ.get("DEBUG_PROFILE_INTERVAL", "0.01"))
+# Traceback depth tracemalloc records for /debug/heap.
+DEBUG_HEAP_FRAMES = int(os.environ.get("DEBUG_HEAP_FRAMES", "1"))
+
+# =======================
+# Alert rules
+# =======================
+# "[name:] series [avg|min|max(window)] op threshold [for duration]", separated
+# by ";" or newlines. Series: cpu, memory, requests (per second), throttled.
+ALERT_RULES = os.environ.get(
+    "ALERT_RULES", "high_cpu: cpu > 80 for 60s; high_memory: memory avg(5m) > 90"
+)
+
+# =======================
+# Durable sample log
+# =======================
+# Ring file the samples are appended to and history is replayed from on
+# startup. Off unless set; point it at a volume that outlives the container.
+SAMPLE_LOG_PATH = os.environ.get("SAMPLE_LOG_PATH", "")
+# Records kept (one per sample); 86400 is 24 h at 1 s in ~4 MB.
+SAMPLE_LOG_CAPACITY = int(os.environ.get("SAMPLE_LOG_CAPACITY", "86400"))
+
+# =======================
+# Load generator (/api/loadgen)
+# =======================
+# Disabled (404) unless a token is set; callers send "Authorization: Bearer <token>".
+# Always disabled with several workers, since each worker has its own runs.
+LOADGEN_TOKEN = os.environ.get("LOADGEN_TOKEN", "")
+# Caps on every run, whatever the request asks for.
+LOADGEN_MAX_SECONDS = float(os.environ.get("LOADGEN_MAX_SECONDS", "600"))
+LOADGEN_MAX_CORES = int(os.environ.get("LOADGEN_MAX_CORES", str(os.cpu_count() or 1)))
+LOADGEN_MAX_MEMORY_MB = float(os.environ.get("LOADGEN_MAX_MEMORY_MB", "128"))
+LOADGEN_MAX_LATENCY_MS = float(os.environ.get("LOADGEN_MAX_LATENCY_MS", "5000"))
+
+# =======================
+# Graceful shutdown
+# =======================
+# Seconds between SIGTERM and closing the socket; /ready fails and responses
+# close their connections meanwhile, so load balancers can catch up.
+DRAIN_DELAY = float(os.environ.get("DRAIN_DELAY", "5"))
+# Seconds uvicorn then waits for in-flight requests (timeout_graceful_shutdown).
+DRAIN_TIMEOUT = float(os.environ.get("DRAIN_TIMEOUT", "20"))
+# Seconds all background tasks get to stop once requests are done.
+DRAIN_BACKGROUND_TIMEOUT = float(os.environ.get("DRAIN_BACKGROUND_TIMEOUT", "5"))
+# Base reconnect delay sent to SSE clients when their stream is closed.
+DRAIN_STREAM_RETRY = float(os.environ.get("DRAIN_STREAM_RETRY", "1"))
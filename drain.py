@@ -0,0 +1,147 @@
+import asyncio, logging, signal, threading, time
+
+from metrics import DRAIN_SECONDS, DRAINING
+
+log = logging.getLogger(__name__)
+
+# =======================
+# Graceful draining on SIGTERM
+# =======================
+# Kubernetes sends SIGTERM and takes the pod out of its Service at the same
+# time, so for a few seconds new requests keep arriving. Passed straight to
+# uvicorn, SIGTERM closes the listening socket at once (those requests are
+# refused) and then waits on SSE streams that never end. Instead:
+#
+#   1. SIGTERM   /ready fails, every response says "Connection: close" so
+#                keep-alive clients reconnect elsewhere, SSE streams end with
+#                a retry hint. The socket stays open for ``delay`` seconds
+#                while the endpoints update.
+#   2. hand-over uvicorn's own handler runs: no new connections, in-flight
+#                requests get up to DRAIN_TIMEOUT (timeout_graceful_shutdown).
+#   3. lifespan  background tasks stop, all within ``background_timeout``.
+#
+# A second SIGTERM, or a SIGINT, skips the wait. The time each phase took is
+# exported as app_drain_duration_seconds{phase}.
+
+
+class DrainCoordinator:
+    def __init__(self, delay=5.0, background_timeout=10.0, clock=time.monotonic):
+        self.delay = delay
+        self.background_timeout = background_timeout
+        self.clock = clock
+        self.draining = False
+        self.inflight = 0
+        self.started = None
+        self.handed_over = None
+        self._loop = None
+        self._original = {}
+        self._handover = None
+        self._callbacks = []
+
+    def on_drain(self, callback):
+        self._callbacks.append(callback)
+
+    def install(self, signals=(signal.SIGTERM, signal.SIGINT)):
+        """Wraps the server's signal handlers; call from lifespan startup.
+
+        Signals only reach the main thread, so elsewhere (tests) this is a no-op.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return False
+        self._loop = asyncio.get_running_loop()
+        for sig in signals:
+            self._original[sig] = signal.signal(sig, self._on_signal)
+        return True
+
+    def uninstall(self):
+        for sig, handler in self._original.items():
+            signal.signal(sig, handler)
+        self._original.clear()
+
+    def _on_signal(self, sig, frame):
+        if self.draining or sig == signal.SIGINT:
+            self._loop.call_soon_threadsafe(self._hand_over, sig, frame)
+        else:
+            self._loop.call_soon_threadsafe(self._start, sig, frame)
+
+    def _start(self, sig, frame):
+        self.begin()
+        self._handover = self._loop.call_later(self.delay, self._hand_over, sig, frame)
+
+    def _hand_over(self, sig, frame):
+        self.begin()  # already done unless this is a Ctrl-C
+        if self._handover is not None:
+            self._handover.cancel()
+            self._handover = None
+        if self.handed_over is None:
+            self.handed_over = self.clock()
+            if self.started is not None:
+                DRAIN_SECONDS.labels("delay").set(self.handed_over - self.started)
+            log.info("draining: handing over to the server, %d request(s) in flight", self.inflight)
+        # Put the server's handler back and let it see the signal itself.
+        original = self._original.pop(sig, signal.SIG_DFL)
+        signal.signal(sig, original)
+        signal.raise_signal(sig)
+
+    def begin(self):
+        if self.draining:
+            return
+        self.draining = True
+        self.started = self.clock()
+        DRAINING.set(1)
+        log.warning(
+            "draining: readiness failing, %d request(s) in flight, closing the socket in %gs",
+            self.inflight, self.delay,
+        )
+        for callback in self._callbacks:
+            callback()
+
+    async def shutdown(self, steps):
+        """Awaits each (name, coroutine) in order, all within ``background_timeout``."""
+        started = self.clock()
+        if self.handed_over is not None:
+            DRAIN_SECONDS.labels("requests").set(started - self.handed_over)
+        deadline = started + self.background_timeout
+        for name, step in steps:
+            try:
+                await asyncio.wait_for(step, max(0.0, deadline - self.clock()))
+            except asyncio.TimeoutError:
+                log.error("shutdown: %s did not stop within %gs, cancelled", name, self.background_timeout)
+            except Exception:
+                log.exception("shutdown: stopping %s failed", name)
+        finished = self.clock()
+        DRAIN_SECONDS.labels("background").set(finished - started)
+        if self.started is not None:
+            DRAIN_SECONDS.labels("total").set(finished - self.started)
+            log.info("drained in %.2fs", finished - self.started)
+
+
+# =======================
+# Drain middleware - in-flight count and "Connection: close" while draining
+# =======================
+class DrainMiddleware:
+    def __init__(self, app, coordinator):
+        self.app = app
+        self.coordinator = coordinator
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        coordinator = self.coordinator
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and coordinator.draining:
+                headers = [
+                    (name, value) for name, value in message.get("headers", ())
+                    if name.lower() != b"connection"
+                ]
+                headers.append((b"connection", b"close"))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        coordinator.inflight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            coordinator.inflight -= 1
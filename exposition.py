@@ -0,0 +1,87 @@
+import gzip, threading, time
+
+from prometheus_client import REGISTRY, generate_latest
+from prometheus_client.openmetrics import exposition as openmetrics
+
+CONTENT_TYPE_TEXT = "text/plain; version=0.0.4; charset=utf-8"
+CONTENT_TYPE_OPENMETRICS = openmetrics.CONTENT_TYPE_LATEST
+
+
+# =======================
+# Content negotiation
+# =======================
+def quality_values(header):
+    """{lower-cased name: highest q} for an Accept-style header; q defaults to 1."""
+    values = {}
+    for part in (header or "").split(","):
+        name, *params = part.split(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        values[name] = max(q, values.get(name, 0.0))
+    return values
+
+
+def wants_openmetrics(accept):
+    """OpenMetrics only if asked for explicitly and not ranked below text/plain."""
+    values = quality_values(accept)
+    openmetrics_q = values.get("application/openmetrics-text", 0.0)
+    text_q = values.get("text/plain", values.get("text/*", values.get("*/*", 0.0)))
+    return openmetrics_q > 0 and openmetrics_q >= text_q
+
+
+def accepts_encoding(accept_encoding, coding):
+    return quality_values(accept_encoding).get(coding, 0.0) > 0
+
+
+def accepts_gzip(accept_encoding):
+    return accepts_encoding(accept_encoding, "gzip")
+
+
+# =======================
+# Cached exposition
+# =======================
+class ExpositionCache:
+    """Renders a registry once per ``ttl`` window per (format, encoding).
+
+    Concurrent scrapers (including HA Prometheus pairs) that land inside the
+    same window share a single render and a single gzip pass.
+    """
+
+    def __init__(self, registry=REGISTRY, ttl=1.0):
+        self.registry = registry
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.RLock()
+
+    def render(self, openmetrics_format=False, compress=False):
+        key = (openmetrics_format, compress)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        with self._lock:
+            # Another thread may have refreshed the entry while we waited.
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry is not None and entry[0] > now:
+                return entry[1]
+            if compress:
+                body = gzip.compress(self.render(openmetrics_format), compresslevel=6)
+            elif openmetrics_format:
+                body = openmetrics.generate_latest(self.registry)
+            else:
+                body = generate_latest(self.registry)
+            self._entries[key] = (now + self.ttl, body)
+            return body
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
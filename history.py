@@ -0,0 +1,170 @@
+import math
+from array import array
+
+# =======================
+# Fixed-memory multi-resolution history
+# =======================
+# Every tier is a ring of fixed-width buckets holding min/max/sum/count per
+# series in flat ``array`` columns - no per-sample objects. With the default
+# tiers and three series the whole store is allocated up front:
+#
+#   slots  = 3600 (1 s, 1 h) + 2160 (10 s, 6 h) + 1440 (1 min, 24 h) = 7200
+#   bytes  = slots * (8 bucket id + 3 series * (8 min + 8 max + 8 sum + 4 count))
+#          = 7200 * 92 = ~660 KB
+#
+# which leaves the 256Mi pod limit untouched no matter how long the pod runs.
+
+SERIES = ("cpu", "memory", "requests")
+DEFAULT_TIERS = ((1, 3600), (10, 2160), (60, 1440))
+MAX_POINTS = 1000
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(value):
+    """Parses ``90``, ``"90"``, ``"30s"``, ``"5m"``, ``"1h"`` into seconds."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = value.strip()
+    if value and value[-1] in _UNITS:
+        return float(value[:-1]) * _UNITS[value[-1]]
+    return float(value)
+
+
+class _Tier:
+    def __init__(self, resolution, capacity, series):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.last_bucket = None
+        self.buckets = array("q", [-1]) * capacity
+        self.columns = {}
+        for name in series:
+            self.columns[name] = (
+                array("d", [math.inf]) * capacity,   # min
+                array("d", [-math.inf]) * capacity,  # max
+                array("d", [0.0]) * capacity,        # sum
+                array("I", [0]) * capacity,          # count
+            )
+
+    @property
+    def span(self):
+        return self.resolution * self.capacity
+
+    def nbytes(self):
+        total = self.buckets.itemsize * self.capacity
+        for column in self.columns.values():
+            total += sum(part.itemsize * self.capacity for part in column)
+        return total
+
+    def _clear(self, index, bucket):
+        self.buckets[index] = bucket
+        for mins, maxs, sums, counts in self.columns.values():
+            mins[index] = math.inf
+            maxs[index] = -math.inf
+            sums[index] = 0.0
+            counts[index] = 0
+
+    def add(self, timestamp, values):
+        bucket = int(timestamp // self.resolution)
+        if self.last_bucket is None or bucket > self.last_bucket:
+            # Empty every bucket we skipped over so stale data never leaks
+            # into a query window.
+            first = bucket - self.capacity + 1
+            if self.last_bucket is not None:
+                first = max(first, self.last_bucket + 1)
+            for missing in range(first, bucket + 1):
+                self._clear(missing % self.capacity, missing)
+            self.last_bucket = bucket
+
+        index = bucket % self.capacity
+        if self.buckets[index] != bucket:
+            return  # older than anything this tier still holds
+        for name, value in values.items():
+            column = self.columns.get(name)
+            if column is None:
+                continue
+            mins, maxs, sums, counts = column
+            if value < mins[index]:
+                mins[index] = value
+            if value > maxs[index]:
+                maxs[index] = value
+            sums[index] += value
+            counts[index] += 1
+
+    def _slices(self, column, first, last):
+        # Ring positions for buckets first..last, split in two when they wrap.
+        start, stop = first % self.capacity, last % self.capacity + 1
+        if start < stop:
+            return (column[start:stop],)
+        return column[start:], column[:stop]
+
+    def aggregate(self, name, first, last):
+        first = max(first, self.last_bucket - self.capacity + 1)
+        last = min(last, self.last_bucket)
+        if first > last:
+            return None
+        mins, maxs, sums, counts = self.columns[name]
+        count = sum(sum(part) for part in self._slices(counts, first, last))
+        if not count:
+            return None
+        # Empty buckets hold +inf/-inf/0/0, so plain C-level min/max/sum over
+        # the raw slices give the right answer without filtering.
+        return (
+            min(min(part) for part in self._slices(mins, first, last)),
+            max(max(part) for part in self._slices(maxs, first, last)),
+            sum(sum(part) for part in self._slices(sums, first, last)) / count,
+        )
+
+
+class History:
+    def __init__(self, tiers=DEFAULT_TIERS, series=SERIES):
+        self.series = tuple(series)
+        self.tiers = [_Tier(resolution, capacity, self.series) for resolution, capacity in tiers]
+
+    def nbytes(self):
+        return sum(tier.nbytes() for tier in self.tiers)
+
+    def record(self, timestamp, **values):
+        for tier in self.tiers:
+            tier.add(timestamp, values)
+
+    def _pick_tier(self, range_seconds, step):
+        # Finest tier that still covers the range and is no coarser than the step.
+        candidates = [tier for tier in self.tiers if tier.span >= range_seconds]
+        if not candidates:
+            return max(self.tiers, key=lambda tier: tier.span)
+        fitting = [tier for tier in candidates if tier.resolution <= step]
+        if fitting:
+            return max(fitting, key=lambda tier: tier.resolution)
+        return min(candidates, key=lambda tier: tier.resolution)
+
+    def query(self, series, range_seconds, step, now):
+        """Returns min/max/avg per ``step`` seconds over the last ``range_seconds``."""
+        if series not in self.series:
+            raise KeyError(series)
+        if not (0 < range_seconds < math.inf and 0 < step < math.inf):
+            raise ValueError("range and step must be positive and finite")
+        step = max(step, range_seconds / MAX_POINTS)
+        tier = self._pick_tier(range_seconds, step)
+        per_step = max(1, round(step / tier.resolution))
+        step = per_step * tier.resolution
+
+        points = []
+        if tier.last_bucket is not None:
+            end = int(now // tier.resolution)
+            start = end - int(math.ceil(range_seconds / step)) * per_step + 1
+            for first in range(start, end + 1, per_step):
+                result = tier.aggregate(series, first, first + per_step - 1)
+                timestamp = first * tier.resolution
+                if result is None:
+                    points.append([timestamp, None, None, None])
+                else:
+                    points.append([timestamp, *result])
+        return {
+            "series": series,
+            "columns": ["time", "min", "max", "avg"],
+            "range": range_seconds,
+            "step": step,
+            "resolution": tier.resolution,
+            "points": points,
+        }
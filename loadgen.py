@@ -0,0 +1,231 @@
+import asyncio, itertools, logging, multiprocessing, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import (
+    LOADGEN_ACTIVE, LOADGEN_CPU_CORES, LOADGEN_LATENCY, LOADGEN_MEMORY_BYTES, LOADGEN_RUNS,
+)
+
+log = logging.getLogger(__name__)
+
+# =======================
+# Synthetic load for HPA tuning
+# =======================
+# Three kinds of run, at most one of each at a time, every one bounded by a
+# duration and by caps fixed at startup:
+#
+#   cpu      busy-loops in a spawned process pool (separate interpreters, so
+#            the GIL and the event loop are untouched) on N cores at a duty
+#            cycle, in short chunks so a cancel lands within ~100 ms
+#   memory   allocates and touches buffers up to a size, holds them, frees them
+#   latency  delays matching requests before they reach the app
+#
+# Probes and the control endpoint itself are never delayed.
+
+KINDS = ("cpu", "memory", "latency")
+PROTECTED_PATHS = frozenset({"/health", "/ready", "/api/loadgen"})
+PAGE_SIZE = 4096
+MEMORY_CHUNK = 16 << 20
+
+
+def burn(seconds, utilization):
+    """Runs in a pool worker: spin for ``utilization`` of ``seconds``, sleep the rest."""
+    deadline = time.perf_counter() + seconds * utilization
+    while time.perf_counter() < deadline:
+        pass
+    if utilization < 1:
+        time.sleep(seconds * (1 - utilization))
+
+
+class Run:
+    def __init__(self, run_id, kind, seconds, params):
+        self.id = run_id
+        self.kind = kind
+        self.seconds = seconds
+        self.params = params
+        self.state = "running"
+        self.started = time.monotonic()
+        self.started_at = time.time()
+        self.finished_at = None
+        self.task = None
+
+    def as_dict(self):
+        remaining = None
+        if self.state == "running":
+            remaining = max(0.0, self.seconds - (time.monotonic() - self.started))
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "seconds": self.seconds,
+            "remaining": remaining,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            **self.params,
+        }
+
+
+class LoadGenerator:
+    def __init__(self, max_seconds=600.0, max_cores=2, max_memory_bytes=128 << 20,
+                 max_latency=5.0, chunk=0.1):
+        self.max_seconds = max_seconds
+        self.max_cores = max_cores
+        self.max_memory_bytes = max_memory_bytes
+        self.max_latency = max_latency
+        self.chunk = chunk
+        self.active = {}                 # kind -> Run
+        self.finished = deque(maxlen=20)
+        self.delay = 0.0
+        self.delay_routes = ()
+        self.buffers = []
+        self._ids = itertools.count(1)
+
+    # ---- control ----------------------------------------------------------
+    def start(self, kind, seconds, cores=1, utilization=1.0, memory_bytes=0, latency=0.0,
+              routes=()):
+        """Starts a run and returns it, or None if one of that kind is already running.
+
+        Out-of-range values are clamped to the caps; nonsense raises ValueError.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"unknown kind {kind!r}, expected one of {list(KINDS)}")
+        if not 0 < seconds < float("inf"):
+            raise ValueError("seconds must be positive and finite")
+        seconds = min(seconds, self.max_seconds)
+        if kind == "cpu":
+            if cores < 1 or not 0 < utilization <= 1:
+                raise ValueError("cores must be >= 1 and utilization in (0, 1]")
+            params = {"cores": min(cores, self.max_cores), "utilization": utilization}
+            work = self._burn_cpu(**params)
+        elif kind == "memory":
+            if memory_bytes <= 0:
+                raise ValueError("memory must be positive")
+            params = {"memory_bytes": int(min(memory_bytes, self.max_memory_bytes))}
+            work = self._hold_memory(**params)
+        else:
+            routes = tuple(route for route in routes if route)
+            if latency <= 0 or not routes:
+                raise ValueError("latency must be positive and at least one route given")
+            params = {"latency": min(latency, self.max_latency), "routes": list(routes)}
+            work = self._inject_latency(**params)
+
+        if kind in self.active:
+            work.close()
+            return None
+        run = Run(next(self._ids), kind, seconds, params)
+        self.active[kind] = run
+        LOADGEN_ACTIVE.labels(kind).set(1)
+        run.task = asyncio.get_running_loop().create_task(self._supervise(run, work))
+        run.task.add_done_callback(lambda task: self._finished(run, work))
+        return run
+
+    def cancel(self, run_id=None):
+        """Cancels one run (or all); returns the runs that were cancelled."""
+        runs = [run for run in self.active.values() if run_id is None or run.id == run_id]
+        for run in runs:
+            run.task.cancel()
+        return runs
+
+    async def stop(self):
+        runs = self.cancel()
+        await asyncio.gather(*(run.task for run in runs), return_exceptions=True)
+
+    def status(self):
+        return {
+            "active": [run.as_dict() for run in self.active.values()],
+            "finished": [run.as_dict() for run in reversed(self.finished)],
+            "limits": {
+                "max_seconds": self.max_seconds,
+                "max_cores": self.max_cores,
+                "max_memory_bytes": self.max_memory_bytes,
+                "max_latency": self.max_latency,
+            },
+        }
+
+    async def _supervise(self, run, work):
+        try:
+            await asyncio.wait_for(work, run.seconds)
+        except asyncio.TimeoutError:
+            run.state = "completed"
+        except asyncio.CancelledError:
+            run.state = "cancelled"
+        except Exception:
+            log.exception("load generator %s run %d failed", run.kind, run.id)
+            run.state = "failed"
+
+    def _finished(self, run, work):
+        # Also reached when a run is cancelled before its task ever started.
+        work.close()
+        if run.state == "running":
+            run.state = "cancelled"
+        run.finished_at = time.time()
+        LOADGEN_ACTIVE.labels(run.kind).set(0)
+        LOADGEN_RUNS.labels(run.kind, run.state).inc()
+        del self.active[run.kind]
+        self.finished.append(run)
+
+    # ---- kinds of load (each runs until cancelled) ----------------------------
+    async def _burn_cpu(self, cores, utilization):
+        loop = asyncio.get_running_loop()
+        # spawn, not fork: forking a threaded server process is asking for trouble.
+        pool = ProcessPoolExecutor(cores, mp_context=multiprocessing.get_context("spawn"))
+        LOADGEN_CPU_CORES.set(cores * utilization)
+        try:
+            while True:
+                await asyncio.gather(*(
+                    loop.run_in_executor(pool, burn, self.chunk, utilization) for _ in range(cores)
+                ))
+        finally:
+            LOADGEN_CPU_CORES.set(0)
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _hold_memory(self, memory_bytes):
+        try:
+            allocated = 0
+            while allocated < memory_bytes:
+                size = min(MEMORY_CHUNK, memory_bytes - allocated)
+                buffer = bytearray(size)
+                # bytearray() memory is lazily mapped zeros; write a byte per
+                # page so it is really resident and shows up in the cgroup.
+                buffer[::PAGE_SIZE] = b"\x01" * -(-size // PAGE_SIZE)
+                self.buffers.append(buffer)
+                allocated += size
+                LOADGEN_MEMORY_BYTES.set(allocated)
+                await asyncio.sleep(0)
+            await asyncio.Event().wait()
+        finally:
+            self.buffers.clear()
+            LOADGEN_MEMORY_BYTES.set(0)
+
+    async def _inject_latency(self, latency, routes):
+        self.delay, self.delay_routes = latency, tuple(routes)
+        LOADGEN_LATENCY.set(latency)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self.delay, self.delay_routes = 0.0, ()
+            LOADGEN_LATENCY.set(0)
+
+    def delay_for(self, path):
+        if not self.delay or path in PROTECTED_PATHS:
+            return 0.0
+        for route in self.delay_routes:
+            if path == route or (route.endswith("*") and path.startswith(route[:-1])):
+                return self.delay
+        return 0.0
+
+
+# =======================
+# Latency injection middleware
+# =======================
+class LatencyInjectionMiddleware:
+    def __init__(self, app, generator):
+        self.app = app
+        self.generator = generator
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            delay = self.generator.delay_for(scope["path"])
+            if delay:
+                await asyncio.sleep(delay)
+        await self.app(scope, receive, send)
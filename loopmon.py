@@ -0,0 +1,120 @@
+import asyncio, time
+from collections import deque
+
+import anyio.to_thread
+
+from metrics import (
+    LOOP_LAG, THREADPOOL_IN_USE, THREADPOOL_QUEUE_WAIT, THREADPOOL_SIZE, THREADPOOL_WAITING,
+)
+
+# =======================
+# Event-loop lag and threadpool saturation monitor
+# =======================
+# Lag is how late a timer fires compared with when it was scheduled: anything
+# hogging the loop (sync work in async handlers, huge responses) shows up here.
+# Threadpool pressure is read off anyio's default limiter (which runs every
+# sync FastAPI handler) plus a periodic no-op probe that measures how long a
+# job waits for a free worker thread.
+
+
+class LoopMonitor:
+    def __init__(self, interval=0.25, probe_interval=1.0, window=8):
+        self.interval = interval
+        self.probe_interval = probe_interval
+        self.lags = deque([0.0], maxlen=window)
+        self.queue_waits = deque([0.0], maxlen=window)
+        self.in_use = 0
+        self.size = 0
+        self.waiting = 0
+        self._probe_started = None
+        self._tasks = []
+
+    @property
+    def lag(self):
+        # Worst lag over the recent window, so one good tick doesn't hide a stall.
+        return max(self.lags)
+
+    @property
+    def queue_wait(self):
+        # A probe still stuck in the queue counts for as long as it has waited.
+        pending = time.perf_counter() - self._probe_started if self._probe_started else 0.0
+        return max(max(self.queue_waits), pending)
+
+    def utilization(self):
+        return self.in_use / self.size if self.size else 0.0
+
+    def read_threadpool(self):
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        self.in_use = limiter.borrowed_tokens
+        self.size = limiter.total_tokens
+        self.waiting = limiter.statistics().tasks_waiting
+        THREADPOOL_IN_USE.set(self.in_use)
+        THREADPOOL_SIZE.set(self.size)
+        THREADPOOL_WAITING.set(self.waiting)
+
+    async def _watch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.lags.append(lag)
+            LOOP_LAG.observe(lag)
+            self.read_threadpool()
+
+    async def _probe_threadpool(self):
+        while True:
+            self._probe_started = time.perf_counter()
+            started = await anyio.to_thread.run_sync(time.perf_counter)
+            wait = max(0.0, started - self._probe_started)
+            self._probe_started = None
+            self.queue_waits.append(wait)
+            THREADPOOL_QUEUE_WAIT.observe(wait)
+            await asyncio.sleep(self.probe_interval)
+
+    def start(self):
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._watch_loop()), loop.create_task(self._probe_threadpool())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+
+# =======================
+# Readiness
+# =======================
+class ReadinessCheck:
+    """Turns monitor readings into a ready/not-ready verdict for /ready."""
+
+    def __init__(self, monitor, max_loop_lag=0.5, max_queue_wait=1.0, max_waiting=20):
+        self.monitor = monitor
+        self.max_loop_lag = max_loop_lag
+        self.max_queue_wait = max_queue_wait
+        self.max_waiting = max_waiting
+
+    def check(self):
+        monitor = self.monitor
+        reasons = []
+        if monitor.lag > self.max_loop_lag:
+            reasons.append(f"event loop lag {monitor.lag:.3f}s > {self.max_loop_lag}s")
+        if monitor.queue_wait > self.max_queue_wait:
+            reasons.append(f"threadpool queue wait {monitor.queue_wait:.3f}s > {self.max_queue_wait}s")
+        if monitor.waiting > self.max_waiting:
+            reasons.append(f"{monitor.waiting} jobs waiting for the threadpool > {self.max_waiting}")
+        return not reasons, {
+            "loop_lag": round(monitor.lag, 4),
+            "threadpool_in_use": monitor.in_use,
+            "threadpool_size": monitor.size,
+            "threadpool_waiting": monitor.waiting,
+            "threadpool_queue_wait": round(monitor.queue_wait, 4),
+            "reasons": reasons,
+        }
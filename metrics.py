@@ -0,0 +1,331 @@
+import glob, os
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+from prometheus_client.core import (
+    CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily, SummaryMetricFamily,
+)
+from prometheus_client.samples import Sample
+from prometheus_client.utils import floatToGoString
+
+import config
+
+
+# =======================
+# Multi-worker support
+# =======================
+# prometheus_client picks its value backend at import time, so the directory
+# has to be in the environment before the worker process starts (see serve.py).
+def multiprocess_enabled():
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def mark_process_dead(pid=None):
+    # Drops this worker's live* gauge files so they stop showing up after exit.
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+# =======================
+# Prometheus Metrics
+# =======================
+# Request metrics are labelled by route template, never the raw path, so
+# cardinality is bounded by the number of routes.
+REQUEST_COUNT = Counter(
+    "app_requests_total", "Total HTTP requests", ["route", "method", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "app_request_duration_seconds", "HTTP request latency in seconds",
+    ["route", "method"], buckets=config.REQUEST_LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "app_requests_in_progress", "HTTP requests currently being served",
+    multiprocess_mode="livesum",
+)
+# Label sets per guarded metric (cardinality.GuardedMetric).
+METRIC_SERIES = Gauge(
+    "app_metric_series", "Label sets a guarded metric currently holds", ["metric"],
+    multiprocess_mode="livesum",
+)
+SERIES_DROPPED = Counter(
+    "app_metric_series_dropped_total", "New label sets folded into the overflow series at the cap",
+    ["metric"],
+)
+SERIES_EVICTED = Counter(
+    "app_metric_series_evicted_total", "Label sets evicted as idle or least recently used",
+    ["metric"],
+)
+SERIES_RETIRED = Counter(
+    "app_metric_series_retired_total", "What evicted counter label sets had counted when they went",
+    ["metric"],
+)
+# Every worker samples the same host, so the freshest live value is the right one.
+CPU_USAGE = Gauge(
+    "cpu_usage_percent", "CPU usage percent", multiprocess_mode="livemostrecent"
+)
+MEMORY_USAGE = Gauge(
+    "memory_usage_percent", "Memory usage percent", multiprocess_mode="livemostrecent"
+)
+CPU_LIMIT = Gauge(
+    "cpu_limit_cores", "CPU cores available (cgroup quota, or host cores)",
+    multiprocess_mode="livemostrecent",
+)
+CPU_THROTTLED = Gauge(
+    "cpu_throttled_ratio", "Fraction of CFS periods throttled since the last sample",
+    multiprocess_mode="livemostrecent",
+)
+MEMORY_BYTES = Gauge(
+    "memory_usage_bytes", "Memory in use (cgroup, or host used)", multiprocess_mode="livemostrecent"
+)
+MEMORY_LIMIT = Gauge(
+    "memory_limit_bytes", "Memory limit (cgroup, or host total)", multiprocess_mode="livemostrecent"
+)
+
+ADMISSION_TOTAL = Counter(
+    "app_admission_total", "Admission decisions by route class (admitted, queued, shed)",
+    ["route_class", "outcome"],
+)
+ADMISSION_LIMIT = Gauge(
+    "app_admission_limit", "Current adaptive concurrency limit per route class",
+    ["route_class"], multiprocess_mode="livesum",
+)
+
+LOOP_LAG = Histogram(
+    "app_event_loop_lag_seconds", "How late event-loop timers fire",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+THREADPOOL_QUEUE_WAIT = Histogram(
+    "app_threadpool_queue_wait_seconds", "Time a job waits for a free threadpool worker",
+    buckets=(0.0001, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+THREADPOOL_IN_USE = Gauge(
+    "app_threadpool_in_use", "Threadpool workers currently busy", multiprocess_mode="livesum"
+)
+THREADPOOL_SIZE = Gauge(
+    "app_threadpool_size", "Threadpool capacity", multiprocess_mode="livesum"
+)
+THREADPOOL_WAITING = Gauge(
+    "app_threadpool_waiting", "Jobs queued for a threadpool worker", multiprocess_mode="livesum"
+)
+
+PUSH_BATCHES = Counter(
+    "app_push_batches_total", "Push exporter batches by outcome (sent, failed, rejected, dropped)",
+    ["outcome"],
+)
+PUSH_BUFFERED = Gauge(
+    "app_push_buffered_batches", "Batches waiting in the push exporter buffer",
+    multiprocess_mode="livesum",
+)
+
+ALERT_STATE = Gauge(
+    "app_alert_state", "Alert rule state: 0 ok, 1 pending, 2 firing", ["alert"],
+    multiprocess_mode="livemax",
+)
+
+SAMPLE_LOG_RECOVERED = Gauge(
+    "app_sample_log_recovered_records", "Records found in the sample log at startup (valid, torn)",
+    ["outcome"], multiprocess_mode="livemax",
+)
+
+DEBUG_SESSIONS = Counter(
+    "app_debug_sessions_total", "Profiling sessions by kind and outcome (completed, busy, denied)",
+    ["kind", "outcome"],
+)
+
+LOADGEN_ACTIVE = Gauge(
+    "app_loadgen_active", "1 while a synthetic load run of this kind is active", ["kind"],
+    multiprocess_mode="livesum",
+)
+LOADGEN_CPU_CORES = Gauge(
+    "app_loadgen_cpu_cores", "Cores' worth of CPU the load generator is burning",
+    multiprocess_mode="livesum",
+)
+LOADGEN_MEMORY_BYTES = Gauge(
+    "app_loadgen_memory_bytes", "Bytes the load generator is holding", multiprocess_mode="livesum",
+)
+LOADGEN_LATENCY = Gauge(
+    "app_loadgen_latency_seconds", "Delay the load generator adds to matching requests",
+    multiprocess_mode="livemax",
+)
+LOADGEN_RUNS = Counter(
+    "app_loadgen_runs_total", "Finished load generator runs by kind and outcome "
+    "(completed, cancelled, failed)", ["kind", "outcome"],
+)
+
+COLLECTOR_DURATION = Histogram(
+    "app_collector_duration_seconds", "Time one read of a pluggable metric source took",
+    ["collector"], buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5),
+)
+COLLECTOR_OVERRUNS = Counter(
+    "app_collector_overruns_total", "Source reads over their budget or still running when due again",
+    ["collector"],
+)
+COLLECTOR_ERRORS = Counter(
+    "app_collector_errors_total", "Source reads that raised", ["collector"],
+)
+COLLECTOR_INTERVAL = Gauge(
+    "app_collector_interval_seconds", "Current interval of each metric source, backoff included",
+    ["collector"], multiprocess_mode="livemax",
+)
+
+DRAINING = Gauge(
+    "app_draining", "1 once SIGTERM has been received and the process is draining",
+    multiprocess_mode="livemax",
+)
+DRAIN_SECONDS = Gauge(
+    "app_drain_duration_seconds",
+    "Seconds each shutdown phase took (delay, requests, background, total)", ["phase"],
+    multiprocess_mode="livemax",
+)
+
+STARTUP_PHASE = Gauge(
+    "app_startup_phase_seconds", "Seconds from process start until each startup phase finished",
+    ["phase"], multiprocess_mode="livemax",
+)
+
+
+class SampleAgeCollector:
+    """Reports how old the sampler's snapshot is at scrape time.
+
+    Computed on collect rather than stored in a Gauge, because multiprocess
+    gauges only see values written to their mmap files.
+    """
+
+    def __init__(self, sampler):
+        self.sampler = sampler
+
+    def collect(self):
+        family = GaugeMetricFamily(
+            "sample_age_seconds", "Seconds since the last CPU/memory sample"
+        )
+        family.add_metric([], self.sampler.snapshot.age)
+        yield family
+
+
+class ProcessInternalsCollector:
+    """GC pauses plus the sampler's latest process stats, formatted at scrape time.
+
+    Everything is read from memory (the GC callback's tallies and the last
+    snapshot), so a scrape costs the same however busy the process is. With
+    several workers the numbers are those of whichever worker served the scrape.
+    """
+
+    def __init__(self, sampler, gc_monitor):
+        self.sampler = sampler
+        self.gc_monitor = gc_monitor
+
+    def collect(self):
+        gc_monitor = self.gc_monitor
+        pauses = HistogramMetricFamily(
+            "app_gc_pause_seconds", "Garbage collector pause duration by generation",
+            labels=["generation"],
+        )
+        collected = CounterMetricFamily(
+            "app_gc_collected_objects", "Objects freed by the garbage collector",
+            labels=["generation"],
+        )
+        uncollectable = CounterMetricFamily(
+            "app_gc_uncollectable_objects", "Unreachable objects the garbage collector could not free",
+            labels=["generation"],
+        )
+        for generation in range(len(gc_monitor.pause_sum)):
+            label = [str(generation)]
+            pauses.add_metric(
+                label,
+                [(floatToGoString(bound), count) for bound, count in gc_monitor.cumulative_buckets(generation)],
+                gc_monitor.pause_sum[generation],
+            )
+            collected.add_metric(label, gc_monitor.collected[generation])
+            uncollectable.add_metric(label, gc_monitor.uncollectable[generation])
+        yield pauses
+        yield collected
+        yield uncollectable
+
+        stats = self.sampler.snapshot.process
+        if stats is None:
+            return
+        yield GaugeMetricFamily("app_process_threads", "OS threads in this process", value=stats.threads)
+        yield GaugeMetricFamily("app_process_open_fds", "Open file descriptors", value=stats.open_fds)
+        yield GaugeMetricFamily(
+            "app_process_resident_memory_bytes", "Resident set size", value=stats.rss_bytes
+        )
+        yield GaugeMetricFamily(
+            "app_process_unique_memory_bytes", "Memory private to this process (USS)",
+            value=stats.uss_bytes,
+        )
+        switches = CounterMetricFamily(
+            "app_process_context_switches", "Context switches by kind", labels=["kind"]
+        )
+        switches.add_metric(["voluntary"], stats.voluntary_switches)
+        switches.add_metric(["involuntary"], stats.involuntary_switches)
+        yield switches
+
+
+class LatencySummaryCollector:
+    """Per-route sliding-window percentiles from the DDSketches, as a summary.
+
+    ``source()`` returns ({route: {window seconds: sketch}}, {route: (count,
+    sum)}), both already merged across workers, so the quantiles are those of
+    the whole pod. Quantiles carry a ``window`` label; _count and _sum are
+    cumulative since start so rate() works on them. Per-window counts are
+    only in /api/stats.
+    """
+
+    def __init__(self, source, quantiles, window_label):
+        self.source = source
+        self.quantiles = quantiles
+        self.window_label = window_label
+
+    def collect(self):
+        family = SummaryMetricFamily(
+            "app_route_latency_seconds", "Request latency percentiles per route over sliding windows",
+            labels=["route"],
+        )
+        snapshot, totals = self.source()
+        for route, (count, total) in sorted(totals.items()):
+            for window, sketch in sorted(snapshot.get(route, {}).items()):
+                if sketch.count:
+                    label = self.window_label(window)
+                    for q, value in zip(self.quantiles, sketch.quantiles(self.quantiles)):
+                        family.samples.append(Sample(
+                            family.name,
+                            {"route": route, "window": label, "quantile": floatToGoString(q)},
+                            value,
+                        ))
+            family.add_metric([route], count_value=count, sum_value=total)
+        yield family
+
+
+def scrape_registry():
+    # In multi-worker mode scrapes merge every worker's files; otherwise the
+    # in-process default registry already has everything.
+    if not multiprocess_enabled():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def counter_total(counter, **labels):
+    """Sum of a counter's ``_total`` samples, aggregated across workers when needed.
+
+    ``labels`` keeps only the samples with those label values.
+
+    In multiprocess mode this merges only the counter .db files and keeps only
+    this counter's family, rather than collecting a whole scrape registry. It
+    still reads files, so call it off the event loop.
+    """
+    if multiprocess_enabled():
+        names = {family.name for family in counter.describe()}
+        paths = glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "counter_*.db"))
+        families = [
+            family for family in multiprocess.MultiProcessCollector.merge(paths, accumulate=True)
+            if family.name in names
+        ]
+    else:
+        families = counter.collect()
+    return sum(
+        sample.value
+        for family in families
+        for sample in family.samples
+        if sample.name.endswith("_total") and labels.items() <= sample.labels.items()
+    )
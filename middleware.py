@@ -0,0 +1,66 @@
+import time
+
+from cardinality import guard
+from metrics import REQUEST_COUNT, REQUEST_LATENCY, REQUESTS_IN_PROGRESS
+
+# Label used for requests that did not match any route (404s, scanners).
+UNMATCHED_ROUTE = "<unmatched>"
+# The method is whatever token the client sent; anything outside the standard
+# ones is labelled OTHER_METHOD so clients can't mint new series with it.
+METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "DELETE", "PATCH", "OPTIONS", "CONNECT", "TRACE"))
+OTHER_METHOD = "other"
+
+
+# =======================
+# Request instrumentation - pure ASGI, no BaseHTTPMiddleware
+# =======================
+class InstrumentationMiddleware:
+    """Counts requests and observes latency per route template, method and status.
+
+    Metric children are looked up through a cardinality guard (an LRU of
+    label sets), so the hot path is a dict lookup plus an inc/observe and
+    nothing a client sends can grow the registry past the cap. An optional
+    ``latency`` tracker (sketch.LatencyTracker) also gets every duration for
+    percentiles.
+    """
+
+    def __init__(self, app, counter=REQUEST_COUNT, histogram=REQUEST_LATENCY,
+                 in_progress=REQUESTS_IN_PROGRESS, latency=None, max_series=1000):
+        self.app = app
+        self.latency = latency
+        self.counter = guard(counter, max_series=max_series)
+        self.histogram = guard(histogram, max_series=max_series)
+        self.in_progress = in_progress
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            self.in_progress.dec()
+            route = scope.get("route")
+            method = scope["method"]
+            self.record(
+                route.path if route is not None else UNMATCHED_ROUTE,
+                method if method in METHODS else OTHER_METHOD, status, duration,
+            )
+
+    def record(self, route, method, status, duration):
+        self.counter.labels(route, method, str(status)).inc()
+        self.histogram.labels(route, method).observe(duration)
+        if self.latency is not None:
+            self.latency.add(route, duration)
@@ -0,0 +1,797 @@
+import asyncio, gzip, hashlib, json, secrets
+from html import escape
+from string import Formatter
+
+from starlette.responses import Response
+
+from exposition import accepts_encoding
+
+try:
+    import brotli
+except ImportError:  # optional: pages are still served gzip/identity without it
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+HTML_MEDIA_TYPE = "text/html; charset=utf-8"
+# Dynamic pages smaller than this are not worth a gzip pass.
+MIN_COMPRESS_SIZE = 1024
+
+
+def etag_matches(if_none_match, etags):
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") in etags:
+            return True
+    return False
+
+
+# =======================
+# Static pages - rendered, compressed and hashed once
+# =======================
+class StaticPage:
+    """A fixed page with identity, gzip and (if available) brotli variants.
+
+    Each variant carries its own strong ETag; a conditional request matching
+    any of them gets a 304 since they all encode the same document.
+    """
+
+    def __init__(self, html, cache_control="public, max-age=300"):
+        self.html = html
+        self.cache_control = cache_control
+        self._variants = None
+
+    @property
+    def variants(self):
+        # Built on first use (or by warm() in the background) so compressing
+        # at brotli's top quality never sits on the startup path.
+        if self._variants is None:
+            self.warm()
+        return self._variants
+
+    def warm(self):
+        body = self.html.encode()
+        digest = hashlib.sha256(body).hexdigest()[:20]
+        variants = {"identity": (body, f'"{digest}"')}
+        variants["gzip"] = (gzip.compress(body, compresslevel=9, mtime=0), f'"{digest}-gz"')
+        if brotli is not None:
+            variants["br"] = (brotli.compress(body, quality=11), f'"{digest}-br"')
+        self.etags = {etag for _, etag in variants.values()}
+        self._variants = variants
+
+    def choose_encoding(self, accept_encoding):
+        for coding in ("br", "gzip"):
+            if coding in self.variants and accepts_encoding(accept_encoding, coding):
+                return coding
+        return "identity"
+
+    def response(self, request):
+        coding = self.choose_encoding(request.headers.get("accept-encoding"))
+        body, etag = self.variants[coding]
+        headers = {"ETag": etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("if-none-match"), self.etags):
+            return Response(status_code=304, headers=headers)
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return Response(body, media_type=HTML_MEDIA_TYPE, headers=headers)
+
+
+# =======================
+# JSON bodies encoded once per version
+# =======================
+def json_bytes(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+class VersionedJSON:
+    """A JSON body rebuilt only when its version changes, served with an ETag.
+
+    Every request within a version reuses the same encoded bytes, and a client
+    revalidating with the current ETag gets an empty 304. The per-process
+    nonce keeps versions from different workers or pods from sharing a tag.
+    """
+
+    def __init__(self, cache_control="no-cache"):
+        self.cache_control = cache_control
+        self.nonce = secrets.token_hex(4)
+        self.version = None
+        self.body = None
+        self.etag = None
+
+    def current(self, version):
+        return version == self.version and self.body is not None
+
+    def _store(self, version, body):
+        self.body = body
+        self.etag = f'"{self.nonce}-{version}"'
+        self.version = version
+        return body, self.etag
+
+    def response(self, request, version, build):
+        if self.current(version):
+            body, etag = self.body, self.etag
+        else:
+            body, etag = self._store(version, json_bytes(build()))
+        return self._respond(request, body, etag)
+
+    async def response_in_thread(self, request, version, build):
+        """Like response(), but ``build`` and the encoding run in a worker thread."""
+        if self.current(version):
+            body, etag = self.body, self.etag
+        else:
+            body, etag = self._store(version, await asyncio.to_thread(lambda: json_bytes(build())))
+        return self._respond(request, body, etag)
+
+    def _respond(self, request, body, etag):
+        headers = {"ETag": etag, "Cache-Control": self.cache_control}
+        if etag_matches(request.headers.get("if-none-match"), (etag,)):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+
+# =======================
+# Dynamic pages - static chunks precomputed, only values formatted per hit
+# =======================
+class PageTemplate:
+    """``str.format``-style template split once into pre-encoded literal chunks."""
+
+    def __init__(self, source):
+        self.chunks = []
+        self.fields = []
+        literal = []
+        for text, field, spec, conversion in Formatter().parse(source):
+            literal.append(text)
+            if field is not None:
+                self.chunks.append("".join(literal).encode())
+                self.fields.append((field, spec or ""))
+                literal = []
+        self.chunks.append("".join(literal).encode())
+
+    def render(self, **values):
+        parts = [self.chunks[0]]
+        for (name, spec), chunk in zip(self.fields, self.chunks[1:]):
+            parts.append(format(values[name], spec).encode())
+            parts.append(chunk)
+        return b"".join(parts)
+
+
+class RenderedPage:
+    """A dynamic page rendered, and gzipped, at most once per version.
+
+    ``render(version)`` runs only when the version changes (an equality
+    check, which for the cached exposition bytes stops at identity).
+    The gzip variant is built on the first request that accepts it.
+    """
+
+    def __init__(self, render):
+        self.render = render
+        self._entry = None
+
+    def response(self, request, version):
+        entry = self._entry
+        if entry is None or entry[0] != version:
+            # One list per version, swapped in whole: a concurrent request
+            # still holding the old entry never sees a mix of versions.
+            self._entry = entry = [version, self.render(version), None]
+        body = entry[1]
+        headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if len(body) >= MIN_COMPRESS_SIZE and accepts_encoding(request.headers.get("accept-encoding"), "gzip"):
+            if entry[2] is None:
+                entry[2] = gzip.compress(body, compresslevel=6)
+            body = entry[2]
+            headers["Content-Encoding"] = "gzip"
+        return Response(body, media_type=HTML_MEDIA_TYPE, headers=headers)
+
+
+# =======================
+# Landing page
+# =======================
+LANDING_HTML = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Health Metrics Service</title>
+    <style>
+        * {
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }
+        body {
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            min-height: 100vh;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            padding: 20px;
+        }
+        .container {
+            background: rgba(255, 255, 255, 0.95);
+            border-radius: 24px;
+            padding: 60px 40px;
+            max-width: 600px;
+            box-shadow: 0 20px 60px rgba(0,0,0,0.3);
+            text-align: center;
+        }
+        h1 {
+            font-size: 2.5rem;
+            color: #667eea;
+            margin-bottom: 20px;
+            font-weight: 700;
+        }
+        .emoji {
+            font-size: 4rem;
+            margin-bottom: 20px;
+        }
+        p {
+            color: #4a5568;
+            font-size: 1.1rem;
+            line-height: 1.6;
+            margin-bottom: 40px;
+        }
+        .links {
+            display: grid;
+            gap: 15px;
+        }
+        .link-btn {
+            display: block;
+            padding: 18px 30px;
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            color: white;
+            text-decoration: none;
+            border-radius: 12px;
+            font-weight: 600;
+            font-size: 1.1rem;
+            transition: all 0.3s ease;
+            box-shadow: 0 4px 15px rgba(102, 126, 234, 0.4);
+        }
+        .link-btn:hover {
+            transform: translateY(-2px);
+            box-shadow: 0 6px 20px rgba(102, 126, 234, 0.6);
+        }
+        .link-btn.secondary {
+            background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
+            box-shadow: 0 4px 15px rgba(245, 87, 108, 0.4);
+        }
+        .link-btn.secondary:hover {
+            box-shadow: 0 6px 20px rgba(245, 87, 108, 0.6);
+        }
+        .link-btn.tertiary {
+            background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
+            box-shadow: 0 4px 15px rgba(79, 172, 254, 0.4);
+        }
+        .link-btn.tertiary:hover {
+            box-shadow: 0 6px 20px rgba(79, 172, 254, 0.6);
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="emoji">🚀</div>
+        <h1>Health Metrics Service</h1>
+        <p>Welcome to the enterprise monitoring and health check system. Access real-time metrics and dashboards below.</p>
+        <div class="links">
+            <a href="/dashboard" class="link-btn">📊 Live Dashboard</a>
+            <a href="/health-page" class="link-btn secondary">💚 Health Status Page</a>
+            <a href="/metrics-page" class="link-btn tertiary">📈 Prometheus Metrics</a>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+
+# =======================
+# Health status page (template)
+# =======================
+HEALTH_PAGE_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Health Check</title>
+    <style>
+        * {{
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }}
+        body {{
+            background: {gradient};
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            min-height: 100vh;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            padding: 20px;
+        }}
+        .container {{
+            background: white;
+            border-radius: 24px;
+            padding: 50px 40px;
+            max-width: 500px;
+            box-shadow: 0 20px 60px rgba(0,0,0,0.3);
+            text-align: center;
+        }}
+        .status-icon {{
+            font-size: 5rem;
+            margin-bottom: 20px;
+            animation: pulse 2s infinite;
+        }}
+        @keyframes pulse {{
+            0%, 100% {{ transform: scale(1); }}
+            50% {{ transform: scale(1.1); }}
+        }}
+        h1 {{
+            color: {accent};
+            font-size: 2.5rem;
+            margin-bottom: 15px;
+            font-weight: 700;
+        }}
+        .status {{
+            display: inline-block;
+            background: {gradient};
+            color: white;
+            padding: 12px 30px;
+            border-radius: 25px;
+            font-weight: 600;
+            font-size: 1.2rem;
+            margin-bottom: 30px;
+        }}
+        .metrics {{
+            display: grid;
+            grid-template-columns: 1fr 1fr;
+            gap: 20px;
+            margin-top: 30px;
+        }}
+        .metric-card {{
+            background: #f7fafc;
+            padding: 20px;
+            border-radius: 12px;
+            border-left: 4px solid {accent};
+        }}
+        .metric-label {{
+            color: #718096;
+            font-size: 0.9rem;
+            margin-bottom: 8px;
+        }}
+        .metric-value {{
+            color: #2d3748;
+            font-size: 1.8rem;
+            font-weight: 700;
+        }}
+        .alerts {{
+            list-style: none;
+            margin-top: 25px;
+            text-align: left;
+        }}
+        .alerts li {{
+            padding: 10px 14px;
+            margin-bottom: 8px;
+            border-radius: 8px;
+            background: #fff5f5;
+            color: #2d3748;
+            font-size: 0.95rem;
+        }}
+        .alerts li.pending {{
+            background: #fffaf0;
+        }}
+        .alerts code {{
+            color: #718096;
+        }}
+        .back-btn {{
+            display: inline-block;
+            margin-top: 30px;
+            padding: 12px 30px;
+            background: #667eea;
+            color: white;
+            text-decoration: none;
+            border-radius: 8px;
+            font-weight: 600;
+            transition: all 0.3s ease;
+        }}
+        .back-btn:hover {{
+            background: #764ba2;
+            transform: translateY(-2px);
+        }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="status-icon">{icon}</div>
+        <h1>{title}</h1>
+        <div class="status">{status}</div>
+        
+        <div class="metrics">
+            <div class="metric-card">
+                <div class="metric-label">CPU Usage</div>
+                <div class="metric-value">{cpu:.1f}%</div>
+            </div>
+            <div class="metric-card">
+                <div class="metric-label">Memory</div>
+                <div class="metric-value">{memory:.1f}%</div>
+            </div>
+        </div>
+        {alerts}
+        <a href="/" class="back-btn">← Back to Home</a>
+    </div>
+</body>
+</html>
+"""
+
+
+# Health page look per overall alert state: icon, title, status line, accent, background.
+HEALTH_STATES = {
+    "ok": ("✅", "System Healthy", "All Systems Operational",
+           "#11998e", "linear-gradient(135deg, #11998e 0%, #38ef7d 100%)"),
+    "pending": ("⚠️", "System Warning", "{count} alert(s) pending",
+                "#dd6b20", "linear-gradient(135deg, #f6ad55 0%, #ecc94b 100%)"),
+    "firing": ("🚨", "System Degraded", "{count} alert(s) firing",
+               "#e53e3e", "linear-gradient(135deg, #e53e3e 0%, #f687b3 100%)"),
+}
+
+
+def alert_list_html(rules):
+    """<ul> of the rules that are not ok; empty when everything is fine."""
+    items = [
+        f'<li class="{rule.state}"><strong>{escape(rule.name)}</strong> {rule.state} '
+        f'<code>{escape(rule.expr)}</code></li>'
+        for rule in rules
+        if rule.state != "ok"
+    ]
+    return f'<ul class="alerts">{"".join(items)}</ul>' if items else ""
+
+
+# =======================
+# Prometheus metrics page (template)
+# =======================
+METRICS_PAGE_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Prometheus Metrics</title>
+    <style>
+        * {{
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }}
+        body {{
+            background: linear-gradient(135deg, #1e3a8a 0%, #3b82f6 100%);
+            font-family: 'Courier New', monospace;
+            min-height: 100vh;
+            padding: 40px 20px;
+        }}
+        .container {{
+            max-width: 1000px;
+            margin: 0 auto;
+            background: white;
+            border-radius: 16px;
+            padding: 40px;
+            box-shadow: 0 20px 60px rgba(0,0,0,0.3);
+        }}
+        .header {{
+            display: flex;
+            align-items: center;
+            justify-content: space-between;
+            margin-bottom: 30px;
+            padding-bottom: 20px;
+            border-bottom: 3px solid #3b82f6;
+        }}
+        h1 {{
+            color: #1e3a8a;
+            font-size: 2rem;
+            font-weight: 700;
+        }}
+        .prometheus-logo {{
+            font-size: 2.5rem;
+        }}
+        .metrics-box {{
+            background: #f8fafc;
+            border: 2px solid #e2e8f0;
+            border-radius: 12px;
+            padding: 30px;
+            font-family: 'Courier New', monospace;
+            font-size: 0.95rem;
+            line-height: 1.8;
+            color: #334155;
+            white-space: pre-wrap;
+            word-wrap: break-word;
+            max-height: 500px;
+            overflow-y: auto;
+        }}
+        .metrics-box::-webkit-scrollbar {{
+            width: 8px;
+        }}
+        .metrics-box::-webkit-scrollbar-track {{
+            background: #e2e8f0;
+            border-radius: 4px;
+        }}
+        .metrics-box::-webkit-scrollbar-thumb {{
+            background: #3b82f6;
+            border-radius: 4px;
+        }}
+        .info-banner {{
+            background: linear-gradient(135deg, #3b82f6 0%, #1e3a8a 100%);
+            color: white;
+            padding: 15px 20px;
+            border-radius: 8px;
+            margin-bottom: 20px;
+            font-size: 0.95rem;
+        }}
+        .back-btn {{
+            display: inline-block;
+            margin-top: 20px;
+            padding: 12px 30px;
+            background: #3b82f6;
+            color: white;
+            text-decoration: none;
+            border-radius: 8px;
+            font-weight: 600;
+            font-family: 'Segoe UI', sans-serif;
+            transition: all 0.3s ease;
+        }}
+        .back-btn:hover {{
+            background: #1e3a8a;
+            transform: translateY(-2px);
+        }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>📈 Prometheus Metrics</h1>
+            <div class="prometheus-logo">🔥</div>
+        </div>
+        
+        <div class="info-banner">
+            ℹ️ These metrics are in Prometheus exposition format, ready to be scraped by Prometheus server
+        </div>
+        
+        <div class="metrics-box">{prometheus_data}</div>
+        
+        <a href="/" class="back-btn">← Back to Home</a>
+    </div>
+</body>
+</html>
+"""
+
+
+# =======================
+# Live dashboard
+# =======================
+DASHBOARD_HTML = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Health Metrics Dashboard</title>
+    <style>
+        * {
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }
+        body {
+            background: linear-gradient(135deg, #0f172a 0%, #1e293b 100%);
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            color: #e2e8f0;
+            padding: 20px;
+            min-height: 100vh;
+        }
+        .header {
+            text-align: center;
+            margin-bottom: 40px;
+        }
+        h1 {
+            font-size: 2.5rem;
+            background: linear-gradient(135deg, #3b82f6 0%, #8b5cf6 100%);
+            -webkit-background-clip: text;
+            -webkit-text-fill-color: transparent;
+            margin-bottom: 10px;
+            font-weight: 700;
+        }
+        .subtitle {
+            color: #94a3b8;
+            font-size: 1.1rem;
+        }
+        .grid {
+            display: grid;
+            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
+            gap: 25px;
+            max-width: 1200px;
+            margin: 0 auto;
+        }
+        .card {
+            background: rgba(30, 41, 59, 0.8);
+            backdrop-filter: blur(10px);
+            border: 1px solid rgba(59, 130, 246, 0.3);
+            border-radius: 16px;
+            padding: 30px;
+            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
+            transition: all 0.3s ease;
+        }
+        .card:hover {
+            transform: translateY(-5px);
+            box-shadow: 0 12px 48px rgba(59, 130, 246, 0.4);
+            border-color: rgba(59, 130, 246, 0.6);
+        }
+        .card-header {
+            display: flex;
+            align-items: center;
+            justify-content: space-between;
+            margin-bottom: 20px;
+        }
+        .card-title {
+            font-size: 0.95rem;
+            color: #94a3b8;
+            font-weight: 600;
+            text-transform: uppercase;
+            letter-spacing: 1px;
+        }
+        .card-icon {
+            font-size: 1.8rem;
+        }
+        .value {
+            font-size: 3.5rem;
+            font-weight: 700;
+            background: linear-gradient(135deg, #3b82f6 0%, #8b5cf6 100%);
+            -webkit-background-clip: text;
+            -webkit-text-fill-color: transparent;
+            margin: 15px 0;
+        }
+        .progress-bar {
+            width: 100%;
+            height: 8px;
+            background: rgba(59, 130, 246, 0.2);
+            border-radius: 4px;
+            overflow: hidden;
+            margin-top: 15px;
+        }
+        .progress-fill {
+            height: 100%;
+            background: linear-gradient(90deg, #3b82f6 0%, #8b5cf6 100%);
+            border-radius: 4px;
+            transition: width 0.5s ease;
+        }
+        .status-badge {
+            display: inline-block;
+            padding: 6px 16px;
+            background: rgba(34, 197, 94, 0.2);
+            border: 1px solid rgba(34, 197, 94, 0.4);
+            color: #22c55e;
+            border-radius: 20px;
+            font-size: 0.85rem;
+            font-weight: 600;
+            margin-top: 10px;
+        }
+        .back-btn {
+            display: block;
+            max-width: 200px;
+            margin: 40px auto 0;
+            padding: 14px 30px;
+            background: linear-gradient(135deg, #3b82f6 0%, #8b5cf6 100%);
+            color: white;
+            text-decoration: none;
+            border-radius: 10px;
+            font-weight: 600;
+            text-align: center;
+            transition: all 0.3s ease;
+            box-shadow: 0 4px 15px rgba(59, 130, 246, 0.4);
+        }
+        .back-btn:hover {
+            transform: translateY(-2px);
+            box-shadow: 0 6px 20px rgba(59, 130, 246, 0.6);
+        }
+        @keyframes fadeIn {
+            from { opacity: 0; transform: translateY(20px); }
+            to { opacity: 1; transform: translateY(0); }
+        }
+        .card {
+            animation: fadeIn 0.5s ease;
+        }
+        .card:nth-child(2) { animation-delay: 0.1s; }
+        .card:nth-child(3) { animation-delay: 0.2s; }
+    </style>
+</head>
+<body>
+    <div class="header">
+        <h1>📊 Health Metrics Dashboard</h1>
+        <p class="subtitle">Real-time system monitoring and performance metrics</p>
+    </div>
+
+    <div class="grid">
+        <div class="card">
+            <div class="card-header">
+                <div class="card-title">CPU Usage</div>
+                <div class="card-icon">🖥️</div>
+            </div>
+            <div class="value"><span id="cpu">--</span>%</div>
+            <div class="progress-bar">
+                <div class="progress-fill" id="cpu-bar" style="width: 0%"></div>
+            </div>
+            <div class="status-badge">● Active</div>
+        </div>
+
+        <div class="card">
+            <div class="card-header">
+                <div class="card-title">Memory Usage</div>
+                <div class="card-icon">💾</div>
+            </div>
+            <div class="value"><span id="memory">--</span>%</div>
+            <div class="progress-bar">
+                <div class="progress-fill" id="memory-bar" style="width: 0%"></div>
+            </div>
+            <div class="status-badge">● Active</div>
+        </div>
+
+        <div class="card">
+            <div class="card-header">
+                <div class="card-title">Total Requests</div>
+                <div class="card-icon">📈</div>
+            </div>
+            <div class="value"><span id="requests">--</span></div>
+            <div class="status-badge">● Counting</div>
+        </div>
+    </div>
+
+    <a href="/" class="back-btn">← Back to Home</a>
+
+    <script>
+        function render(data) {
+            document.getElementById("cpu").innerText = data.cpu.toFixed(1);
+            document.getElementById("memory").innerText = data.memory.toFixed(1);
+            document.getElementById("requests").innerText = data.requests;
+            
+            document.getElementById("cpu-bar").style.width = data.cpu + "%";
+            document.getElementById("memory-bar").style.width = data.memory + "%";
+        }
+
+        async function refresh() {
+            try {
+                const res = await fetch("/api/stats");
+                render(await res.json());
+            } catch (err) {
+                console.error("Failed to fetch stats:", err);
+            }
+        }
+
+        // Prefer the push stream; poll only while it is unavailable.
+        let pollTimer = null;
+        function startPolling() {
+            if (pollTimer === null) {
+                pollTimer = setInterval(refresh, 2000);
+                refresh();
+            }
+        }
+        function stopPolling() {
+            clearInterval(pollTimer);
+            pollTimer = null;
+        }
+
+        if (window.EventSource) {
+            const source = new EventSource("/api/stream");
+            source.onopen = stopPolling;
+            source.onmessage = (event) => render(JSON.parse(event.data));
+            source.onerror = startPolling;
+        } else {
+            startPolling();
+        }
+    </script>
+</body>
+</html>
+"""
@@ -0,0 +1,147 @@
+import bisect, gc, os, time
+from dataclasses import dataclass
+
+from cgroup import File
+
+# =======================
+# GC pause tracking
+# =======================
+# gc.callbacks fires on the thread that triggered the collection, with the GIL
+# held and never for two collections at once, so plain lists are safe. Each
+# callback is a perf_counter() call and a bisect - cheap enough to leave on.
+
+GC_PAUSE_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+GENERATIONS = (0, 1, 2)
+
+
+class GCMonitor:
+    def __init__(self, buckets=GC_PAUSE_BUCKETS):
+        self.buckets = tuple(buckets)
+        # Per generation; the last bucket slot is +Inf.
+        self.bucket_counts = [[0] * (len(self.buckets) + 1) for _ in GENERATIONS]
+        self.pause_sum = [0.0 for _ in GENERATIONS]
+        self.collected = [0 for _ in GENERATIONS]
+        self.uncollectable = [0 for _ in GENERATIONS]
+        self._started = None
+
+    def _callback(self, phase, info):
+        if phase == "start":
+            self._started = time.perf_counter()
+            return
+        if self._started is None:
+            return  # installed mid-collection
+        pause = time.perf_counter() - self._started
+        self._started = None
+        generation = info["generation"]
+        self.bucket_counts[generation][bisect.bisect_left(self.buckets, pause)] += 1
+        self.pause_sum[generation] += pause
+        self.collected[generation] += info["collected"]
+        self.uncollectable[generation] += info["uncollectable"]
+
+    def install(self):
+        if self._callback not in gc.callbacks:
+            gc.callbacks.append(self._callback)
+
+    def uninstall(self):
+        if self._callback in gc.callbacks:
+            gc.callbacks.remove(self._callback)
+        self._started = None
+
+    def cumulative_buckets(self, generation):
+        """[(upper bound, cumulative count)] ending with +Inf, as Prometheus wants."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.bucket_counts[generation]):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+# =======================
+# Process internals
+# =======================
+@dataclass(frozen=True)
+class ProcessStats:
+    threads: int
+    open_fds: int
+    rss_bytes: int
+    uss_bytes: int              # private (unshared) memory; 0 when unavailable
+    voluntary_switches: int
+    involuntary_switches: int
+
+
+class ProcReader:
+    """Reads this process's internals straight from /proc with pread().
+
+    Called by the sampler once per tick from a worker thread (smaps_rollup is
+    O(mappings) and takes the mmap lock), so neither the event loop nor a
+    scrape ever walks /proc itself.
+    """
+
+    def __init__(self, proc="/proc/self"):
+        self.fd_dir = os.path.join(proc, "fd")
+        self.status = File(os.path.join(proc, "status"))
+        rollup = os.path.join(proc, "smaps_rollup")  # Linux 4.14+
+        self.smaps_rollup = File(rollup) if os.path.exists(rollup) else None
+
+    @staticmethod
+    def _fields(handle, size=8192):
+        values = {}
+        for line in os.pread(handle.fd, size, 0).decode().splitlines():
+            key, _, value = line.partition(":")
+            values[key] = value.split()
+        return values
+
+    def sample(self):
+        status = self._fields(self.status)
+        uss = 0
+        if self.smaps_rollup is not None:
+            rollup = self._fields(self.smaps_rollup)
+            uss = sum(int(rollup.get(key, ("0",))[0]) for key in ("Private_Clean", "Private_Dirty")) * 1024
+        return ProcessStats(
+            threads=int(status["Threads"][0]),
+            open_fds=len(os.listdir(self.fd_dir)),
+            rss_bytes=int(status["VmRSS"][0]) * 1024,
+            uss_bytes=uss,
+            voluntary_switches=int(status["voluntary_ctxt_switches"][0]),
+            involuntary_switches=int(status["nonvoluntary_ctxt_switches"][0]),
+        )
+
+    def close(self):
+        self.status.close()
+        if self.smaps_rollup is not None:
+            self.smaps_rollup.close()
+
+
+class PsutilProcessReader:
+    """Fallback for platforms without /proc; memory_full_info() is what makes USS slow."""
+
+    def __init__(self):
+        import psutil
+
+        self.process = psutil.Process()
+
+    def sample(self):
+        with self.process.oneshot():
+            memory = self.process.memory_full_info()
+            switches = self.process.num_ctx_switches()
+            return ProcessStats(
+                threads=self.process.num_threads(),
+                open_fds=self.process.num_fds() if hasattr(self.process, "num_fds") else 0,
+                rss_bytes=memory.rss,
+                uss_bytes=getattr(memory, "uss", 0),
+                voluntary_switches=switches.voluntary,
+                involuntary_switches=switches.involuntary,
+            )
+
+    def close(self):
+        pass
+
+
+def detect_process_reader(proc="/proc/self"):
+    try:
+        if os.path.exists(os.path.join(proc, "status")):
+            return ProcReader(proc)
+    except OSError:
+        pass
+    return PsutilProcessReader()
@@ -0,0 +1,145 @@
+import asyncio, os, sys, threading, tracemalloc
+from collections import Counter
+
+# =======================
+# On-demand profiling (/debug/profile, /debug/heap)
+# =======================
+# Nothing here runs until a session is requested: no timer thread, no
+# tracemalloc hooks. A session is capped in length and only one (of either
+# kind) runs per process at a time, so poking a loaded pod costs at most one
+# extra thread waking every ``interval`` for a few seconds.
+
+
+class SessionGuard:
+    """One debug session per process; a second caller is refused, not queued."""
+
+    def __init__(self):
+        self.active = None
+
+    def begin(self, kind):
+        if self.active is not None:
+            return False
+        self.active = kind
+        return True
+
+    def end(self):
+        self.active = None
+
+
+class StackSampler:
+    """Samples every thread's stack from a timer thread via ``sys._current_frames()``.
+
+    Stacks are kept as collapsed lines ("thread;outer;...;inner count"), the
+    input format of flamegraph.pl, speedscope and friends.
+    """
+
+    def __init__(self, interval=0.01, max_depth=128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _label(self, frame):
+        code = frame.f_code
+        key = (code, frame.f_lineno)
+        label = self._labels.get(key)
+        if label is None:
+            filename = os.path.basename(code.co_filename)
+            label = self._labels[key] = f"{code.co_name} ({filename}:{frame.f_lineno})"
+        return label
+
+    def sample(self, skip=None):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == skip:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self._label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}").replace(";", ":"))
+            stack.reverse()
+            self.stacks[";".join(stack)] += 1
+        self.samples += 1
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample(skip=own)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    async def run(self, seconds):
+        self.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.stop()
+        return self.collapsed()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# Allocations made by tracemalloc itself or the import machinery are noise.
+HEAP_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces(HEAP_FILTERS)
+
+
+def _diff(before, after, key_type, limit):
+    stats = after.compare_to(before, key_type)
+    return {
+        "size_diff": sum(stat.size_diff for stat in stats),
+        "count_diff": sum(stat.count_diff for stat in stats),
+        "top": [
+            {
+                "location": str(stat.traceback),
+                "size": stat.size,
+                "size_diff": stat.size_diff,
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            }
+            for stat in stats[:limit]
+        ],
+    }
+
+
+async def heap_diff(seconds, frames=1, key_type="lineno", limit=25):
+    """What was allocated and still alive across ``seconds``, grouped by ``key_type``.
+
+    Tracing is switched on just for the window (and off again afterwards)
+    unless something else, e.g. PYTHONTRACEMALLOC, already started it.
+    Snapshots and the diff are taken in a worker thread.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(frames)
+    try:
+        before = await asyncio.to_thread(_snapshot)
+        await asyncio.sleep(seconds)
+        after = await asyncio.to_thread(_snapshot)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()
+    result = await asyncio.to_thread(_diff, before, after, key_type, limit)
+    return {"seconds": seconds, "traced_current": current, "traced_peak": peak, **result}
@@ -0,0 +1,257 @@
+import asyncio, gzip, logging, random, struct, time
+from collections import deque
+from urllib.parse import quote
+
+import httpx
+from prometheus_client import generate_latest
+
+from metrics import PUSH_BATCHES, PUSH_BUFFERED
+
+log = logging.getLogger(__name__)
+
+try:
+    import snappy  # python-snappy, optional C implementation
+except ImportError:
+    snappy = None
+
+
+# =======================
+# Snappy block format
+# =======================
+def _varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _literal(out, data):
+    for start in range(0, len(data), 65536):
+        chunk = data[start:start + 65536]
+        n = len(chunk) - 1
+        if n < 60:
+            out.append(n << 2)
+        elif n < 0x100:
+            out += bytes((60 << 2, n))
+        else:
+            out += bytes((61 << 2,)) + struct.pack("<H", n)
+        out += chunk
+
+
+def snappy_compress(data):
+    """Snappy block compression; uses python-snappy when installed.
+
+    The fallback is a small greedy LZ77 over 4-byte hashes emitting 2-byte
+    offset copies. It is much slower than the C library but produces valid
+    snappy that every remote-write receiver decodes, and exposition text
+    (repeated metric and label names) still shrinks several times over.
+    """
+    if snappy is not None:
+        return snappy.compress(data)
+    out = bytearray(_varint(len(data)))
+    table = {}
+    i = literal_start = 0
+    end = len(data) - 4
+    while i <= end:
+        key = data[i:i + 4]
+        candidate = table.get(key)
+        table[key] = i
+        if candidate is None or i - candidate > 0xFFFF:
+            i += 1
+            continue
+        length = 4
+        while length < 64 and i + length < len(data) and data[candidate + length] == data[i + length]:
+            length += 1
+        if literal_start < i:
+            _literal(out, data[literal_start:i])
+        out.append(((length - 1) << 2) | 2)
+        out += struct.pack("<H", i - candidate)
+        i += length
+        literal_start = i
+    if literal_start < len(data):
+        _literal(out, data[literal_start:])
+    return bytes(out)
+
+
+# =======================
+# Remote-write protobuf (prometheus.WriteRequest), hand-encoded
+# =======================
+def _field(number, payload):
+    # Length-delimited field (wire type 2).
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def encode_write_request(series):
+    """``series`` is an iterable of (labels dict incl. __name__, value, timestamp_ms)."""
+    out = bytearray()
+    for labels, value, timestamp_ms in series:
+        timeseries = bytearray()
+        for name in sorted(labels):
+            timeseries += _field(1, _field(1, name.encode()) + _field(2, str(labels[name]).encode()))
+        sample = b"\x09" + struct.pack("<d", value) + b"\x10" + _varint(timestamp_ms)
+        timeseries += _field(2, sample)
+        out += _field(1, bytes(timeseries))
+    return bytes(out)
+
+
+def registry_series(registry, extra_labels, timestamp_ms):
+    for family in registry.collect():
+        for sample in family.samples:
+            labels = {**extra_labels, **sample.labels, "__name__": sample.name}
+            stamp = int(sample.timestamp * 1000) if sample.timestamp is not None else timestamp_ms
+            yield labels, float(sample.value), stamp
+
+
+# =======================
+# Push exporter
+# =======================
+class PushExporter:
+    """Periodically snapshots a registry and pushes it off the request path.
+
+    Batches queue in a bounded deque that drops the oldest when full; failed
+    sends back off exponentially (with jitter) while collection carries on.
+    In pushgateway mode each push replaces the whole group, so only the newest
+    batch is ever kept.
+    """
+
+    def __init__(self, registry, url, mode="remote_write", interval=15.0, buffer_size=120,
+                 timeout=5.0, backoff_base=1.0, max_backoff=300.0, job="health-metrics",
+                 instance=None, client=None):
+        if mode not in ("remote_write", "pushgateway"):
+            raise ValueError(f"unknown push mode {mode!r}")
+        self.registry = registry
+        self.url = url.rstrip("/")
+        self.mode = mode
+        self.interval = interval
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.job = job
+        self.instance = instance
+        self.buffer = deque(maxlen=buffer_size if mode == "remote_write" else 1)
+        self.failures = 0
+        self._retry_at = 0.0
+        self._client = client
+        self._task = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    def encode_batch(self):
+        if self.mode == "pushgateway":
+            return gzip.compress(generate_latest(self.registry), compresslevel=6)
+        labels = {"job": self.job}
+        if self.instance:
+            labels["instance"] = self.instance
+        series = registry_series(self.registry, labels, int(time.time() * 1000))
+        return snappy_compress(encode_write_request(series))
+
+    async def collect(self):
+        # Registry walk and encoding run in a worker thread, not on the loop.
+        batch = await asyncio.to_thread(self.encode_batch)
+        if len(self.buffer) == self.buffer.maxlen:
+            PUSH_BATCHES.labels("dropped").inc()
+        self.buffer.append(batch)
+        PUSH_BUFFERED.set(len(self.buffer))
+
+    async def _send(self, batch):
+        if self.mode == "pushgateway":
+            path = f"/metrics/job/{quote(self.job, safe='')}"
+            if self.instance:
+                path += f"/instance/{quote(self.instance, safe='')}"
+            response = await self.client.put(
+                self.url + path, content=batch,
+                headers={"Content-Type": "text/plain; version=0.0.4", "Content-Encoding": "gzip"},
+            )
+        else:
+            response = await self.client.post(self.url, content=batch, headers={
+                "Content-Type": "application/x-protobuf",
+                "Content-Encoding": "snappy",
+                "X-Prometheus-Remote-Write-Version": "0.1.0",
+            })
+        response.raise_for_status()
+
+    async def flush(self):
+        """Sends buffered batches oldest first; stops at the first failure and backs off.
+
+        Only transport errors, 5xx and 429 are retried. Any other 4xx means the
+        receiver will never take this batch (bad payload, auth), so it is dropped.
+        """
+        loop = asyncio.get_running_loop()
+        while self.buffer:
+            try:
+                await self._send(self.buffer[0])
+            except httpx.HTTPStatusError as exc:
+                status = exc.response.status_code
+                if status < 500 and status != 429:
+                    self.buffer.popleft()
+                    PUSH_BATCHES.labels("rejected").inc()
+                    PUSH_BUFFERED.set(len(self.buffer))
+                    log.error("push to %s rejected with %d, batch dropped: %s",
+                              self.url, status, exc.response.text[:200])
+                    continue
+                self._back_off(loop, exc)
+                return False
+            except httpx.HTTPError as exc:
+                self._back_off(loop, exc)
+                return False
+            self.buffer.popleft()
+            self.failures = 0
+            PUSH_BATCHES.labels("sent").inc()
+            PUSH_BUFFERED.set(len(self.buffer))
+        return True
+
+    def _back_off(self, loop, exc):
+        self.failures += 1
+        delay = min(self.max_backoff, self.backoff_base * 2 ** (self.failures - 1))
+        self._retry_at = loop.time() + delay * random.uniform(0.5, 1.0)
+        PUSH_BATCHES.labels("failed").inc()
+        log.warning("push to %s failed (%s), retrying in %.1fs", self.url, exc, delay)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_collect = loop.time()
+        while True:
+            # A collector raising inside registry.collect() must not end the
+            # task: pushing would stop silently for the rest of the process.
+            try:
+                if loop.time() >= next_collect:
+                    next_collect = loop.time() + self.interval
+                    await self.collect()
+                if self.buffer and loop.time() >= self._retry_at:
+                    await self.flush()
+            except Exception:
+                log.exception("push exporter failed, carrying on")
+                self._retry_at = max(self._retry_at, loop.time() + self.backoff_base)
+            wake = next_collect
+            if self.buffer:
+                wake = min(wake, self._retry_at)
+            await asyncio.sleep(max(0.0, wake - loop.time()))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, final_push=True):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if final_push:
+            # Short-lived jobs: get the last numbers out before exiting.
+            try:
+                await asyncio.wait_for(self.collect(), self.timeout)
+                await asyncio.wait_for(self.flush(), self.timeout)
+            except (asyncio.TimeoutError, httpx.HTTPError):
+                pass
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,148 @@
+import fcntl, logging, mmap, os, struct, time, zlib
+
+log = logging.getLogger(__name__)
+
+# =======================
+# Durable sample log (memory-mapped ring file)
+# =======================
+# A fixed-size file: a 64-byte header followed by ``capacity`` fixed-width
+# records. Record ``seq`` (1, 2, ...) always lives in slot (seq - 1) % capacity,
+# so the write position is recovered from the records themselves and the
+# header is never rewritten. Each record carries a CRC of its payload; a write
+# torn by a crash fails the check and is skipped on recovery.
+#
+#   record = seq u64 | wall_time f64 | cpu f64 | memory f64 | request_rate f64
+#            | crc32 u32 | pad                                     (48 bytes)
+#
+# 86400 records (24 h at 1 s) is ~4 MB. Appends are a single pack_into() into
+# the shared mapping from the sampler - no lock, no syscall - and survive a
+# process crash as soon as they are made (the page cache owns them). Only one
+# process writes: the one holding an flock on the file. Other workers sharing
+# the volume replay it but leave it alone, and take over when the writer exits
+# (trying the lock at most once per ``takeover_interval``, not every append).
+
+MAGIC = b"HMSLOG\x00\x01"
+HEADER = struct.Struct("<8sIIQ")  # magic, version, record size, capacity
+HEADER_SIZE = 64
+VERSION = 1
+RECORD = struct.Struct("<QddddI4x")
+PAYLOAD = struct.Struct("<Qdddd")  # the CRC-covered prefix
+PAYLOAD_SIZE = PAYLOAD.size
+
+
+class SampleLog:
+    def __init__(self, path, capacity=86400, takeover_interval=1.0, clock=time.monotonic):
+        self.path = path
+        self.capacity = capacity
+        self.takeover_interval = takeover_interval
+        self.clock = clock
+        self._next_takeover = clock() + takeover_interval
+        self.size = HEADER_SIZE + capacity * RECORD.size
+        self.next_seq = None
+        self.map = None
+        self.writer = False
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._try_become_writer()
+        if self.map is None:
+            self._map_existing()
+
+    def _header_ok(self):
+        if os.fstat(self._fd).st_size != self.size:
+            return False
+        magic, version, record_size, capacity = HEADER.unpack(os.pread(self._fd, HEADER.size, 0))
+        return (magic, version, record_size, capacity) == (MAGIC, VERSION, RECORD.size, self.capacity)
+
+    def _map_existing(self):
+        if self._header_ok():
+            self.map = mmap.mmap(self._fd, self.size)
+
+    def _try_become_writer(self):
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        self.writer = True
+        if not self._header_ok():
+            # New file, another capacity or not ours at all: start over.
+            if os.fstat(self._fd).st_size:
+                log.warning("sample log %s is incompatible, reinitializing", self.path)
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+            os.ftruncate(self._fd, 0)
+            os.ftruncate(self._fd, self.size)
+            os.pwrite(self._fd, HEADER.pack(MAGIC, VERSION, RECORD.size, self.capacity), 0)
+        if self.map is None:
+            self.map = mmap.mmap(self._fd, self.size)
+        self.next_seq = None  # whoever wrote before us may have moved on
+        return True
+
+    def recover(self):
+        """Scans every slot; returns (valid, torn) counts and sets the write position."""
+        valid = torn = 0
+        last = 0
+        if self.map is not None:
+            with memoryview(self.map) as view:
+                records = view[HEADER_SIZE:]
+                for slot, record in enumerate(RECORD.iter_unpack(records)):
+                    seq = record[0]
+                    if seq == 0:
+                        continue  # never written
+                    offset = slot * RECORD.size
+                    if (seq - 1) % self.capacity != slot or record[5] != zlib.crc32(
+                        records[offset:offset + PAYLOAD_SIZE]
+                    ):
+                        torn += 1
+                        continue
+                    valid += 1
+                    last = max(last, seq)
+                records.release()
+        self.next_seq = last + 1
+        return valid, torn
+
+    def records(self):
+        """Valid records oldest first, as (wall_time, cpu, memory, request_rate).
+
+        Unpacked straight out of the mapping; nothing is copied into bytes.
+        """
+        if self.map is None:
+            return
+        if self.next_seq is None:
+            self.recover()
+        last = self.next_seq - 1
+        with memoryview(self.map) as view:
+            for seq in range(max(1, last - self.capacity + 1), last + 1):
+                offset = HEADER_SIZE + (seq - 1) % self.capacity * RECORD.size
+                record = RECORD.unpack_from(view, offset)
+                if record[0] == seq and record[5] == zlib.crc32(view[offset:offset + PAYLOAD_SIZE]):
+                    yield record[1:5]
+
+    def append(self, wall_time, cpu, memory, request_rate):
+        if not self.writer:
+            now = self.clock()
+            if now < self._next_takeover:
+                return False
+            self._next_takeover = now + self.takeover_interval
+            if not self._try_become_writer():
+                return False
+        if self.next_seq is None:
+            self.recover()
+        seq = self.next_seq
+        offset = HEADER_SIZE + (seq - 1) % self.capacity * RECORD.size
+        payload = PAYLOAD.pack(seq, wall_time, cpu, memory, request_rate)
+        RECORD.pack_into(self.map, offset, seq, wall_time, cpu, memory, request_rate, zlib.crc32(payload))
+        self.next_seq = seq + 1
+        return True
+
+    def flush(self):
+        # Only needed to survive a node (not process) crash.
+        if self.writer and self.map is not None:
+            self.map.flush()
+
+    def close(self):
+        if self.map is not None:
+            self.flush()
+            self.map.close()
+            self.map = None
+        os.close(self._fd)  # also drops the flock
+        self.writer = False
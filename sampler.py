@@ -0,0 +1,156 @@
+import asyncio, logging, time
+from dataclasses import dataclass
+
+log = logging.getLogger(__name__)
+
+
+# =======================
+# Immutable sample published by the sampler
+# =======================
+@dataclass(frozen=True)
+class Snapshot:
+    cpu: float
+    memory: float
+    timestamp: float
+    generation: int
+    wall_time: float = 0.0
+    requests: float = 0.0
+    request_rate: float = 0.0
+    cpu_limit_cores: float = 0.0
+    cpu_throttled_ratio: float = 0.0
+    memory_bytes: int = 0
+    memory_limit_bytes: int = 0
+    process: object = None    # procstats.ProcessStats when a process reader is set
+
+    @property
+    def age(self):
+        # Seconds since this sample was taken (monotonic clock).
+        return time.monotonic() - self.timestamp
+
+
+# Placeholder served until the first real sample lands; its age is effectively infinite.
+EMPTY_SNAPSHOT = Snapshot(cpu=0.0, memory=0.0, timestamp=float("-inf"), generation=0)
+
+
+# =======================
+# Background sampler
+# =======================
+class Sampler:
+    """Samples CPU and memory on a fixed cadence and publishes a Snapshot.
+
+    Readers only ever touch ``snapshot``, which is swapped atomically, so no
+    request sleeps or issues psutil syscalls of its own. The readings
+    themselves (psutil, cgroup and /proc files, the request counter) are
+    taken in a worker thread; only publishing the Snapshot runs on the loop.
+    """
+
+    def __init__(self, interval=1.0, request_total=None, cgroup=None, process=None):
+        self.interval = interval
+        # Optional callable returning the cumulative request count.
+        self.request_total = request_total
+        # Optional cgroup reader; when set, CPU and memory are measured
+        # against the container's own limits instead of the whole node.
+        self.cgroup = cgroup
+        # Optional process-internals reader (threads, fds, RSS/USS, context
+        # switches), read here so scrapes never touch /proc.
+        self.process = process
+        self.snapshot = EMPTY_SNAPSHOT
+        self._listeners = []
+        self._task = None
+
+    def subscribe(self, callback):
+        # callback(snapshot) runs on the event loop after every sample.
+        self._listeners.append(callback)
+
+    def sample(self):
+        return self.publish(self.read())
+
+    def read(self):
+        # Everything that may block; runs in a worker thread.
+        now = time.monotonic()
+        readings = {
+            "timestamp": now,
+            "wall_time": time.time(),
+            "requests": self.request_total() if self.request_total is not None else 0.0,
+            "process": self.process.sample() if self.process is not None else None,
+        }
+        readings.update(self._cgroup_usage(now) if self.cgroup is not None else self._host_usage())
+        return readings
+
+    def publish(self, readings):
+        previous = self.snapshot
+        elapsed = readings["timestamp"] - previous.timestamp
+        rate = (readings["requests"] - previous.requests) / elapsed if previous.generation and elapsed > 0 else 0.0
+        snapshot = Snapshot(
+            generation=previous.generation + 1,
+            request_rate=max(rate, 0.0),
+            **readings,
+        )
+        self.snapshot = snapshot
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception:
+                log.exception("sampler listener %r failed", callback)
+        return snapshot
+
+    def _cgroup_usage(self, now):
+        stats = self.cgroup.sample(now)
+        return {
+            "cpu": stats.cpu_percent,
+            "memory": stats.memory_percent,
+            "cpu_limit_cores": stats.cpu_limit_cores,
+            "cpu_throttled_ratio": stats.throttled_ratio,
+            "memory_bytes": stats.memory_bytes,
+            "memory_limit_bytes": stats.memory_limit_bytes,
+        }
+
+    def _host_usage(self):
+        import psutil  # deferred: only needed outside a container, ~50 ms to import
+
+        memory = psutil.virtual_memory()
+        return {
+            # cpu_percent(interval=None) compares against the previous call instead of sleeping.
+            "cpu": psutil.cpu_percent(interval=None),
+            "memory": memory.percent,
+            "cpu_limit_cores": float(psutil.cpu_count() or 1),
+            "memory_bytes": memory.total - memory.available,
+            "memory_limit_bytes": memory.total,
+        }
+
+    def prime(self):
+        # Sets the CPU counters' baseline so the first published value covers a
+        # real interval (and pays any one-off import cost).
+        if self.cgroup is not None:
+            self.cgroup.sample()
+        else:
+            import psutil
+
+            psutil.cpu_percent(interval=None)
+
+    async def _run(self, warmup):
+        # Warm-up happens here, in the background, so startup never waits on it.
+        await asyncio.to_thread(self.prime)
+        await asyncio.sleep(warmup)
+        while True:
+            try:
+                readings = await asyncio.to_thread(self.read)
+            except Exception:
+                log.exception("sampler read failed")
+            else:
+                self.publish(readings)
+            await asyncio.sleep(self.interval)
+
+    def start(self, warmup=0.1):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(min(warmup, self.interval)))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
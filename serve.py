@@ -0,0 +1,49 @@
+import copy, os, shutil, tempfile
+
+import uvicorn
+from uvicorn.config import LOGGING_CONFIG
+
+import config
+
+# =======================
+# Process launcher
+# =======================
+# WEB_CONCURRENCY > 1 runs several uvicorn workers behind one socket. Metrics
+# then go through prometheus_client's multiprocess mode, which needs a clean
+# shared directory set before any worker imports prometheus_client.
+
+
+def prepare_multiproc_dir():
+    path = os.environ.setdefault(
+        "PROMETHEUS_MULTIPROC_DIR",
+        os.path.join(tempfile.gettempdir(), "prometheus-multiproc"),
+    )
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path
+
+
+def log_config():
+    # uvicorn only configures its own loggers; route the app's through the
+    # same handler so lines like the startup phase report show up.
+    config = copy.deepcopy(LOGGING_CONFIG)
+    config["root"] = {"handlers": ["default"], "level": os.environ.get("LOG_LEVEL", "INFO")}
+    return config
+
+
+def main():
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        prepare_multiproc_dir()
+    uvicorn.run(
+        "app:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "8000")),
+        workers=workers,
+        log_config=log_config(),
+        timeout_graceful_shutdown=config.DRAIN_TIMEOUT,
+    )
+
+
+if __name__ == "__main__":
+    main()
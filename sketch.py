@@ -0,0 +1,317 @@
+import glob, json, math, os, time
+
+# =======================
+# Mergeable latency sketches (DDSketch)
+# =======================
+# A DDSketch maps each value to a logarithmic bucket whose width is a fixed
+# fraction of the value, so every quantile it reports is within
+# ``relative_accuracy`` of the true one, however skewed the distribution.
+# Sketches with the same accuracy merge by adding bucket counts, which is
+# what lets workers and replicas be combined without losing accuracy.
+#
+# Per route, a ring of sub-sketches (one per ``slot`` seconds) makes the
+# sliding windows: the 1m figure merges the newest 5 slots, the 5m figure all
+# 25. Memory is bounded by slots * max_bins per route; in practice a slot
+# holds a few dozen buckets. Alongside the windows, a plain cumulative count
+# and sum per route are kept for the summary's _count and _sum, which must
+# only ever go up.
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def quantile_label(q):
+    return f"p{q * 100:g}"
+
+
+def window_label(seconds):
+    return f"{seconds // 60:g}m" if seconds % 60 == 0 else f"{seconds:g}s"
+
+
+class DDSketch:
+    __slots__ = (
+        "relative_accuracy", "gamma", "_multiplier", "max_bins", "min_value",
+        "bins", "zero", "count", "sum", "min", "max",
+    )
+
+    def __init__(self, relative_accuracy=0.01, max_bins=1024, min_value=1e-9):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._multiplier = 1 / math.log(self.gamma)
+        self.max_bins = max_bins
+        self.min_value = min_value  # anything at or below this counts as zero
+        self.bins = {}
+        self.zero = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        if value > self.min_value:
+            key = math.ceil(math.log(value) * self._multiplier)
+            bins = self.bins
+            bins[key] = bins.get(key, 0) + 1
+            if len(bins) > self.max_bins:
+                self._collapse()
+        else:
+            self.zero += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def _collapse(self):
+        # Fold the lowest buckets together: high quantiles stay exact to the
+        # promised accuracy, only the very fastest requests lose resolution.
+        keys = sorted(self.bins)
+        excess = len(keys) - self.max_bins
+        self.bins[keys[excess]] += sum(self.bins.pop(key) for key in keys[:excess])
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("cannot merge sketches with different accuracy")
+        bins = self.bins
+        for key, count in other.bins.items():
+            bins[key] = bins.get(key, 0) + count
+        if len(bins) > self.max_bins:
+            self._collapse()
+        self.zero += other.zero
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantiles(self, qs=QUANTILES):
+        """Estimates for ascending ``qs`` in one pass; None for an empty sketch."""
+        if not self.count:
+            return [None] * len(qs)
+        results = []
+        ranks = iter(q * (self.count - 1) for q in qs)
+        rank = next(ranks)
+        seen = self.zero
+        while rank is not None and seen > rank:
+            results.append(self.min)
+            rank = next(ranks, None)
+        for key in sorted(self.bins):
+            if rank is None:
+                break
+            seen += self.bins[key]
+            while rank is not None and seen > rank:
+                estimate = 2 * self.gamma ** key / (self.gamma + 1)
+                results.append(min(max(estimate, self.min), self.max))
+                rank = next(ranks, None)
+        while len(results) < len(qs):
+            results.append(self.max)
+        return results
+
+    def quantile(self, q):
+        return self.quantiles((q,))[0]
+
+    def to_dict(self):
+        keys = sorted(self.bins)
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zero": self.zero,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "keys": keys,
+            "counts": [self.bins[key] for key in keys],
+        }
+
+    @classmethod
+    def from_dict(cls, data, max_bins=1024):
+        sketch = cls(data["relative_accuracy"], max_bins=max_bins)
+        sketch.bins = dict(zip(data["keys"], data["counts"]))
+        sketch.zero = data["zero"]
+        sketch.count = data["count"]
+        sketch.sum = data["sum"]
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        if len(sketch.bins) > max_bins:
+            sketch._collapse()
+        return sketch
+
+
+class SlidingSketch:
+    """Ring of sub-sketches, one per ``slot`` seconds, for sliding-window quantiles."""
+
+    def __init__(self, slot, slots, factory):
+        self.slot = slot
+        self.ring = [None] * slots
+        self.factory = factory
+        self.slot_id = None
+
+    def _advance(self, slot_id):
+        # Drop every sub-sketch that has fallen out of the ring since last time.
+        if self.slot_id is None or slot_id - self.slot_id >= len(self.ring):
+            self.ring = [None] * len(self.ring)
+        else:
+            for stale in range(self.slot_id + 1, slot_id + 1):
+                self.ring[stale % len(self.ring)] = None
+        self.slot_id = slot_id
+
+    def add(self, value, now):
+        slot_id = int(now // self.slot)
+        if slot_id != self.slot_id:
+            self._advance(slot_id)
+        index = slot_id % len(self.ring)
+        sketch = self.ring[index]
+        if sketch is None:
+            sketch = self.ring[index] = self.factory()
+        sketch.add(value)
+
+    def window(self, seconds, now):
+        """Merge of the newest ``seconds / slot`` slots, the current partial one included."""
+        slot_id = int(now // self.slot)
+        if self.slot_id is None or slot_id > self.slot_id:
+            self._advance(slot_id)
+        merged = self.factory()
+        for offset in range(min(round(seconds / self.slot), len(self.ring))):
+            sketch = self.ring[(slot_id - offset) % len(self.ring)]
+            if sketch is not None:
+                merged.merge(sketch)
+        return merged
+
+
+class LatencyTracker:
+    def __init__(self, windows=(60, 300), buckets=5, relative_accuracy=0.01, max_bins=1024,
+                 clock=time.monotonic):
+        self.windows = tuple(sorted(float(window) for window in windows))
+        self.slot = self.windows[0] / buckets
+        for window in self.windows:
+            if abs(window / self.slot - round(window / self.slot)) > 1e-9:
+                raise ValueError(f"window {window}s is not a multiple of the {self.slot:g}s slot")
+        self.slots = round(self.windows[-1] / self.slot)
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.clock = clock
+        self.routes = {}
+        self.totals = {}  # route -> [count, sum], never windowed
+
+    def new_sketch(self):
+        return DDSketch(self.relative_accuracy, max_bins=self.max_bins)
+
+    def add(self, route, seconds):
+        sliding = self.routes.get(route)
+        if sliding is None:
+            sliding = self.routes[route] = SlidingSketch(self.slot, self.slots, self.new_sketch)
+            self.totals[route] = [0, 0.0]
+        sliding.add(seconds, self.clock())
+        total = self.totals[route]
+        total[0] += 1
+        total[1] += seconds
+
+    def snapshot(self):
+        """{route: {window seconds: merged DDSketch}} as of now."""
+        now = self.clock()
+        return {
+            route: {window: sliding.window(window, now) for window in self.windows}
+            for route, sliding in list(self.routes.items())
+        }
+
+    def cumulative(self):
+        """{route: (count, sum)} of every duration ever added."""
+        return {route: tuple(total) for route, total in list(self.totals.items())}
+
+
+# =======================
+# Snapshot helpers: merge, summarize, serialize, share between workers
+# =======================
+def merge_snapshots(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for route, windows in snapshot.items():
+            target = merged.setdefault(route, {})
+            for window, sketch in windows.items():
+                if window in target:
+                    target[window].merge(sketch)
+                else:
+                    target[window] = DDSketch(
+                        sketch.relative_accuracy, max_bins=sketch.max_bins
+                    ).merge(sketch)
+    return merged
+
+
+def merge_totals(totals):
+    merged = {}
+    for item in totals:
+        for route, (count, total) in item.items():
+            previous = merged.get(route, (0, 0.0))
+            merged[route] = (previous[0] + count, previous[1] + total)
+    return merged
+
+
+def summarize(snapshot, qs=QUANTILES):
+    """{route: {"1m": {"count": n, "p50": s, ...}}} in seconds."""
+    summary = {}
+    for route, windows in sorted(snapshot.items()):
+        summary[route] = {}
+        for window, sketch in sorted(windows.items()):
+            entry = {"count": sketch.count}
+            entry.update(zip(map(quantile_label, qs), sketch.quantiles(qs)))
+            summary[route][window_label(window)] = entry
+    return summary
+
+
+def dump_snapshot(snapshot):
+    return {
+        route: {str(window): sketch.to_dict() for window, sketch in windows.items()}
+        for route, windows in snapshot.items()
+    }
+
+
+def load_snapshot(data, max_bins=1024):
+    return {
+        route: {float(window): DDSketch.from_dict(sketch, max_bins) for window, sketch in windows.items()}
+        for route, windows in data.items()
+    }
+
+
+def worker_file(directory, pid):
+    return os.path.join(directory, f"latency_{pid}.json")
+
+
+def write_worker_file(directory, snapshot, totals=None, pid=None):
+    path = worker_file(directory, pid or os.getpid())
+    temporary = path + ".tmp"
+    with open(temporary, "w") as handle:
+        json.dump(
+            {"windows": dump_snapshot(snapshot), "totals": totals or {}}, handle, separators=(",", ":"),
+        )
+    os.replace(temporary, path)  # readers never see half a file
+
+
+def read_worker_files(directory, max_age, exclude_pid=None, max_bins=1024):
+    """(snapshot, totals) pairs other workers published within the last ``max_age`` seconds.
+
+    A worker's totals drop out with its file once it exits, which scrapers see
+    as a counter reset, the same as a restart.
+    """
+    workers = []
+    cutoff = time.time() - max_age
+    for path in glob.glob(os.path.join(directory, "latency_*.json")):
+        if exclude_pid is not None and path == worker_file(directory, exclude_pid):
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                continue  # a worker that died without cleaning up
+            with open(path) as handle:
+                data = json.load(handle)
+            totals = {route: tuple(total) for route, total in data["totals"].items()}
+            workers.append((load_snapshot(data["windows"], max_bins), totals))
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+    return workers
+
+
+def remove_worker_file(directory, pid=None):
+    try:
+        os.remove(worker_file(directory, pid or os.getpid()))
+    except FileNotFoundError:
+        pass
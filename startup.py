@@ -0,0 +1,31 @@
+import logging, time
+
+log = logging.getLogger(__name__)
+
+
+# =======================
+# Startup phase timing
+# =======================
+class StartupTimer:
+    """Records when each startup phase finished, in seconds since ``origin``.
+
+    Created before any heavy import so "imports" covers loading the app.
+    """
+
+    def __init__(self, origin=None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.phases = {}
+
+    def mark(self, phase):
+        self.phases[phase] = time.perf_counter() - self.origin
+        return self.phases[phase]
+
+    def report(self):
+        from metrics import STARTUP_PHASE
+
+        for phase, seconds in self.phases.items():
+            STARTUP_PHASE.labels(phase).set(seconds)
+        log.info(
+            "startup phases: %s",
+            " ".join(f"{phase}={seconds:.3f}s" for phase, seconds in self.phases.items()),
+        )
@@ -0,0 +1,96 @@
+import asyncio, json, random
+from collections import deque
+
+# =======================
+# Server-Sent Events fan-out
+# =======================
+# One producer (the sampler) encodes each sample once; every subscriber gets
+# the same bytes object appended to its own bounded deque. A slow consumer
+# just loses its oldest samples instead of growing memory or holding back
+# everyone else.
+
+KEEPALIVE = b": keep-alive\n\n"
+CLOSE = object()  # pushed to every subscription when the server is going away
+
+
+def encode_event(data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(data, separators=(",", ":")))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+class Subscription:
+    __slots__ = ("buffer", "event", "dropped")
+
+    def __init__(self, size):
+        self.buffer = deque(maxlen=size)
+        self.event = asyncio.Event()
+        self.dropped = 0
+
+    def push(self, message):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(message)
+        self.event.set()
+
+    async def get(self, timeout=None):
+        """Next message, or None if ``timeout`` passes first."""
+        if not self.buffer:
+            self.event.clear()
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.buffer.popleft()
+
+
+class Broadcaster:
+    def __init__(self, queue_size=4, max_subscribers=1000):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.subscribers = set()
+        self.latest = None
+        self.closed = False
+        self.close_retry = 1.0
+
+    def subscribe(self):
+        if len(self.subscribers) >= self.max_subscribers:
+            return None
+        subscription = Subscription(self.queue_size)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
+
+    def publish(self, message):
+        self.latest = message
+        for subscription in self.subscribers:
+            subscription.push(message)
+
+    def close(self, retry=1.0):
+        """Ends every stream, now and from now on, with a reconnect hint."""
+        self.closed = True
+        self.close_retry = retry
+        for subscription in self.subscribers:
+            subscription.push(CLOSE)
+
+    async def events(self, subscription, keepalive=15.0, retry=None):
+        """SSE body for one client: the latest sample right away, then every new one."""
+        try:
+            if retry is not None and not self.closed:
+                yield f"retry: {int(retry * 1000)}\n\n".encode()
+            if self.latest is not None:
+                yield self.latest
+            while not self.closed:
+                message = await subscription.get(keepalive)
+                if message is CLOSE:
+                    break
+                yield KEEPALIVE if message is None else message
+            # Jittered so the clients of a draining pod don't all come back at once.
+            delay = self.close_retry * random.uniform(1, 2)
+            yield f"retry: {int(delay * 1000)}\n\n".encode()
+        finally:
+            self.unsubscribe(subscription)
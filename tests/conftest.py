@@ -0,0 +1,81 @@
+import os, socket, subprocess, sys, time
+
+import httpx
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Throughput and overhead figures depend on the machine, so they stay out of
+# the default run:  pytest --benchmark  (or -m benchmark --benchmark).
+def pytest_addoption(parser):
+    parser.addoption("--benchmark", action="store_true", help="also run tests marked benchmark")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: wall-clock performance figure, skipped by default")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--benchmark"):
+        return
+    skip = pytest.mark.skip(reason="benchmark; run with --benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def serve():
+    """Starts ``python serve.py`` on a free port and yields (process, base_url)."""
+    processes = []
+
+    def start(timeout=30, **env):
+        port = free_port()
+        # No drain delay unless a test asks for one: terminate() should be quick.
+        environ = dict(os.environ, HOST="127.0.0.1", PORT=str(port), DRAIN_DELAY="0")
+        environ.update(env)
+        process = subprocess.Popen(
+            [sys.executable, "serve.py"], cwd=ROOT, env=environ,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        processes.append(process)
+        base_url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(process.stderr.read().decode())
+            try:
+                httpx.get(base_url + "/health", timeout=1)
+                return process, base_url
+            except httpx.TransportError:
+                time.sleep(0.1)
+        raise TimeoutError(f"server on {base_url} did not start")
+
+    yield start
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+@pytest.fixture
+def wait_for_first_sample():
+    """Returns a function blocking until the app's background sampler has published."""
+    from app import sampler
+
+    def wait(timeout=5):
+        deadline = time.monotonic() + timeout
+        while sampler.snapshot.generation == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    return wait
@@ -0,0 +1,92 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from starlette.routing import Route
+from admission import AdmissionMiddleware, AIMDLimiter, route_class
+from app import app
+
+def test_route_classes():
+    assert route_class("/api/stats") == "api"
+    assert route_class("/metrics") == "metrics"
+    assert route_class("/metrics-page") == "pages"
+    assert route_class("/dashboard") == "pages"
+
+def test_limit_grows_when_fast_and_shrinks_when_slow():
+    now = [100.0]
+    limiter = AIMDLimiter("test-aimd", initial=10, minimum=2, maximum=12, target_latency=0.1,
+                          clock=lambda: now[0])
+    limiter.in_flight = 1
+    limiter.release(0.01)
+    assert limiter.limit == 10.1
+    # A burst of slow completions from the same round trip is one signal.
+    for _ in range(100):
+        limiter.in_flight = 1
+        limiter.release(1.0)
+    assert limiter.limit == 10.1 * 0.9
+    # Requests admitted after that decrease may back off again.
+    for _ in range(100):
+        now[0] += 2
+        limiter.in_flight = 1
+        limiter.release(1.0)
+    assert limiter.limit == 2
+
+def run_burst(limiter, n, hold):
+    statuses = []
+
+    async def handler(scope, receive, send):
+        await asyncio.sleep(hold)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = AdmissionMiddleware(handler, {"api": limiter})
+
+    async def request(path="/api/x"):
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append((path, message["status"], dict(message["headers"])))
+        await middleware({"type": "http", "path": path}, None, send)
+
+    async def main():
+        await asyncio.gather(*(request() for _ in range(n)), request("/health"))
+
+    asyncio.run(main())
+    return statuses
+
+def test_overload_is_shed_fast_with_retry_after():
+    limiter = AIMDLimiter("test-shed", initial=2, max_queue=2, max_wait=5)
+    statuses = run_burst(limiter, n=10, hold=0.05)
+    codes = [status for path, status, _ in statuses if path == "/api/x"]
+    assert codes.count(200) == 4  # two running + two queued
+    assert codes.count(503) == 6
+    shed = next(headers for _, status, headers in statuses if status == 503)
+    assert shed[b"retry-after"] == b"1"
+    # /health is never shed.
+    assert [status for path, status, _ in statuses if path == "/health"] == [200]
+    assert limiter.in_flight == 0
+
+def test_queued_requests_time_out_into_503():
+    limiter = AIMDLimiter("test-wait", initial=1, max_queue=10, max_wait=0.01)
+    statuses = run_burst(limiter, n=3, hold=0.1)
+    codes = sorted(status for path, status, _ in statuses if path == "/api/x")
+    assert codes == [200, 503, 503]
+    assert limiter.in_flight == 0
+
+def test_shed_requests_keep_their_route():
+    limiter = AIMDLimiter("test-route", initial=1, max_queue=0)
+    limiter.in_flight = 1  # full, and no queue
+    route = Route("/api/items/{item}", lambda request: None)
+    middleware = AdmissionMiddleware(None, {"api": limiter}, routes=[route])
+    scope = {"type": "http", "path": "/api/items/7", "method": "GET"}
+
+    async def send(message):
+        pass
+
+    asyncio.run(middleware(scope, None, send))
+    assert scope["route"] is route
+
+def test_app_exports_admission_metrics():
+    client = TestClient(app)
+    client.get("/api/stats")
+    text = client.get("/metrics", headers={"Accept-Encoding": "identity"}).text
+    assert 'app_admission_total{outcome="admitted",route_class="api"}' in text
+    assert 'app_admission_limit{route_class="api"}' in text
@@ -0,0 +1,35 @@
+import asyncio, json
+
+from benchmarks import bench
+
+def test_in_process_run_reports_percentiles():
+    results = asyncio.run(bench.run(routes=["/health", "/api/stats"], requests=20, concurrency=4, warmup=2))
+    health = results["routes"]["/health"]
+    assert health["requests"] == 20 and health["errors"] == 0
+    assert 0 < health["p50_ms"] <= health["p95_ms"] <= health["p99_ms"]
+    assert health["rps"] > 0
+
+def test_compare_flags_regressions_past_threshold():
+    baseline = {"routes": {"/health": {"p50_ms": 1.0, "p95_ms": 2.0, "p99_ms": 3.0, "rps": 1000}}}
+    same = {"routes": {"/health": {"p50_ms": 1.1, "p95_ms": 2.1, "p99_ms": 3.2, "rps": 950}}}
+    slower = {"routes": {"/health": {"p50_ms": 1.0, "p95_ms": 2.0, "p99_ms": 6.0, "rps": 500}}}
+    assert bench.compare(same, baseline, 0.25) == []
+    regressions = bench.compare(slower, baseline, 0.25)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("/health p99_ms")
+
+def test_cli_writes_json_and_fails_on_regression(tmp_path, capsys):
+    output = tmp_path / "bench.json"
+    args = ["--routes", "/health", "--requests", "10", "--warmup", "1", "--concurrency", "2"]
+    assert bench.main(args + ["--output", str(output)]) == 0
+    baseline = json.loads(output.read_text())
+    baseline["routes"]["/health"]["p50_ms"] = 1e-6
+    (tmp_path / "baseline.json").write_text(json.dumps(baseline))
+    assert bench.main(args + ["--baseline", str(tmp_path / "baseline.json")]) == 1
+    assert "REGRESSION /health p50_ms" in capsys.readouterr().err
+
+def test_targets_a_running_server(serve):
+    _, base_url = serve()
+    results = asyncio.run(bench.run(routes=["/health"], requests=10, concurrency=2, warmup=1, url=base_url))
+    assert results["meta"]["target"] == base_url
+    assert results["routes"]["/health"]["errors"] == 0
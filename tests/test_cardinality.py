@@ -0,0 +1,120 @@
+import time, tracemalloc
+from collections import OrderedDict
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+
+import app as app_module
+from app import app
+from cardinality import GuardedMetric
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def retired(metric):
+    return REGISTRY.get_sample_value("app_metric_series_retired_total", {"metric": metric}) or 0
+
+
+def series(registry, name):
+    return {
+        tuple(sample.labels.values())
+        for family in registry.collect() for sample in family.samples if sample.name == name
+    }
+
+
+def test_idle_policy_overflows_until_a_set_goes_idle():
+    registry = CollectorRegistry()
+    counter = Counter("hits", "hits", ["client"], registry=registry)
+    clock = FakeClock()
+    guarded = GuardedMetric(counter, max_series=2, idle_timeout=60, clock=clock)
+    dropped = REGISTRY.get_sample_value("app_metric_series_dropped_total", {"metric": "hits"}) or 0
+    before = retired("hits")
+
+    guarded.labels("a").inc()
+    guarded.labels("b").inc()
+    guarded.labels("c").inc()  # full and nothing idle
+    guarded.labels("d").inc()
+    assert series(registry, "hits_total") == {("a",), ("b",), ("other",)}
+    assert counter.labels("other")._value.get() == 2
+    assert REGISTRY.get_sample_value("app_metric_series_dropped_total", {"metric": "hits"}) == dropped + 2
+
+    clock.now = 30
+    guarded.labels("a").inc()  # a is recent again, b is now the LRU
+    clock.now = 61
+    guarded.labels("c").inc()  # b idle for 61 s: evicted to make room
+    assert series(registry, "hits_total") == {("a",), ("c",), ("other",)}
+    assert retired("hits") == before + 1  # b's count
+
+    clock.now = 200
+    assert guarded.sweep() == 2
+    assert not guarded.series and retired("hits") == before + 4
+    assert REGISTRY.get_sample_value("app_metric_series", {"metric": "hits"}) == 0
+
+
+def test_lru_policy_always_evicts():
+    registry = CollectorRegistry()
+    histogram = Histogram("lat", "lat", ["route"], registry=registry)
+    guarded = GuardedMetric(histogram, max_series=3, policy="lru", clock=FakeClock())
+    for route in "abcab" "d":
+        guarded.labels(route).observe(0.1)
+    assert series(registry, "lat_count") == {("a",), ("b",), ("d",)}
+    assert retired("lat") == 0  # only counters are tracked
+    with pytest.raises(ValueError):
+        GuardedMetric(histogram, policy="fifo")
+
+
+def test_request_metrics_are_guarded(monkeypatch):
+    # No room at all: every request lands in the overflow series.
+    for guarded in app_module.request_series:
+        monkeypatch.setattr(guarded, "series", OrderedDict())
+        monkeypatch.setattr(guarded, "max_series", 0)
+    overflow = {"route": "other", "method": "other", "status": "other"}
+    before = REGISTRY.get_sample_value("app_requests_total", overflow) or 0
+    with TestClient(app) as client:
+        for method in ("GET", "POST", "PUT", "DELETE", "PATCH"):
+            client.request(method, "/health")
+    assert REGISTRY.get_sample_value("app_requests_total", overflow) == before + 5
+    assert not any(guarded.series for guarded in app_module.request_series)
+
+
+def build(guarded, attempts=10_000, cap=1000):
+    registry = CollectorRegistry()
+    histogram = Histogram(
+        "bench_request_duration_seconds", "bench", ["route", "client"], registry=registry,
+    )
+    metric = GuardedMetric(histogram, max_series=cap) if guarded else histogram
+    tracemalloc.start()
+    for index in range(attempts):
+        metric.labels(f"/item/{index}", f"client-{index % 97}").observe(0.01)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    body = generate_latest(registry)
+    return memory, time.perf_counter() - start, len(body)
+
+
+def test_guard_bounds_memory_and_body_at_10k_series():
+    raw_memory, _, raw_size = build(guarded=False)
+    memory, _, size = build(guarded=True)
+    # About 10x on each.
+    assert memory < raw_memory / 4
+    assert size < raw_size / 5
+
+
+@pytest.mark.benchmark
+def test_guard_bounds_scrape_time_at_10k_series():
+    raw_memory, raw_scrape, raw_size = build(guarded=False)
+    memory, scrape, size = build(guarded=True)
+    print(
+        f"10k attempted series: unguarded {raw_memory / 2**20:.1f} MiB, scrape {raw_scrape * 1000:.0f} ms, "
+        f"{raw_size / 2**20:.1f} MiB body; guarded (1000) {memory / 2**20:.1f} MiB, "
+        f"scrape {scrape * 1000:.0f} ms, {size / 2**20:.2f} MiB body"
+    )
+    assert scrape < raw_scrape / 3
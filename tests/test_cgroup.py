@@ -0,0 +1,68 @@
+from cgroup import CgroupV1Reader, CgroupV2Reader, detect_cgroup
+from sampler import Sampler
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+def fake_v2(root, usage_usec, periods, throttled, memory, cpu_max="50000 100000", memory_max="268435456"):
+    write(root / "cgroup.controllers", "cpu memory\n")
+    write(root / "cpu.stat", f"usage_usec {usage_usec}\nuser_usec 0\nsystem_usec 0\n"
+                             f"nr_periods {periods}\nnr_throttled {throttled}\nthrottled_usec 0\n")
+    write(root / "cpu.max", cpu_max + "\n")
+    write(root / "memory.current", f"{memory}\n")
+    write(root / "memory.max", memory_max + "\n")
+
+def test_v2_usage_against_quota_and_limit(tmp_path):
+    fake_v2(tmp_path, usage_usec=1_000_000, periods=100, throttled=0, memory=64 << 20)
+    reader = detect_cgroup(str(tmp_path), host_cpus=8, host_memory=16 << 30)
+    assert isinstance(reader, CgroupV2Reader)
+    first = reader.sample(now=10.0)
+    assert first.cpu_limit_cores == 0.5
+    assert first.memory_percent == 25.0
+
+    # 0.25 s of CPU over 1 s with a 500m quota is 50%; 5 of 10 periods throttled.
+    fake_v2(tmp_path, usage_usec=1_250_000, periods=110, throttled=5, memory=128 << 20)
+    second = reader.sample(now=11.0)
+    assert round(second.cpu_percent, 6) == 50.0
+    assert second.throttled_ratio == 0.5
+    assert second.memory_percent == 50.0
+
+def test_v2_unlimited_falls_back_to_host_capacity(tmp_path):
+    fake_v2(tmp_path, 0, 0, 0, memory=1 << 30, cpu_max="max 100000", memory_max="max")
+    stats = detect_cgroup(str(tmp_path), host_cpus=4, host_memory=4 << 30).sample()
+    assert stats.cpu_limit_cores == 4
+    assert stats.memory_limit_bytes == 4 << 30
+    assert stats.memory_percent == 25.0
+
+def test_v2_root_cgroup_is_not_a_container(tmp_path):
+    write(tmp_path / "cgroup.controllers", "cpu memory\n")
+    write(tmp_path / "cpu.stat", "usage_usec 1\n")
+    assert detect_cgroup(str(tmp_path)) is None
+
+def test_v1_reader(tmp_path):
+    write(tmp_path / "cpu,cpuacct" / "cpu.stat", "nr_periods 20\nnr_throttled 2\nthrottled_time 0\n")
+    write(tmp_path / "cpu,cpuacct" / "cpu.cfs_quota_us", "200000\n")
+    write(tmp_path / "cpu,cpuacct" / "cpu.cfs_period_us", "100000\n")
+    write(tmp_path / "cpu,cpuacct" / "cpuacct.usage", "0\n")
+    write(tmp_path / "memory" / "memory.usage_in_bytes", f"{100 << 20}\n")
+    write(tmp_path / "memory" / "memory.limit_in_bytes", "9223372036854771712\n")
+    reader = detect_cgroup(str(tmp_path), host_memory=400 << 20)
+    assert isinstance(reader, CgroupV1Reader)
+    reader.sample(now=0.0)
+    write(tmp_path / "cpu,cpuacct" / "cpuacct.usage", "1000000000\n")
+    stats = reader.sample(now=1.0)
+    assert stats.cpu_limit_cores == 2.0
+    assert round(stats.cpu_percent, 6) == 50.0
+    assert stats.memory_percent == 25.0
+
+def test_missing_tree_falls_back(tmp_path):
+    assert detect_cgroup(str(tmp_path / "nope")) is None
+
+def test_sampler_uses_cgroup_reader(tmp_path):
+    fake_v2(tmp_path, 0, 0, 0, memory=64 << 20)
+    sampler = Sampler(cgroup=detect_cgroup(str(tmp_path), host_cpus=2, host_memory=1 << 30))
+    snapshot = sampler.sample()
+    assert snapshot.memory == 25.0
+    assert snapshot.cpu_limit_cores == 0.5
+    assert snapshot.memory_limit_bytes == 256 << 20
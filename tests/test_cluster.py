@@ -0,0 +1,164 @@
+import asyncio, json, random, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fastapi.testclient import TestClient
+import app as app_module
+from cluster import ClusterStats, aggregate
+from sketch import LatencyTracker, dump_snapshot
+
+def stub_peer(payload, delay=0.0, sketches=None):
+    """Starts a local HTTP server answering /api/stats; returns (url, hit counter)."""
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            time.sleep(delay)
+            if self.path == "/api/latency-sketches":
+                if sketches is None:
+                    self.send_error(404)
+                    return
+                body = json.dumps(sketches).encode()
+            else:
+                body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.handle_error = lambda request, address: None  # timed-out clients hang up
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}", hits, server
+
+def test_fans_out_merges_and_times_out_slow_peers():
+    a, _, server_a = stub_peer({"cpu": 10.0, "memory": 40.0, "requests": 5, "pod": "a"})
+    b, _, server_b = stub_peer({"cpu": 30.0, "memory": 60.0, "requests": 7, "pod": "b"})
+    slow, _, server_slow = stub_peer({"cpu": 99.0, "memory": 99.0, "requests": 1, "pod": "slow"}, delay=1.0)
+
+    async def main():
+        cluster = ClusterStats(peers=[a, b, slow], timeout=0.2)
+        start = time.perf_counter()
+        result = await cluster.get()
+        elapsed = time.perf_counter() - start
+        await cluster.close()
+        return result, elapsed
+
+    result, elapsed = asyncio.run(main())
+    for server in (server_a, server_b, server_slow):
+        server.shutdown()
+    assert elapsed < 0.6  # concurrent, bounded by the per-peer timeout
+    by_pod = {pod["peer"]: pod for pod in result["pods"]}
+    assert by_pod[a]["pod"] == "a" and by_pod[b]["ok"]
+    assert not by_pod[slow]["ok"]
+    assert result["aggregate"] == {
+        "pods_total": 3, "pods_up": 2, "cpu_avg": 20.0, "cpu_max": 30.0,
+        "memory_avg": 50.0, "memory_max": 60.0, "requests": 12,
+    }
+
+def test_cache_collapses_concurrent_callers_into_one_fan_out():
+    url, hits, server = stub_peer({"cpu": 1.0, "memory": 2.0, "requests": 3}, delay=0.05)
+
+    async def main():
+        cluster = ClusterStats(peers=[url], ttl=60)
+        results = await asyncio.gather(*(cluster.get() for _ in range(20)))
+        await cluster.get()
+        await cluster.close()
+        return results
+
+    results = asyncio.run(main())
+    server.shutdown()
+    assert hits.count("/api/stats") == 1
+    assert all(result is results[0] for result in results)
+
+def test_dns_discovery():
+    async def main():
+        cluster = ClusterStats(dns_name="localhost", port=8123)
+        return await cluster.discover()
+
+    assert "http://127.0.0.1:8123" in asyncio.run(main())
+
+def test_bad_payloads_mark_the_peer_down():
+    url, _, server = stub_peer([1, 2, 3], sketches=[1])
+
+    async def main():
+        cluster = ClusterStats(peers=[url])
+        result = await cluster.get()
+        await cluster.close()
+        return result
+
+    result = asyncio.run(main())
+    server.shutdown()
+    assert result["pods"][0]["ok"] is False and result["pods"][0]["error"] == "unexpected payload"
+    assert result["aggregate"]["pods_up"] == 0 and "latency" not in result["aggregate"]
+
+def test_aggregate_with_no_pods_up():
+    assert aggregate([{"peer": "x", "ok": False}]) == {"pods_total": 1, "pods_up": 0}
+    # An older build without cpu/memory is not counted, rather than failing.
+    assert aggregate([{"peer": "x", "ok": True, "requests": 3}]) == {"pods_total": 1, "pods_up": 0}
+
+def test_cluster_stats_endpoint(monkeypatch):
+    client = TestClient(app_module.app)
+    assert client.get("/api/cluster-stats").status_code == 404
+    url, _, server = stub_peer({"cpu": 5.0, "memory": 6.0, "requests": 7})
+    monkeypatch.setattr(app_module, "cluster", ClusterStats(peers=[url]))
+    data = client.get("/api/cluster-stats").json()
+    server.shutdown()
+    assert data["aggregate"]["pods_up"] == 1
+    assert "pod" in client.get("/api/stats").json()
+
+def test_fleet_percentiles_merge_replica_sketches():
+    rng = random.Random(3)
+    fast = [rng.uniform(0.001, 0.01) for _ in range(5000)]
+    slow = [rng.uniform(0.1, 0.5) for _ in range(500)]
+    peers = []
+    for values in (fast, slow):
+        tracker = LatencyTracker(clock=lambda: 100.0)
+        for value in values:
+            tracker.add("/api/stats", value)
+        peers.append(stub_peer({"cpu": 1.0, "memory": 1.0, "requests": 1},
+                               sketches=dump_snapshot(tracker.snapshot())))
+
+    async def main():
+        cluster = ClusterStats(peers=[url for url, _, _ in peers])
+        result = await cluster.get()
+        await cluster.close()
+        return result
+
+    result = asyncio.run(main())
+    for _, _, server in peers:
+        server.shutdown()
+    combined = sorted(fast + slow)
+    latency = result["aggregate"]["latency"]["/api/stats"]["1m"]
+    assert latency["count"] == len(combined)
+    # Averaging the two pods' p99s would land near 0.25 s; the merged sketch
+    # sees that the slow pod's tail is 9% of all requests.
+    for key, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+        exact = combined[int(q * (len(combined) - 1))]
+        assert abs(latency[key] - exact) <= 0.011 * exact
+
+def test_peer_with_other_accuracy_is_left_out_of_fleet_percentiles():
+    peers = []
+    for accuracy, value in ((0.01, 0.01), (0.05, 2.0)):
+        tracker = LatencyTracker(relative_accuracy=accuracy, clock=lambda: 100.0)
+        tracker.add("/api/stats", value)
+        peers.append(stub_peer({"cpu": 1.0, "memory": 1.0, "requests": 1},
+                               sketches=dump_snapshot(tracker.snapshot())))
+
+    async def main():
+        cluster = ClusterStats(peers=[url for url, _, _ in peers])
+        result = await cluster.get()
+        await cluster.close()
+        return result
+
+    result = asyncio.run(main())
+    for _, _, server in peers:
+        server.shutdown()
+    assert result["aggregate"]["pods_up"] == 2
+    assert "error" not in result["pods"][0]
+    assert "different accuracy" in result["pods"][1]["error"]
+    assert result["aggregate"]["latency"]["/api/stats"]["1m"]["count"] == 1
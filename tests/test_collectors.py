@@ -0,0 +1,154 @@
+import asyncio, threading, time
+
+import pytest
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+from collectors import (
+    CgroupPressureSource, CollectorScheduler, GCSource, NetworkSource, ProcessIOSource, Source,
+    build_sources,
+)
+from metrics import COLLECTOR_OVERRUNS
+
+NET_DEV = """\
+Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo: 100 1 0 0 0 0 0 0 100 1 0 0 0 0 0 0
+  eth0: 9798556 631 2 3 0 0 0 0 57957 595 4 5 0 0 0 0
+"""
+
+
+def scrape(*families):
+    class Fixed:
+        def collect(self):
+            return families
+
+    registry = CollectorRegistry()
+    registry.register(Fixed())
+    return generate_latest(registry).decode()
+
+
+def test_file_sources_parse(tmp_path):
+    (tmp_path / "io").write_text(
+        "rchar: 10\nwchar: 20\nsyscr: 3\nsyscw: 4\nread_bytes: 4096\nwrite_bytes: 8192\n"
+        "cancelled_write_bytes: 0\n"
+    )
+    source = ProcessIOSource(str(tmp_path / "io"))
+    assert source.available()
+    text = scrape(*source.read())
+    assert 'app_process_storage_bytes_total{direction="write"} 8192.0' in text
+    assert 'app_process_io_syscalls_total{direction="read"} 3.0' in text
+
+    (tmp_path / "dev").write_text(NET_DEV)
+    source = NetworkSource(str(tmp_path / "dev"))
+    assert source.available()
+    text = scrape(*source.read())
+    assert 'app_network_bytes_total{direction="receive",interface="eth0"} 9.798556e+06' in text
+    assert 'app_network_drops_total{direction="transmit",interface="eth0"} 5.0' in text
+    assert 'interface="lo"' not in text
+
+    assert not ProcessIOSource(str(tmp_path / "missing")).available()
+
+
+def test_cgroup_pressure_and_io(tmp_path):
+    (tmp_path / "cpu.pressure").write_text(
+        "some avg10=12.50 avg60=1.00 avg300=0.10 total=2500000\n"
+        "full avg10=0.00 avg60=0.00 avg300=0.00 total=0\n"
+    )
+    (tmp_path / "io.stat").write_text("8:0 rbytes=1024 wbytes=2048 rios=1 wios=2 dbytes=0 dios=0\n")
+    source = CgroupPressureSource(str(tmp_path))
+    assert source.available()
+    text = scrape(*source.read())
+    assert 'app_cgroup_pressure_stalled_seconds_total{kind="some",resource="cpu"} 2.5' in text
+    assert 'app_cgroup_pressure_ratio{kind="some",resource="cpu"} 0.125' in text
+    assert 'app_cgroup_io_bytes_total{device="8:0",direction="write"} 2048.0' in text
+    source.close()
+    assert not CgroupPressureSource(str(tmp_path / "v1")).available()
+
+
+def test_build_sources():
+    sources = build_sources("gc=2, disk", cgroup_root="/nonexistent")
+    assert sources[0].name == "gc" and sources[0].interval == 2.0
+    assert build_sources("cgroup", cgroup_root="/nonexistent") == []
+    assert build_sources("") == []
+    with pytest.raises(ValueError):
+        build_sources("gc,smart")
+
+
+class Counting(Source):
+    blocking = False
+
+    def __init__(self, name, interval, cost=0.0, budget=0.01):
+        self.name = name
+        self.interval = interval
+        self.budget = budget
+        self.cost = cost
+        self.reads = []
+        self.threads = set()
+
+    def read(self):
+        self.threads.add(threading.get_ident())
+        if self.cost:
+            time.sleep(self.cost)
+        self.reads.append(time.monotonic())
+        return [GaugeMetricFamily(f"test_{self.name}", "reads", value=len(self.reads))]
+
+
+def test_scheduler_staggers_sources():
+    sources = [Counting(name, 4.0) for name in "abcd"]
+    scheduler = CollectorScheduler(sources)
+    scheduler.stagger(100.0)
+    assert [entry.due for entry in scheduler.entries] == [100.0, 101.0, 102.0, 103.0]
+
+    fired = []
+    now = 100.0
+    while now < 112:
+        before = [len(source.reads) for source in sources]
+        scheduler.run_due(now)
+        fired.append([name for source, name, count in zip(sources, "abcd", before)
+                      if len(source.reads) > count])
+        now += 0.5
+    # Never two sources in the same tick; each ran three times.
+    assert all(len(names) <= 1 for names in fired)
+    assert [len(source.reads) for source in sources] == [3, 3, 3, 3]
+    assert "test_c 3.0" in scrape(*scheduler.collect())
+
+
+def test_scheduler_backs_off_and_recovers():
+    source = Counting("slow", 1.0, budget=0.0)
+    scheduler = CollectorScheduler([source], max_backoff=4, recover_after=2)
+    entry = scheduler.entries[0]
+    overruns = COLLECTOR_OVERRUNS.labels("slow")._value.get()
+    scheduler.stagger(0.0)
+    intervals = []
+    for now in range(0, 20):
+        scheduler.run_due(float(now))
+        if entry.interval not in intervals:
+            intervals.append(entry.interval)
+    assert intervals == [2.0, 4.0]  # doubled, capped at 4x
+    assert COLLECTOR_OVERRUNS.labels("slow")._value.get() > overruns
+
+    source.budget = 10.0
+    for now in range(20, 40):
+        scheduler.run_due(float(now))
+    assert entry.interval == 1.0
+
+
+def test_blocking_sources_run_in_threads_and_skip_when_busy():
+    async def scenario():
+        source = Counting("busy", 0.05, cost=0.2, budget=1.0)
+        source.blocking = True
+        gc_source = GCSource()
+        scheduler = CollectorScheduler([source, gc_source])
+        scheduler.start()
+        await asyncio.sleep(0.5)
+        await scheduler.stop()
+        return source, scheduler
+
+    source, scheduler = asyncio.run(scenario())
+    assert threading.get_ident() not in source.threads
+    # Due every 50 ms but each read takes 200 ms: skipped runs back it off.
+    assert 1 <= len(source.reads) <= 3
+    assert scheduler.entries[0].interval > 0.05
+    text = scrape(*scheduler.collect())
+    assert 'app_gc_collections_total{generation="0"}' in text
@@ -0,0 +1,115 @@
+import asyncio, signal, threading, time
+
+import httpx
+
+from drain import DrainCoordinator, DrainMiddleware
+from stream import Broadcaster
+
+AUTH = {"Authorization": "Bearer s3cret"}
+
+
+def test_closed_broadcaster_ends_streams_with_retry_hint():
+    async def scenario():
+        broadcaster = Broadcaster()
+        subscription = broadcaster.subscribe()
+        events = broadcaster.events(subscription, keepalive=5, retry=2)
+        assert await events.__anext__() == b"retry: 2000\n\n"
+        broadcaster.close(retry=1)
+        hint = await events.__anext__()
+        assert hint.startswith(b"retry: ") and 1000 <= int(hint[7:-2]) <= 2000
+        assert [message async for message in events] == []
+        assert not broadcaster.subscribers
+        # Late subscribers are turned away the same way.
+        late = broadcaster.events(broadcaster.subscribe(), retry=2)
+        assert (await late.__anext__()).startswith(b"retry: ")
+
+    asyncio.run(scenario())
+
+
+def test_middleware_closes_connections_once_draining():
+    async def scenario():
+        coordinator = DrainCoordinator()
+        sent = []
+
+        async def app(scope, receive, send):
+            assert coordinator.inflight == 1
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"connection", b"keep-alive")]})
+
+        async def send(message):
+            sent.append(message)
+
+        middleware = DrainMiddleware(app, coordinator)
+        await middleware({"type": "http"}, None, send)
+        coordinator.begin()
+        await middleware({"type": "http"}, None, send)
+        assert sent[0]["headers"] == [(b"connection", b"keep-alive")]
+        assert sent[1]["headers"] == [(b"connection", b"close")]
+        assert coordinator.inflight == 0
+
+    asyncio.run(scenario())
+
+
+def test_shutdown_steps_share_a_deadline():
+    async def scenario():
+        coordinator = DrainCoordinator(background_timeout=0.2)
+        finished = []
+
+        async def step(name, seconds):
+            await asyncio.sleep(seconds)
+            finished.append(name)
+
+        start = time.perf_counter()
+        await coordinator.shutdown([
+            ("quick", step("quick", 0.01)), ("stuck", step("stuck", 60)), ("late", step("late", 0.01)),
+        ])
+        assert time.perf_counter() - start < 1
+        assert finished == ["quick"]
+
+    asyncio.run(scenario())
+
+
+def test_sigterm_drains_a_live_server(serve):
+    process, base_url = serve(
+        DRAIN_DELAY="1.5", SAMPLE_INTERVAL="0.2", LOADGEN_TOKEN="s3cret",
+    )
+    client = httpx.Client(base_url=base_url, timeout=10)
+    assert client.post(
+        "/api/loadgen?kind=latency&latency_ms=2500&routes=/api/alerts", headers=AUTH,
+    ).status_code == 202
+
+    slow = {}
+    def slow_request():
+        slow["response"] = httpx.get(base_url + "/api/alerts", timeout=10)
+    thread = threading.Thread(target=slow_request)
+    stream_lines = []
+    with httpx.stream("GET", base_url + "/api/stream", timeout=10) as stream:
+        thread.start()
+        time.sleep(0.3)
+        signalled = time.monotonic()
+        process.send_signal(signal.SIGTERM)
+        for line in stream.iter_lines():
+            stream_lines.append(line)
+        stream_closed = time.monotonic() - signalled
+
+    # Streams end right away with a reconnect hint.
+    assert stream_closed < 1
+    assert stream_lines[0] == "retry: 2000"
+    assert any(line.startswith("retry: ") for line in stream_lines[1:])
+
+    # Still serving during the delay, but not ready and not keeping connections.
+    ready = client.get("/ready")
+    assert ready.status_code == 503 and ready.json()["reasons"][0] == "shutting down"
+    assert ready.headers["connection"] == "close"
+    assert "app_draining 1.0" in client.get("/metrics").text
+    assert process.poll() is None
+
+    # The request that was in flight at SIGTERM still completes.
+    thread.join(10)
+    assert slow["response"].status_code == 200
+    process.wait(10)
+    exited = time.monotonic() - signalled
+    assert 1.5 <= exited < 6
+    log = process.stderr.read().decode()
+    assert "draining: readiness failing" in log and "drained in" in log
+    assert "did not stop" not in log
@@ -0,0 +1,54 @@
+import gzip
+from fastapi.testclient import TestClient
+from prometheus_client import CollectorRegistry, Counter
+from app import app
+from exposition import CONTENT_TYPE_TEXT, ExpositionCache, accepts_gzip, wants_openmetrics
+
+client = TestClient(app)
+
+def test_scrape_is_plain_text():
+    response = client.get("/metrics", headers={"Accept-Encoding": "identity"})
+    assert response.headers["content-type"] == CONTENT_TYPE_TEXT
+    assert "<html" not in response.text
+    assert "# TYPE cpu_usage_percent gauge" in response.text
+
+def test_scrape_negotiates_openmetrics_and_gzip():
+    response = client.get("/metrics", headers={
+        "Accept": "application/openmetrics-text; version=1.0.0,text/plain;version=0.0.4;q=0.5",
+        "Accept-Encoding": "gzip",
+    })
+    assert response.headers["content-type"].startswith("application/openmetrics-text")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text.rstrip().endswith("# EOF")
+
+def test_metrics_page_is_html():
+    response = client.get("/metrics-page")
+    assert "<html" in response.text
+    assert "app_requests_total" in response.text
+
+def test_cache_shares_render_within_ttl():
+    registry = CollectorRegistry()
+    counter = Counter("hits", "Hits", registry=registry)
+    cache = ExpositionCache(registry, ttl=60)
+    first = cache.render()
+    counter.inc()
+    assert cache.render() is first
+    assert gzip.decompress(cache.render(compress=True)) == first
+    cache.invalidate()
+    assert b"hits_total 1.0" in cache.render()
+
+def test_negotiation_helpers():
+    assert not wants_openmetrics(None)
+    assert wants_openmetrics("application/openmetrics-text;version=1.0.0")
+    assert not wants_openmetrics("application/openmetrics-text;q=0, text/plain")
+    assert not wants_openmetrics("application/openmetrics-text;q=0.4, text/plain;q=0.5")
+    assert wants_openmetrics("application/openmetrics-text;version=1.0.0;q=0.5, text/plain;q=0.5")
+    # Prometheus' own scrape header
+    assert wants_openmetrics(
+        "application/openmetrics-text;version=1.0.0,application/openmetrics-text;version=0.0.1;q=0.75,"
+        "text/plain;version=0.0.4;q=0.5,*/*;q=0.1"
+    )
+    assert not wants_openmetrics("*/*")
+    assert accepts_gzip("br, gzip;q=0.8")
+    assert not accepts_gzip("gzip;q=0")
+    assert not accepts_gzip("")
@@ -0,0 +1,50 @@
+from fastapi.testclient import TestClient
+from app import app
+from history import History, parse_duration
+
+def test_parse_duration():
+    assert parse_duration("90") == 90
+    assert parse_duration("5m") == 300
+    assert parse_duration("1h") == 3600
+
+def test_query_rolls_up_min_max_avg_per_step():
+    history = History(tiers=((1, 60), (10, 60)), series=("cpu",))
+    for t in range(1000, 1060):
+        history.record(t, cpu=float(t % 10))
+    result = history.query("cpu", 60, 10, now=1059)
+    assert result["resolution"] == 10
+    assert len(result["points"]) == 6
+    assert result["points"][-1] == [1050, 0.0, 9.0, 4.5]
+
+def test_fine_tier_serves_short_ranges_and_gaps_are_empty():
+    history = History(tiers=((1, 60), (10, 60)), series=("cpu",))
+    history.record(100, cpu=10.0)
+    history.record(100.5, cpu=30.0)
+    history.record(103, cpu=50.0)
+    points = history.query("cpu", 4, 1, now=103)["points"]
+    assert points == [[100, 10.0, 30.0, 20.0], [101, None, None, None],
+                      [102, None, None, None], [103, 50.0, 50.0, 50.0]]
+
+def test_ring_overwrites_old_buckets():
+    history = History(tiers=((1, 10),), series=("cpu",))
+    for t in range(100):
+        history.record(t, cpu=float(t))
+    points = history.query("cpu", 20, 1, now=99)["points"]
+    values = [point[1] for point in points if point[1] is not None]
+    assert values == [float(t) for t in range(90, 100)]
+
+def test_memory_is_fixed_up_front():
+    history = History()
+    size = history.nbytes()
+    for t in range(5000):
+        history.record(t, cpu=1.0, memory=2.0, requests=3.0)
+    assert history.nbytes() == size < 1024 * 1024
+
+def test_history_endpoint(wait_for_first_sample):
+    with TestClient(app) as client:
+        wait_for_first_sample()
+        data = client.get("/api/history", params={"series": "memory", "range": "1m", "step": "1s"}).json()
+        assert data["resolution"] == 1
+        assert any(point[1] is not None for point in data["points"])
+        assert client.get("/api/history", params={"series": "disk"}).status_code == 400
+        assert client.get("/api/history", params={"step": "abc"}).status_code == 400
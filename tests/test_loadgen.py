@@ -0,0 +1,128 @@
+import asyncio, time
+
+import psutil
+import pytest
+from fastapi.testclient import TestClient
+
+import app as app_module
+import config
+from app import app
+from loadgen import LoadGenerator
+from metrics import LOADGEN_ACTIVE, LOADGEN_MEMORY_BYTES, LOADGEN_RUNS, multiprocess_enabled
+
+AUTH = {"Authorization": "Bearer s3cret"}
+
+
+def test_runs_validate_and_clamp():
+    async def scenario():
+        generator = LoadGenerator(max_seconds=5, max_memory_bytes=1 << 20, max_latency=0.5)
+        for kwargs in (
+            {"kind": "disk", "seconds": 1},
+            {"kind": "cpu", "seconds": 0},
+            {"kind": "cpu", "seconds": 1, "utilization": 1.5},
+            {"kind": "memory", "seconds": 1},
+            {"kind": "latency", "seconds": 1, "latency": 0.1},
+        ):
+            with pytest.raises(ValueError):
+                generator.start(**kwargs)
+
+        run = generator.start("latency", 60, latency=9, routes=["/api/stats"])
+        assert (run.seconds, run.params["latency"]) == (5, 0.5)
+        # One run per kind at a time.
+        assert generator.start("latency", 1, latency=0.1, routes=["/"]) is None
+        await generator.stop()
+        assert run.state == "cancelled" and not generator.active
+
+    asyncio.run(scenario())
+
+
+def test_memory_run_holds_buffers_until_deadline():
+    async def scenario():
+        generator = LoadGenerator(max_memory_bytes=40 << 20)
+        completed = LOADGEN_RUNS.labels("memory", "completed")._value.get()
+        run = generator.start("memory", 0.3, memory_bytes=1 << 30)
+        await asyncio.sleep(0.1)
+        assert sum(map(len, generator.buffers)) == 40 << 20  # capped
+        assert LOADGEN_MEMORY_BYTES._value.get() == 40 << 20
+        assert LOADGEN_ACTIVE.labels("memory")._value.get() == 1
+        assert generator.status()["active"][0]["remaining"] <= 0.3
+        await run.task
+        assert run.state == "completed" and not generator.buffers
+        assert LOADGEN_MEMORY_BYTES._value.get() == 0
+        assert LOADGEN_ACTIVE.labels("memory")._value.get() == 0
+        assert LOADGEN_RUNS.labels("memory", "completed")._value.get() == completed + 1
+        assert generator.status()["finished"][0]["id"] == run.id
+
+    asyncio.run(scenario())
+
+
+def test_latency_routes_match_exactly_or_by_prefix():
+    async def scenario():
+        generator = LoadGenerator()
+        generator.start("latency", 60, latency=0.2, routes=["/api/stats", "/api/history*", "/ready"])
+        await asyncio.sleep(0.01)
+        assert generator.delay_for("/api/stats") == 0.2
+        assert generator.delay_for("/api/history") == 0.2
+        assert generator.delay_for("/api/stats/x") == 0.0
+        assert generator.delay_for("/ready") == 0.0  # probes are never delayed
+        await generator.stop()
+        assert generator.delay_for("/api/stats") == 0.0
+
+    asyncio.run(scenario())
+
+
+def test_cpu_run_burns_in_worker_processes_and_cancels():
+    async def scenario():
+        generator = LoadGenerator(max_cores=1, chunk=0.05)
+        run = generator.start("cpu", 30, cores=4)
+        assert run.params["cores"] == 1
+        await asyncio.sleep(1.5)  # spawning a worker interpreter takes a moment
+        workers = psutil.Process().children()
+        assert workers
+        assert sum(worker.cpu_times().user for worker in workers) > 0.2
+        start = time.perf_counter()
+        generator.cancel(run.id)
+        await run.task
+        assert time.perf_counter() - start < 1
+        assert run.state == "cancelled"
+
+    asyncio.run(scenario())
+
+
+def test_endpoint_needs_token_and_drives_runs(monkeypatch):
+    with TestClient(app) as client:
+        monkeypatch.setattr(config, "LOADGEN_TOKEN", "")
+        assert client.get("/api/loadgen", headers=AUTH).status_code == 404
+        monkeypatch.setattr(config, "LOADGEN_TOKEN", "s3cret")
+        monkeypatch.setattr(app_module, "multiprocess_enabled", lambda: True)
+        response = client.get("/api/loadgen", headers=AUTH)
+        assert response.status_code == 404 and "WEB_CONCURRENCY" in response.json()["detail"]
+        monkeypatch.setattr(app_module, "multiprocess_enabled", multiprocess_enabled)
+        assert client.get("/api/loadgen").status_code == 403
+        assert client.post("/api/loadgen?kind=cpu&seconds=-1", headers=AUTH).status_code == 400
+
+        response = client.post(
+            "/api/loadgen?kind=latency&seconds=30&latency_ms=300&routes=/api/alerts", headers=AUTH,
+        )
+        assert response.status_code == 202
+        run_id = response.json()["id"]
+        assert client.post(
+            "/api/loadgen?kind=latency&latency_ms=1&routes=/", headers=AUTH,
+        ).status_code == 409
+
+        start = time.perf_counter()
+        assert client.get("/api/alerts").status_code == 200
+        assert time.perf_counter() - start >= 0.3
+        start = time.perf_counter()
+        client.get("/api/loadgen", headers=AUTH)
+        assert time.perf_counter() - start < 0.3
+
+        status = client.get("/api/loadgen", headers=AUTH).json()
+        assert [run["id"] for run in status["active"]] == [run_id]
+        app_module.exposition.invalidate()
+        assert 'app_loadgen_latency_seconds 0.3' in client.get("/metrics").text
+
+        assert client.delete("/api/loadgen?id=999", headers=AUTH).status_code == 404
+        cancelled = client.delete(f"/api/loadgen?id={run_id}", headers=AUTH).json()["cancelled"]
+        assert cancelled[0]["state"] == "cancelled"
+        assert client.get("/api/loadgen", headers=AUTH).json()["active"] == []
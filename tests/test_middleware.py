@@ -0,0 +1,75 @@
+import asyncio, time
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram
+from app import app
+from middleware import InstrumentationMiddleware
+
+client = TestClient(app)
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def test_counts_by_route_template_method_and_status():
+    before = sample("app_requests_total", route="/health", method="GET", status="200")
+    client.get("/health")
+    client.get("/health")
+    assert sample("app_requests_total", route="/health", method="GET", status="200") == before + 2
+    assert sample("app_request_duration_seconds_count", route="/health", method="GET") >= 2
+
+def test_unmatched_paths_share_one_label_set():
+    before = sample("app_requests_total", route="<unmatched>", method="GET", status="404")
+    for i in range(5):
+        client.get(f"/no-such-page-{i}")
+    assert sample("app_requests_total", route="<unmatched>", method="GET", status="404") == before + 5
+
+def test_unknown_methods_share_one_label():
+    before = sample("app_requests_total", route="/health", method="other", status="405")
+    for i in range(5):
+        client.request(f"X-METHOD-{i}", "/health")
+    assert sample("app_requests_total", route="/health", method="other", status="405") == before + 5
+    assert sample("app_requests_total", route="/health", method="X-METHOD-0", status="405") == 0
+
+def make_middleware(inner):
+    registry = CollectorRegistry()
+    return InstrumentationMiddleware(
+        inner,
+        counter=Counter("c", "c", ["route", "method", "status"], registry=registry),
+        histogram=Histogram("h", "h", ["route", "method"], registry=registry),
+        in_progress=Gauge("g", "g", registry=registry),
+    )
+
+@pytest.mark.benchmark
+def test_middleware_overhead_is_microseconds():
+    class Route:
+        path = "/bench"
+
+    scope = {"type": "http", "method": "GET", "route": Route()}
+    start_message = {"type": "http.response.start", "status": 200, "headers": []}
+    body_message = {"type": "http.response.body", "body": b""}
+
+    async def inner(scope, receive, send):
+        await send(start_message)
+        await send(body_message)
+
+    async def send(message):
+        pass
+
+    async def timed(asgi, n):
+        start = time.perf_counter()
+        for _ in range(n):
+            await asgi(scope, None, send)
+        return (time.perf_counter() - start) / n
+
+    async def bench():
+        wrapped = make_middleware(inner)
+        n = 20000
+        await timed(wrapped, 1000)
+        return await timed(inner, n), await timed(wrapped, n)
+
+    bare, wrapped = asyncio.run(bench())
+    overhead_us = (wrapped - bare) * 1e6
+    print(f"middleware overhead: {overhead_us:.2f} us/request")
+    # Typically a few microseconds.
+    assert overhead_us < 50
@@ -0,0 +1,31 @@
+import glob, time
+
+import httpx
+
+def scraped_requests(text, route=None):
+    total = 0.0
+    for line in text.splitlines():
+        if line.startswith("app_requests_total{") and (route is None or f'route="{route}"' in line):
+            total += float(line.rsplit(" ", 1)[1])
+    return total
+
+def test_workers_aggregate_metrics(serve, tmp_path):
+    _, base_url = serve(
+        WEB_CONCURRENCY="3", PROMETHEUS_MULTIPROC_DIR=str(tmp_path), METRICS_CACHE_TTL="0",
+        SAMPLE_INTERVAL="0.1",
+    )
+    for _ in range(20):
+        # Fresh connections so the kernel can hand requests to different workers.
+        assert httpx.get(base_url + "/metrics-page").status_code == 200
+
+    assert len(glob.glob(str(tmp_path / "counter_*.db"))) == 3
+    time.sleep(0.5)  # /api/stats reports the sampler's total; let it catch up
+    stats = httpx.get(base_url + "/api/stats").json()
+    scrape = httpx.get(base_url + "/metrics").text
+    assert scraped_requests(scrape, "/metrics-page") == 20
+    # The /api/stats call itself is counted once it completes.
+    assert scraped_requests(scrape) == stats["requests"] + 1
+    # Every worker's latency sketches are merged into the percentiles.
+    assert stats["latency"]["/metrics-page"]["1m"]["count"] == 20
+    assert "cpu_usage_percent" in scrape
+    assert 'app_route_latency_seconds_count{route="/metrics-page"} 20.0' in scrape
@@ -0,0 +1,58 @@
+import gzip
+
+import brotli
+from fastapi.testclient import TestClient
+from app import app
+from pages import PageTemplate, RenderedPage, StaticPage
+
+client = TestClient(app)
+
+def test_static_page_negotiates_encoding():
+    plain = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert "Health Metrics Service" in plain.text
+    assert plain.headers["cache-control"].startswith("public")
+
+    compressed = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["etag"] != plain.headers["etag"]
+    assert compressed.text == plain.text
+
+    raw = client.get("/dashboard", headers={"Accept-Encoding": "br, gzip"})
+    assert raw.headers["content-encoding"] == "br"
+
+def test_static_page_returns_304_on_matching_etag():
+    etag = client.get("/dashboard").headers["etag"]
+    response = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert client.get("/dashboard", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+def test_static_page_variants_are_precomputed():
+    page = StaticPage("<p>hi</p>" * 200)
+    body, _ = page.variants["identity"]
+    assert gzip.decompress(page.variants["gzip"][0]) == body
+    assert brotli.decompress(page.variants["br"][0]) == body
+    assert len(page.etags) == 3
+
+def test_template_renders_only_the_values():
+    template = PageTemplate("<style>a {{ color: red; }}</style><b>{cpu:.1f}%</b>{name}")
+    assert template.chunks[0] == b"<style>a { color: red; }</style><b>"
+    assert template.render(cpu=12.345, name="x") == b"<style>a { color: red; }</style><b>12.3%</b>x"
+
+def test_dynamic_pages_render():
+    health = client.get("/health-page")
+    assert "CPU Usage" in health.text and "%" in health.text
+    assert health.headers["cache-control"] == "no-cache"
+    assert client.get("/metrics-page").headers["content-encoding"] == "gzip"
+
+def test_rendered_page_compresses_once_per_version():
+    renders = []
+    page = RenderedPage(lambda version: renders.append(version) or b"<p>%s</p>" % version * 200)
+    gzipped = {"accept-encoding": "gzip"}
+    request = type("Request", (), {"headers": gzipped})()
+    first = page.response(request, b"v1")
+    assert page.response(request, b"v1").body is first.body
+    assert gzip.decompress(first.body) == b"<p>v1</p>" * 200
+    assert page.response(type("Request", (), {"headers": {}})(), b"v1").body == b"<p>v1</p>" * 200
+    assert page.response(request, b"v2").body is not first.body
+    assert renders == [b"v1", b"v2"]
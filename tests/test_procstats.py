@@ -0,0 +1,102 @@
+import gc, os, threading
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+from prometheus_client import CollectorRegistry, generate_latest
+
+import app as app_module
+from app import app
+from metrics import ProcessInternalsCollector
+from procstats import GCMonitor, ProcReader, ProcessStats
+from sampler import Sampler
+
+
+class Node:
+    def __init__(self):
+        self.other = self
+
+
+def test_gc_monitor_times_collections():
+    monitor = GCMonitor()
+    monitor.install()
+    try:
+        for _ in range(100):
+            Node()
+        gc.collect()
+    finally:
+        monitor.uninstall()
+    assert monitor._callback not in gc.callbacks
+
+    buckets = monitor.cumulative_buckets(2)
+    assert buckets[-1][0] == float("inf")
+    assert buckets[-1][1] >= 1
+    assert [count for _, count in buckets] == sorted(count for _, count in buckets)
+    assert monitor.pause_sum[2] > 0
+    assert monitor.collected[2] >= 100
+
+
+def test_proc_reader_matches_the_process():
+    reader = ProcReader()
+    try:
+        stop = threading.Event()
+        worker = threading.Thread(target=stop.wait)
+        worker.start()
+        first = reader.sample()
+        stop.set()
+        worker.join()
+        fd = os.open(os.devnull, os.O_RDONLY)
+        second = reader.sample()
+        os.close(fd)
+    finally:
+        reader.close()
+
+    assert first.threads >= second.threads + 1
+    assert second.open_fds == first.open_fds + 1
+    assert 0 < second.uss_bytes <= second.rss_bytes
+    assert second.voluntary_switches >= first.voluntary_switches
+
+
+def test_sampler_carries_process_stats():
+    reader = ProcReader()
+    try:
+        snapshot = Sampler(interval=60, process=reader).sample()
+    finally:
+        reader.close()
+    assert isinstance(snapshot.process, ProcessStats)
+    assert snapshot.process.rss_bytes > 0
+
+
+def test_collector_reads_only_in_memory_state():
+    stats = ProcessStats(
+        threads=7, open_fds=12, rss_bytes=4096, uss_bytes=2048,
+        voluntary_switches=5, involuntary_switches=3,
+    )
+    sampler = SimpleNamespace(snapshot=SimpleNamespace(process=stats))
+    monitor = GCMonitor()
+    monitor._callback("start", {})
+    monitor._callback("stop", {"generation": 1, "collected": 9, "uncollectable": 1})
+
+    registry = CollectorRegistry()
+    registry.register(ProcessInternalsCollector(sampler, monitor))
+    text = generate_latest(registry).decode()
+    assert 'app_gc_pause_seconds_bucket{generation="1",le="+Inf"} 1.0' in text
+    assert 'app_gc_pause_seconds_count{generation="0"} 0.0' in text
+    assert 'app_gc_collected_objects_total{generation="1"} 9.0' in text
+    assert 'app_gc_uncollectable_objects_total{generation="1"} 1.0' in text
+    assert "app_process_threads 7.0" in text
+    assert "app_process_unique_memory_bytes 2048.0" in text
+    assert 'app_process_context_switches_total{kind="involuntary"} 3.0' in text
+
+    # Before the first sample only the GC families are exported.
+    sampler.snapshot = SimpleNamespace(process=None)
+    assert "app_process_threads" not in generate_latest(registry).decode()
+
+
+def test_metrics_endpoint_exports_process_internals(wait_for_first_sample):
+    with TestClient(app) as client:
+        wait_for_first_sample()
+        app_module.exposition.invalidate()
+        text = client.get("/metrics").text
+    assert "app_gc_pause_seconds_bucket" in text
+    assert "app_process_open_fds" in text
+    assert "app_process_resident_memory_bytes" in text
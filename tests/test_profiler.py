@@ -0,0 +1,107 @@
+import asyncio, threading, time, tracemalloc
+
+from fastapi.testclient import TestClient
+
+import app as app_module
+import config
+from app import app
+from profiler import SessionGuard, StackSampler, heap_diff
+
+AUTH = {"Authorization": "Bearer s3cret"}
+
+
+def spin_for_profile(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_debug_endpoints_need_a_token(monkeypatch):
+    with TestClient(app) as client:
+        monkeypatch.setattr(config, "DEBUG_TOKEN", "")
+        assert client.get("/debug/profile", headers=AUTH).status_code == 404
+        monkeypatch.setattr(config, "DEBUG_TOKEN", "s3cret")
+        assert client.get("/debug/profile").status_code == 403
+        assert client.get("/debug/heap", headers={"Authorization": "Bearer nope"}).status_code == 403
+        assert client.get("/debug/profile?seconds=0", headers=AUTH).status_code == 400
+
+
+def test_stack_sampler_collapses_busy_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=spin_for_profile, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        sampler = StackSampler(interval=0.005)
+        collapsed = asyncio.run(sampler.run(0.2))
+    finally:
+        stop.set()
+        worker.join()
+
+    assert sampler.samples > 10
+    lines = [line.rpartition(" ") for line in collapsed.splitlines()]
+    busy = [stack for stack, _, count in lines if stack.startswith("busy-worker;")]
+    assert any("spin_for_profile (test_profiler.py:" in stack for stack in busy)
+    assert all(count.isdigit() for _, _, count in lines)
+    # The sampler never reports its own thread.
+    assert not any(stack.startswith("stack-sampler;") for stack, _, _ in lines)
+
+
+def test_profile_endpoint_caps_duration(monkeypatch):
+    monkeypatch.setattr(config, "DEBUG_TOKEN", "s3cret")
+    monkeypatch.setattr(config, "DEBUG_MAX_SECONDS", 0.2)
+    with TestClient(app) as client:
+        start = time.perf_counter()
+        response = client.get("/debug/profile?seconds=60", headers=AUTH)
+        assert time.perf_counter() - start < 5
+    assert response.status_code == 200
+    assert response.headers["x-profile-seconds"] == "0.2"
+    assert "MainThread;" in response.text
+    # Idle again afterwards: no sampler thread left behind.
+    assert not any(thread.name == "stack-sampler" for thread in threading.enumerate())
+
+
+def test_concurrent_sessions_are_refused(monkeypatch):
+    monkeypatch.setattr(config, "DEBUG_TOKEN", "s3cret")
+    guard = SessionGuard()
+    assert guard.begin("profile")
+    assert not guard.begin("heap")
+    guard.end()
+    assert guard.begin("heap")
+
+    with TestClient(app) as client:
+        assert app_module.debug_sessions.begin("heap")
+        try:
+            response = client.get("/debug/profile?seconds=0.1", headers=AUTH)
+        finally:
+            app_module.debug_sessions.end()
+        assert response.status_code == 409
+        assert "heap" in response.json()["detail"]
+        assert client.get("/debug/profile?seconds=0.05", headers=AUTH).status_code == 200
+
+
+def test_heap_diff_finds_new_allocations():
+    kept = []
+
+    def allocate():
+        kept.extend(bytearray(1024) for _ in range(2000))
+
+    async def main():
+        asyncio.get_running_loop().call_later(0.05, allocate)
+        return await heap_diff(0.2, limit=5)
+
+    result = asyncio.run(main())
+    assert not tracemalloc.is_tracing()  # switched off again after the window
+    assert result["size_diff"] >= 2000 * 1024
+    top = result["top"][0]
+    assert "test_profiler.py" in top["location"]
+    assert top["size_diff"] >= 2000 * 1024
+
+
+def test_heap_endpoint(monkeypatch):
+    monkeypatch.setattr(config, "DEBUG_TOKEN", "s3cret")
+    with TestClient(app) as client:
+        response = client.get("/debug/heap?seconds=0.1&limit=3", headers=AUTH)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["seconds"] == 0.1
+    assert len(body["top"]) <= 3
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,213 @@
+import asyncio, gzip, struct, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from prometheus_client import CollectorRegistry, Counter
+import pusher
+from pusher import PushExporter, encode_write_request, snappy_compress
+
+def snappy_decompress(data):
+    # Reference block decoder for the receiver stand-in.
+    length, shift, pos = 0, 0, 0
+    while True:
+        byte = data[pos]; pos += 1
+        length |= (byte & 0x7F) << shift; shift += 7
+        if byte < 0x80:
+            break
+    out = bytearray()
+    while pos < len(data):
+        tag = data[pos]; pos += 1
+        kind = tag & 3
+        if kind == 0:
+            n = tag >> 2
+            if n >= 60:
+                extra = n - 59
+                n = int.from_bytes(data[pos:pos + extra], "little"); pos += extra
+            out += data[pos:pos + n + 1]; pos += n + 1
+            continue
+        if kind == 1:
+            size, offset = ((tag >> 2) & 7) + 4, ((tag >> 5) << 8) | data[pos]; pos += 1
+        elif kind == 2:
+            size, offset = (tag >> 2) + 1, struct.unpack_from("<H", data, pos)[0]; pos += 2
+        else:
+            size, offset = (tag >> 2) + 1, struct.unpack_from("<I", data, pos)[0]; pos += 4
+        for _ in range(size):
+            out.append(out[-offset])
+    assert len(out) == length
+    return bytes(out)
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]; pos += 1
+        value |= (byte & 0x7F) << shift; shift += 7
+        if byte < 0x80:
+            return value, pos
+
+def parse_fields(data):
+    pos, fields = 0, []
+    while pos < len(data):
+        key, pos = read_varint(data, pos)
+        number, wire = key >> 3, key & 7
+        if wire == 2:
+            size, pos = read_varint(data, pos)
+            fields.append((number, data[pos:pos + size])); pos += size
+        elif wire == 1:
+            fields.append((number, struct.unpack_from("<d", data, pos)[0])); pos += 8
+        else:
+            value, pos = read_varint(data, pos)
+            fields.append((number, value))
+    return fields
+
+def decode_write_request(body):
+    series = []
+    for _, raw in parse_fields(body):
+        labels, samples = {}, []
+        for number, payload in parse_fields(raw):
+            if number == 1:
+                label = dict(parse_fields(payload))
+                labels[label[1].decode()] = label[2].decode()
+            else:
+                samples.append(dict(parse_fields(payload)))
+        series.append((labels, samples))
+    return series
+
+class Receiver:
+    """Local stand-in for a remote-write endpoint / Pushgateway."""
+
+    def __init__(self, fail_first=0, fail_status=503):
+        self.batches = []
+        self.requests = 0
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def handle_body(self):
+                receiver.requests += 1
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                if receiver.requests <= receiver.fail_first:
+                    self.send_response(receiver.fail_status)
+                else:
+                    receiver.batches.append((self.command, self.path, dict(self.headers), body))
+                    self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            do_POST = do_PUT = handle_body
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+def make_registry():
+    registry = CollectorRegistry()
+    Counter("jobs", "Jobs", ["kind"], registry=registry).labels("a").inc(3)
+    return registry
+
+def test_snappy_fallback_round_trips_and_compresses(monkeypatch):
+    monkeypatch.setattr(pusher, "snappy", None)
+    data = ("app_requests_total{route=\"/x\",method=\"GET\"} 1\n" * 200).encode() + bytes(range(256)) * 300
+    compressed = snappy_compress(data)
+    assert snappy_decompress(compressed) == data
+    assert len(compressed) < len(data) / 2
+
+def test_write_request_encoding():
+    body = encode_write_request([({"__name__": "up", "job": "x"}, 1.5, 1234)])
+    assert decode_write_request(body) == [({"__name__": "up", "job": "x"}, [{1: 1.5, 2: 1234}])]
+
+def test_remote_write_batches_and_backoff(monkeypatch):
+    monkeypatch.setattr(pusher, "snappy", None)
+    receiver = Receiver(fail_first=2)
+
+    async def main():
+        exporter = PushExporter(make_registry(), receiver.url + "/api/v1/write", interval=0.05,
+                                backoff_base=0.01, max_backoff=0.05, instance="pod-1")
+        exporter.start()
+        while len(receiver.batches) < 3:
+            await asyncio.sleep(0.01)
+        await exporter.stop(final_push=False)
+        return exporter
+
+    exporter = asyncio.run(main())
+    receiver.server.shutdown()
+    assert receiver.requests >= 5  # two failures, then batches drain
+    assert exporter.failures == 0
+    method, path, headers, body = receiver.batches[0]
+    assert (method, path) == ("POST", "/api/v1/write")
+    assert headers["Content-Encoding"] == "snappy"
+    series = dict((labels["__name__"], (labels, samples)) for labels, samples in
+                  decode_write_request(snappy_decompress(body)))
+    labels, samples = series["jobs_total"]
+    assert labels == {"__name__": "jobs_total", "job": "health-metrics", "instance": "pod-1", "kind": "a"}
+    assert samples[0][1] == 3.0
+
+def test_rejected_batches_are_dropped_not_retried():
+    receiver = Receiver(fail_first=1, fail_status=400)
+
+    async def main():
+        exporter = PushExporter(make_registry(), receiver.url + "/api/v1/write")
+        for _ in range(2):
+            await exporter.collect()
+        assert await exporter.flush()
+        await exporter.stop(final_push=False)
+        return exporter
+
+    exporter = asyncio.run(main())
+    receiver.server.shutdown()
+    assert receiver.requests == 2 and len(receiver.batches) == 1
+    assert exporter.failures == 0 and not exporter.buffer
+
+def test_a_failing_collector_does_not_stop_pushing():
+    class Broken:
+        def __init__(self):
+            self.calls = 0
+
+        def collect(self):
+            self.calls += 1
+            raise RuntimeError("collector broke")
+
+    registry = make_registry()
+    broken = Broken()
+    registry.register(broken)
+
+    async def main():
+        exporter = PushExporter(registry, "http://127.0.0.1:9", interval=0.02)
+        exporter.start()
+        await asyncio.sleep(0.2)
+        running = not exporter._task.done()
+        await exporter.stop(final_push=False)
+        return running
+
+    assert asyncio.run(main())
+    assert broken.calls >= 3
+
+def test_buffer_drops_oldest_when_receiver_is_down():
+    async def main():
+        exporter = PushExporter(make_registry(), "http://127.0.0.1:9", buffer_size=3, timeout=0.2)
+        for _ in range(5):
+            await exporter.collect()
+        first = exporter.buffer[0]
+        assert not await exporter.flush()
+        await exporter.stop(final_push=False)
+        return exporter, first
+
+    exporter, first = asyncio.run(main())
+    assert len(exporter.buffer) == 3 and exporter.buffer[0] is first
+    assert exporter.failures == 1
+
+def test_pushgateway_mode_puts_gzipped_text():
+    receiver = Receiver()
+
+    async def main():
+        exporter = PushExporter(make_registry(), receiver.url, mode="pushgateway", instance="pod 1")
+        await exporter.stop()  # final push only
+
+    asyncio.run(main())
+    receiver.server.shutdown()
+    assert len(receiver.batches) == 1
+    method, path, headers, body = receiver.batches[0]
+    assert (method, path) == ("PUT", "/metrics/job/health-metrics/instance/pod%201")
+    assert b'jobs_total{kind="a"} 3.0' in gzip.decompress(body)
@@ -0,0 +1,52 @@
+import asyncio, time
+from types import SimpleNamespace
+
+import anyio.to_thread
+from fastapi.testclient import TestClient
+from app import app
+from loopmon import LoopMonitor, ReadinessCheck
+
+def test_ready_endpoint_and_cheap_health():
+    with TestClient(app) as client:
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+        assert client.get("/health").json() == {"status": "healthy"}
+
+def test_readiness_fails_past_thresholds():
+    monitor = SimpleNamespace(lag=0.8, queue_wait=0.0, waiting=0, in_use=1, size=40)
+    check = ReadinessCheck(monitor, max_loop_lag=0.5)
+    ready, details = check.check()
+    assert not ready
+    assert details["reasons"] == ["event loop lag 0.800s > 0.5s"]
+    monitor.lag = 0.1
+    assert check.check()[0]
+
+def test_monitor_sees_a_blocked_loop():
+    async def main():
+        monitor = LoopMonitor(interval=0.02, probe_interval=0.02)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.3)  # hog the loop
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        return monitor.lag
+
+    assert asyncio.run(main()) >= 0.2
+
+def test_monitor_sees_a_saturated_threadpool():
+    async def main():
+        anyio.to_thread.current_default_thread_limiter().total_tokens = 2
+        monitor = LoopMonitor(interval=0.02, probe_interval=0.02)
+        monitor.start()
+        jobs = [asyncio.ensure_future(anyio.to_thread.run_sync(time.sleep, 0.4)) for _ in range(4)]
+        await asyncio.sleep(0.3)
+        readings = (monitor.in_use, monitor.size, monitor.waiting, monitor.queue_wait)
+        await asyncio.gather(*jobs)
+        await monitor.stop()
+        return readings
+
+    in_use, size, waiting, queue_wait = asyncio.run(main())
+    assert (in_use, size) == (2, 2)
+    assert waiting >= 2
+    assert queue_wait >= 0.2
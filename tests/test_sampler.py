@@ -0,0 +1,60 @@
+import asyncio, math, threading
+from fastapi.testclient import TestClient
+from app import app, sampler
+from sampler import Sampler
+
+def test_sample_publishes_new_generation():
+    s = Sampler(interval=60)
+    seen = []
+    s.subscribe(seen.append)
+    first = s.sample()
+    second = s.sample()
+    assert second.generation == first.generation + 1
+    assert s.snapshot is second
+    assert seen == [first, second]
+    assert 0 <= second.memory <= 100
+    assert second.age >= 0
+
+def test_empty_snapshot_is_stale():
+    assert math.isinf(Sampler().snapshot.age)
+
+def test_stats_reads_snapshot_from_lifespan_sampler(monkeypatch, wait_for_first_sample):
+    # Keep the lifespan sampler from ticking between the request and the asserts.
+    monkeypatch.setattr(sampler, "interval", 3600)
+    with TestClient(app) as client:
+        wait_for_first_sample()
+        data = client.get("/api/stats").json()
+        assert data["cpu"] == sampler.snapshot.cpu
+        assert data["memory"] == sampler.snapshot.memory
+        assert data["generation"] == sampler.snapshot.generation
+        assert data["sampled_at"] == sampler.snapshot.wall_time
+        assert "sample_age_seconds" in client.get("/metrics").text
+
+def test_request_rate_from_counter_deltas():
+    total = iter([10.0, 30.0])
+    s = Sampler(interval=60, request_total=lambda: next(total))
+    assert s.sample().request_rate == 0.0
+    second = s.sample()
+    assert second.requests == 30.0
+    assert second.request_rate > 0
+
+def test_background_reads_stay_off_the_event_loop():
+    threads = []
+
+    class Reader:
+        def sample(self):
+            threads.append(threading.get_ident())
+
+    async def scenario():
+        s = Sampler(interval=0.01, request_total=lambda: threads.append(threading.get_ident()) or 0.0,
+                    process=Reader())
+        seen = []
+        s.subscribe(lambda snapshot: seen.append(threading.get_ident()))
+        s.start(warmup=0)
+        await asyncio.sleep(0.2)
+        await s.stop()
+        return seen
+
+    seen = asyncio.run(scenario())
+    assert seen and set(seen) == {threading.get_ident()}  # listeners on the loop
+    assert threads and threading.get_ident() not in threads
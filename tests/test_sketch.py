@@ -0,0 +1,154 @@
+import math, os, random, time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app
+from sketch import (
+    DDSketch, LatencyTracker, dump_snapshot, load_snapshot, merge_snapshots, read_worker_files,
+    merge_totals, summarize, write_worker_file,
+)
+
+QS = (0.5, 0.9, 0.99, 0.999)
+
+
+def exact(values, q):
+    return sorted(values)[int(q * (len(values) - 1))]
+
+
+@pytest.mark.parametrize("name", ["lognormal", "uniform", "bimodal"])
+def test_quantiles_within_relative_accuracy(name):
+    rng = random.Random(11)
+    draw = {
+        "lognormal": lambda: rng.lognormvariate(-5, 1.5),
+        "uniform": lambda: rng.uniform(0.001, 2.0),
+        "bimodal": lambda: rng.choice((rng.gauss(0.005, 0.001), rng.gauss(0.8, 0.1))),
+    }[name]
+    values = [abs(draw()) for _ in range(50_000)]
+    sketch = DDSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+    for q, estimate in zip(QS, sketch.quantiles(QS)):
+        truth = exact(values, q)
+        assert abs(estimate - truth) <= 0.0101 * truth, (q, estimate, truth)
+    assert sketch.count == len(values)
+    assert sketch.sum == pytest.approx(sum(values))
+
+
+def test_merge_equals_sketch_of_the_union():
+    rng = random.Random(5)
+    a_values = [rng.expovariate(50) for _ in range(3000)]
+    b_values = [rng.expovariate(5) for _ in range(3000)]
+    a, b, both = DDSketch(), DDSketch(), DDSketch()
+    for value in a_values:
+        a.add(value)
+        both.add(value)
+    for value in b_values:
+        b.add(value)
+        both.add(value)
+    merged = DDSketch().merge(a).merge(b)
+    assert merged.bins == both.bins
+    assert merged.quantiles(QS) == both.quantiles(QS)
+    with pytest.raises(ValueError):
+        DDSketch(0.02).merge(a)
+
+
+def test_memory_is_bounded_and_the_tail_stays_accurate():
+    sketch = DDSketch(relative_accuracy=0.01, max_bins=128)
+    values = [10 ** (i / 1000 - 6) for i in range(10_000)]  # 1 us .. 10000 s
+    for value in values:
+        sketch.add(value)
+    assert len(sketch.bins) <= 128
+    # Only the lowest buckets are folded together; the tail keeps its accuracy.
+    for q in (0.99, 0.999):
+        truth = exact(values, q)
+        assert abs(sketch.quantile(q) - truth) <= 0.0101 * truth
+
+
+@pytest.mark.benchmark
+def test_add_and_query_speed():
+    rng = random.Random(2)
+    values = [rng.lognormvariate(-5, 1) for _ in range(100_000)]
+    sketch = DDSketch()
+    start = time.perf_counter()
+    for value in values:
+        sketch.add(value)
+    add_rate = len(values) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(100):
+        sketch.quantiles(QS)
+    query_us = (time.perf_counter() - start) / 100 * 1e6
+    start = time.perf_counter()
+    ordered = sorted(values)
+    sort_us = (time.perf_counter() - start) * 1e6
+    print(f"ddsketch: {add_rate:,.0f} adds/s, 4 quantiles in {query_us:.0f} us "
+          f"({len(sketch.bins)} bins) vs {sort_us:.0f} us to sort the raw values")
+    # ~2M adds/s on a laptop.
+    assert add_rate > 100_000
+    assert query_us < sort_us and ordered
+
+
+def test_sliding_windows_forget_old_requests():
+    now = [1000.0]
+    tracker = LatencyTracker(windows=(60, 300), buckets=5, clock=lambda: now[0])
+    for _ in range(100):
+        tracker.add("/a", 0.5)
+    now[0] += 90
+    for _ in range(100):
+        tracker.add("/a", 0.01)
+    windows = tracker.snapshot()["/a"]
+    assert windows[60.0].count == 100 and windows[60.0].quantile(0.99) == pytest.approx(0.01, rel=0.01)
+    assert windows[300.0].count == 200 and windows[300.0].quantile(0.99) == pytest.approx(0.5, rel=0.01)
+
+    now[0] += 400
+    windows = tracker.snapshot()["/a"]
+    assert windows[60.0].count == windows[300.0].count == 0
+    assert summarize({"/a": windows})["/a"]["5m"] == {
+        "count": 0, "p50": None, "p90": None, "p99": None, "p99.9": None,
+    }
+    # The summary's _count and _sum never go down with the windows.
+    count, total = tracker.cumulative()["/a"]
+    assert count == 200 and total == pytest.approx(51.0)
+    with pytest.raises(ValueError):
+        LatencyTracker(windows=(60, 100), buckets=5)
+
+
+def test_snapshots_serialize_and_merge_across_workers(tmp_path):
+    trackers = [LatencyTracker(clock=lambda: 50.0) for _ in range(3)]
+    for index, tracker in enumerate(trackers):
+        for i in range(1000):
+            tracker.add("/x", (index + 1) * 0.001 * (1 + i % 10))
+    snapshots = [tracker.snapshot() for tracker in trackers]
+    restored = load_snapshot(dump_snapshot(snapshots[0]))
+    assert restored["/x"][60.0].bins == snapshots[0]["/x"][60.0].bins
+
+    write_worker_file(str(tmp_path), snapshots[1], trackers[1].cumulative(), pid=101)
+    write_worker_file(str(tmp_path), snapshots[2], trackers[2].cumulative(), pid=102)
+    stale = tmp_path / "latency_103.json"
+    write_worker_file(str(tmp_path), snapshots[2], pid=103)
+    os.utime(stale, (time.time() - 600, time.time() - 600))
+
+    others = read_worker_files(str(tmp_path), max_age=5, exclude_pid=102)
+    assert len(others) == 1
+    workers = read_worker_files(str(tmp_path), max_age=5)
+    merged = merge_snapshots([snapshots[0], *(snapshot for snapshot, _ in workers)])
+    assert merged["/x"][300.0].count == 3000
+    totals = merge_totals([trackers[0].cumulative(), *(totals for _, totals in workers)])
+    assert totals["/x"][0] == 3000 and totals["/x"][1] == pytest.approx(33.0)
+    assert snapshots[0]["/x"][300.0].count == 1000  # inputs are left untouched
+
+
+def test_stats_and_metrics_report_route_percentiles(wait_for_first_sample):
+    with TestClient(app) as client:
+        for _ in range(20):
+            client.get("/health")
+        wait_for_first_sample()
+        time.sleep(1.1)  # next sample generation re-encodes /api/stats
+        latency = client.get("/api/stats").json()["latency"]
+        assert latency["/health"]["1m"]["count"] >= 20
+        assert 0 < latency["/health"]["1m"]["p50"] <= latency["/health"]["1m"]["p99.9"]
+        text = client.get("/metrics").text
+    assert 'app_route_latency_seconds{quantile="0.99",route="/health",window="1m"}' in text
+    assert 'app_route_latency_seconds_count{route="/health"}' in text
+    assert 'app_route_latency_seconds_count{route="/health",window=' not in text
+    assert not math.isnan(float(text.split('window="1m"} ', 1)[1].split()[0]))
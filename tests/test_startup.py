@@ -0,0 +1,41 @@
+import logging, os, subprocess, sys
+
+from prometheus_client import REGISTRY
+from startup import StartupTimer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# FastAPI itself is most of it; raise IMPORT_TIME_BUDGET on slower machines.
+IMPORT_TIME_BUDGET = float(os.environ.get("IMPORT_TIME_BUDGET", "1.5"))
+DEFERRED_MODULES = ("psutil", "httpx")
+
+def import_times():
+    env = {key: value for key, value in os.environ.items()
+           if not key.startswith(("CLUSTER_", "PUSH_", "PROMETHEUS_MULTIPROC"))}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+def test_import_time_within_budget():
+    times = import_times()
+    print(f"import app: {times['app']:.3f}s (budget {IMPORT_TIME_BUDGET}s)")
+    assert times["app"] < IMPORT_TIME_BUDGET
+
+def test_heavy_modules_are_deferred():
+    imported = set(import_times())
+    assert not imported & set(DEFERRED_MODULES)
+
+def test_startup_phases_reported(caplog):
+    timer = StartupTimer(origin=0.0)
+    timer.phases = {"imports": 0.4, "serving": 0.45, "first_sample": 0.6}
+    with caplog.at_level(logging.INFO, logger="startup"):
+        timer.report()
+    assert "imports=0.400s serving=0.450s first_sample=0.600s" in caplog.text
+    assert REGISTRY.get_sample_value("app_startup_phase_seconds", {"phase": "serving"}) == 0.45
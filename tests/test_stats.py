@@ -0,0 +1,57 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import app as app_module
+from app import app, sampler
+from pages import VersionedJSON, json_bytes
+from sampler import Snapshot
+
+
+def test_json_bytes_is_compact():
+    assert json_bytes({"a": 1.5, "b": None}) == b'{"a":1.5,"b":null}'
+
+
+def test_stats_encoded_once_per_generation(monkeypatch):
+    monkeypatch.setattr(sampler, "interval", 3600)
+    builds = []
+    body = VersionedJSON()
+    monkeypatch.setattr(app_module, "stats_body", body)
+    original = body.response_in_thread
+
+    def counting(request, version, build):
+        return original(request, version, lambda: builds.append(version) or build())
+
+    monkeypatch.setattr(body, "response_in_thread", counting)
+    with TestClient(app) as client:
+        monkeypatch.setattr(sampler, "snapshot", Snapshot(
+            cpu=12.5, memory=40.0, timestamp=0.0, generation=7, wall_time=1700000000.0, requests=42.0,
+        ))
+        first = client.get("/api/stats")
+        second = client.get("/api/stats")
+        assert first.content == second.content
+        data = json.loads(first.content)
+        assert isinstance(data.pop("latency"), dict)
+        assert data == {
+            "cpu": 12.5, "memory": 40.0, "requests": 42.0, "generation": 7,
+            "sampled_at": 1700000000.0, "pod": app_module.POD_NAME,
+        }
+        assert builds == [7]
+
+        etag = first.headers["etag"]
+        assert etag.endswith('-7"')
+        revalidated = client.get("/api/stats", headers={"If-None-Match": etag})
+        assert revalidated.status_code == 304 and revalidated.content == b""
+
+        monkeypatch.setattr(sampler, "snapshot", Snapshot(
+            cpu=13.0, memory=41.0, timestamp=1.0, generation=8, wall_time=1700000001.0, requests=50.0,
+        ))
+        fresh = client.get("/api/stats", headers={"If-None-Match": etag})
+        assert fresh.status_code == 200
+        assert fresh.json()["requests"] == 50.0
+        assert fresh.headers["etag"] != etag
+        assert builds == [7, 8]
+
+
+def test_etags_differ_between_processes():
+    assert VersionedJSON().nonce != VersionedJSON().nonce
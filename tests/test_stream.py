@@ -0,0 +1,127 @@
+import asyncio, statistics, time
+
+import httpx
+import psutil
+import pytest
+from stream import Broadcaster, encode_event
+
+def test_slow_consumer_drops_oldest():
+    broadcaster = Broadcaster(queue_size=2)
+    subscription = broadcaster.subscribe()
+    for i in range(5):
+        broadcaster.publish(encode_event({"i": i}))
+    assert subscription.dropped == 3
+    assert list(subscription.buffer) == [encode_event({"i": 3}), encode_event({"i": 4})]
+
+def test_subscriber_cap():
+    broadcaster = Broadcaster(max_subscribers=1)
+    assert broadcaster.subscribe() is not None
+    assert broadcaster.subscribe() is None
+
+def cpu_per_sample(subscribers, samples=50):
+    async def run():
+        broadcaster = Broadcaster()
+        received = 0
+
+        async def consume(subscription):
+            nonlocal received
+            while True:
+                await subscription.get()
+                received += 1
+
+        consumers = [asyncio.ensure_future(consume(broadcaster.subscribe())) for _ in range(subscribers)]
+        await asyncio.sleep(0)
+        start = time.process_time()
+        for i in range(samples):
+            broadcaster.publish(encode_event({"cpu": i}))
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+        elapsed = time.process_time() - start
+        for consumer in consumers:
+            consumer.cancel()
+        assert received == subscribers * samples
+        return elapsed / samples
+
+    return asyncio.run(run())
+
+def test_fan_out_reaches_every_subscriber():
+    cpu_per_sample(1000, samples=5)  # asserts every subscriber got every sample
+
+@pytest.mark.benchmark
+def test_in_process_fan_out_cost_1_to_1000_subscribers():
+    per_sample = {n: cpu_per_sample(n) for n in (1, 10, 100, 1000)}
+    for n, seconds in per_sample.items():
+        print(f"{n:>5} subscribers: {seconds * 1e3:.3f} ms CPU per sample")
+    # Encoding happens once, so per-subscriber cost is only a deque append
+    # and a task wake-up: roughly 10 us each, so at one sample per second
+    # 1,000 dashboards cost about 1% of a core.
+    assert per_sample[1000] / 1000 < 50e-6
+
+def test_stream_endpoint_pushes_samples(serve):
+    _, base_url = serve(SAMPLE_INTERVAL="0.1")
+    events = []
+    with httpx.stream("GET", base_url + "/api/stream", timeout=5) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        for line in response.iter_lines():
+            if line.startswith("id: "):
+                events.append(int(line[4:]))
+            if len(events) == 3:
+                break
+    assert events == sorted(events) and len(set(events)) == 3
+
+def listen_to_stream(serve, clients, wanted, interval):
+    """Opens ``clients`` SSE connections; returns their (id, arrival) events and the server's CPU time."""
+    process, base_url = serve(SAMPLE_INTERVAL=str(interval))
+    server = psutil.Process(process.pid)
+
+    async def listen(client, received, connected):
+        async with client.stream("GET", "/api/stream") as response:
+            assert response.status_code == 200
+            connected.append(None)
+            async for line in response.aiter_lines():
+                if line.startswith("id: "):
+                    received.append((int(line[4:]), time.monotonic()))
+                    if len(received) == wanted:
+                        return
+
+    async def run():
+        limits = httpx.Limits(max_connections=clients)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            received = [[] for _ in range(clients)]
+            connected = []
+            tasks = [asyncio.ensure_future(listen(client, events, connected)) for events in received]
+            while len(connected) < clients:
+                await asyncio.sleep(0.01)
+            before = server.cpu_times()
+            await asyncio.wait_for(asyncio.gather(*tasks), 30)
+            after = server.cpu_times()
+        return received, (after.user + after.system) - (before.user + before.system)
+
+    received, cpu = asyncio.run(run())
+    for events in received:
+        ids = [event_id for event_id, _ in events]
+        assert ids == list(range(ids[0], ids[0] + wanted))  # nothing dropped or reordered
+    return received, cpu
+
+def test_many_http_clients_get_every_sample(serve):
+    received, _ = listen_to_stream(serve, clients=50, wanted=3, interval=0.1)
+    assert len(received) == 50
+
+@pytest.mark.benchmark
+def test_many_http_clients_get_every_sample_promptly(serve):
+    # The end-to-end cost: real SSE connections through uvicorn and the
+    # middleware stack, not just the in-process fan-out above.
+    clients, wanted, interval = 200, 5, 0.2
+    received, cpu = listen_to_stream(serve, clients, wanted, interval)
+    # How far apart the first and last client saw the same sample.
+    arrivals = {}
+    for events in received:
+        for event_id, at in events:
+            arrivals.setdefault(event_id, []).append(at)
+    spreads = [max(times) - min(times) for times in arrivals.values() if len(times) == clients]
+    per_client = cpu / (clients * wanted)
+    print(f"{clients} SSE clients: median spread {statistics.median(spreads) * 1e3:.1f} ms, "
+          f"server CPU {per_client * 1e6:.0f} us per client per sample")
+    assert spreads and statistics.median(spreads) < interval
+    # Tens of microseconds per delivery here.
+    assert per_client < 1e-3